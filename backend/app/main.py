@@ -1,18 +1,79 @@
-from fastapi import FastAPI
-from dotenv import load_dotenv
+import asyncio
+import logging
 import os
+from dotenv import load_dotenv
 
 # Load environment variables before importing other modules that might rely on them
 load_dotenv()
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import documents, ai
+from app.routers import documents, ai, jobs, health, metrics, reviews
+from app.services.job_queue import get_job_queue
+from app.services.model_registry import get_model_registry
+from app.services.review_service import get_review_engine
+from app.services.xp_writer import get_xp_writer
+from app.middleware.upload_limit import UploadSizeLimitMiddleware
+from app.middleware.tenant import TenantMiddleware
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.logging_config import configure_logging
+from app.services.extraction_service import MAX_UPLOAD_BYTES, warm_process_pool
+
+# Heavy clients (the Gemini SDK, PDF workers) are imported on first use. With
+# "on", startup loads them in the background while requests are already served;
+# with "off" nothing is loaded until a request needs it, and models are first
+# listed at the registry's first scheduled refresh
+APP_PREWARM = os.getenv("APP_PREWARM", "on")
+
+# Structured logs for every app.* logger (LOG_FORMAT, LOG_LEVEL)
+configure_logging()
+logger = logging.getLogger(__name__)
+
+async def prewarm():
+    """
+    Load the Gemini SDK and build the default model client, and start the PDF
+    workers, so the first request finds them ready. (The model registry lists
+    models itself, see the lifespan.)
+    """
+    for step in (lambda: asyncio.to_thread(get_model_registry().get_client), warm_process_pool):
+        try:
+            await step()
+        except Exception as e:
+            logger.warning("Pre-warm step failed", extra={"error": str(e)})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # List models in the background now and on a schedule, whatever APP_PREWARM says
+    model_registry = get_model_registry()
+    model_registry.start()
+    prewarm_task = asyncio.ensure_future(prewarm()) if APP_PREWARM == "on" else None
+    # Resume background jobs left over from a previous run
+    job_queue = get_job_queue()
+    job_queue.start()
+    # Batch profile XP writes in the background
+    xp_writer = get_xp_writer()
+    xp_writer.start()
+    # Write review changes in the background, even when no further write comes
+    review_engine = get_review_engine()
+    review_engine.start()
+    yield
+    if prewarm_task is not None:
+        prewarm_task.cancel()
+        await asyncio.gather(prewarm_task, return_exceptions=True)
+    await job_queue.stop()
+    # Write review changes still waiting for their batch
+    await review_engine.stop()
+    # Write XP updates still waiting for their batch
+    await xp_writer.stop()
+    await model_registry.stop()
 
 app = FastAPI(
     title="SmarterNotHarder API",
     description="Backend API for SmarterNotHarder learning platform",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -25,8 +86,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Refuse oversized uploads while they stream in, before they are buffered
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES)
+
+# Tag each request with its user for fair sharing of the Gemini quota
+app.add_middleware(TenantMiddleware)
+
+# Brotli or gzip for large JSON bodies; Server-Sent Events are left alone
+app.add_middleware(CompressionMiddleware)
+
+# Outermost, so request timings include every other middleware
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(documents.router)
 app.include_router(ai.router)
+app.include_router(jobs.router)
+app.include_router(health.router)
+app.include_router(metrics.router)
+app.include_router(reviews.router)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,24 @@
+from app.services.rate_limiter import current_tenant
+
+class TenantMiddleware:
+    """
+    Record who a request is for, so the Gemini rate limiter can share capacity
+    fairly between users. Uses the X-User-Id header, else the client address.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tenant = dict(scope["headers"]).get(b"x-user-id", b"").decode("latin-1")
+        if not tenant and scope.get("client"):
+            tenant = scope["client"][0]
+        token = current_tenant.set(tenant or "anonymous")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_tenant.reset(token)
@@ -0,0 +1,45 @@
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject request bodies over max_bytes on the given paths while they stream in.
+
+    A declared Content-Length above the limit is refused before any of the body
+    is read; otherwise bytes are counted as they arrive and the request fails
+    with 413 as soon as the limit is crossed, instead of after buffering.
+    """
+
+    def __init__(self, app, max_bytes: int, paths=("/documents/upload",)):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": self.detail})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=self.detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @property
+    def detail(self) -> str:
+        return f"File too large. Maximum upload size is {self.max_bytes // (1024 * 1024)} MB."
@@ -1,79 +1,310 @@
-from fastapi import APIRouter, HTTPException
-from app.services.ai_service import analyze_text, generate_quiz, chat_with_document, generate_study_plan, generate_flashcards
-from app.schemas.ai import AnalyzeRequest, AnalyzeResponse, QuizRequest, QuizResponse, ChatRequest, ChatResponse, PlanRequest, PlanResponse, FlashcardRequest, FlashcardResponse
+import json
+import logging
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from app.services.document_store import resolve_document_text, get_document_index
+from app.services.ai_service import analyze_text, generate_quiz, stream_quiz, chat_with_document, stream_chat_with_document, generate_study_plan, generate_flashcards, stream_flashcards, stream_study_pack
+from app.services.job_queue import get_job_queue, register_job_handler, QueueFullError, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_BULK
+from app.schemas.job import JobSubmitted
+from app.services.metrics import stage, timed_stage
+from app.schemas.ai import AnalyzeRequest, AnalyzeResponse, QuizRequest, QuizQuestion, QuizResponse, ChatRequest, ChatResponse, PlanRequest, PlanResponse, FlashcardRequest, Flashcard, FlashcardResponse, StudyPackRequest, StudyPackResponse
+
+try:
+    import orjson
+except ImportError:  # Optional: SSE events fall back to the json module
+    orjson = None
 
 router = APIRouter(
     prefix="/ai",
     tags=["ai"]
 )
 
+logger = logging.getLogger(__name__)
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def _dumps(data) -> str:
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data)
+
+def sse_event(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {_dumps(data)}\n\n"
+
+async def validated_events(items, schema):
+    """
+    Turn streamed JSON objects into SSE events, validating each against schema.
+    Invalid elements are skipped so one bad item does not end the stream.
+    """
+    try:
+        async for item in items:
+            try:
+                with stage("validation"):
+                    event = sse_event(schema(**item).model_dump())
+                yield event
+            except (TypeError, ValidationError) as e:
+                logger.warning("Skipping invalid streamed item", extra={"schema": schema.__name__, "error": str(e)})
+        yield sse_event({}, event="done")
+    except Exception as e:
+        yield sse_event({"detail": str(e)}, event="error")
+    finally:
+        await items.aclose()
+
+async def submit_job(kind: str, request, priority: int) -> JSONResponse:
+    """
+    Queue a request as a background job and answer 202 with its id.
+    Poll GET /jobs/{job_id} for the result.
+    """
+    document_id = getattr(request, "document_id", None)
+    if document_id:
+        # Fail now rather than in the job if the document is unknown
+        await resolve_document_text(None, document_id)
+    try:
+        job_id = await get_job_queue().submit(kind, request.model_dump(), priority=priority)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return JSONResponse(status_code=202, content=JobSubmitted(job_id=job_id, status="queued").model_dump())
+
+async def run_analyze(request: AnalyzeRequest, text: Optional[str] = None) -> AnalyzeResponse:
+    if text is None:
+        text = await resolve_document_text(request.text, request.document_id)
+    result = await analyze_text(text, language=request.language)
+    with stage("validation"):
+        return AnalyzeResponse(**result)
+
+async def run_quiz(request: QuizRequest, text: Optional[str] = None) -> QuizResponse:
+    if text is None:
+        text = await resolve_document_text(request.text, request.document_id)
+    questions = await generate_quiz(text, language=request.language, num_questions=request.num_questions)
+    with stage("validation"):
+        return QuizResponse(questions=questions)
+
+async def run_plan(request: PlanRequest) -> PlanResponse:
+    plan = await generate_study_plan(
+        topics=request.topics,
+        exam_date=request.exam_date,
+        hours_per_day=request.hours_per_day,
+        language=request.language,
+        start_date=request.start_date,
+        describe=request.describe
+    )
+    with stage("validation"):
+        return PlanResponse(plan=plan)
+
+async def run_flashcards(request: FlashcardRequest, text: Optional[str] = None) -> FlashcardResponse:
+    if text is None:
+        text = await resolve_document_text(request.text, request.document_id)
+    cards = await generate_flashcards(
+        text=text,
+        num_cards=request.num_cards,
+        language=request.language
+    )
+    with stage("validation"):
+        return FlashcardResponse(flashcards=cards)
+
+# Background job kinds; a student waiting on an upload goes before bulk generation
+JOB_KINDS = {
+    "analyze": (AnalyzeRequest, run_analyze, PRIORITY_HIGH),
+    "plan": (PlanRequest, run_plan, PRIORITY_NORMAL),
+    "quiz": (QuizRequest, run_quiz, PRIORITY_BULK),
+    "flashcards": (FlashcardRequest, run_flashcards, PRIORITY_BULK),
+}
+
+def _job_handler(schema, run):
+    async def handler(payload):
+        response = await run(schema(**payload))
+        return response.model_dump()
+    return handler
+
+for kind, (schema, run, _) in JOB_KINDS.items():
+    register_job_handler(kind, _job_handler(schema, run))
+
 @router.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_content(request: AnalyzeRequest):
+async def analyze_content(request: AnalyzeRequest, background: bool = False):
     """
     Analyze course content using Gemini.
+    With ?background=true, returns 202 and a job id instead of waiting.
     """
+    if background:
+        return await submit_job("analyze", request, JOB_KINDS["analyze"][2])
+    # Resolved outside the try, so an unknown document stays a 404
+    text = await resolve_document_text(request.text, request.document_id)
     try:
-        result = await analyze_text(request.text, language=request.language)
-        return AnalyzeResponse(**result)
+        return await run_analyze(request, text)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/quiz", response_model=QuizResponse)
-async def create_quiz(request: QuizRequest):
+async def create_quiz(request: QuizRequest, background: bool = False):
     """
     Generate a quiz from course content using Gemini.
+    With ?background=true, returns 202 and a job id instead of waiting.
     """
+    if background:
+        return await submit_job("quiz", request, JOB_KINDS["quiz"][2])
+    # Resolved outside the try, so an unknown document stays a 404
+    text = await resolve_document_text(request.text, request.document_id)
     try:
-        questions = await generate_quiz(request.text, language=request.language, num_questions=request.num_questions)
-        return QuizResponse(questions=questions)
+        return await run_quiz(request, text)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/quiz/stream")
+async def create_quiz_stream(request: QuizRequest):
+    """
+    Generate a quiz, streaming each validated question as a Server-Sent Event.
+    """
+    text = await resolve_document_text(request.text, request.document_id)
+    items = stream_quiz(text, language=request.language, num_questions=request.num_questions)
+    return StreamingResponse(validated_events(items, QuizQuestion), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
     Chat with the document context.
     """
+    context = await resolve_document_text(request.context, request.document_id)
     try:
         # Convert Pydantic models to list of dicts
         history_dicts = [{"role": msg.role, "content": msg.content} for msg in request.history]
         response_text = await chat_with_document(
-            context_text=request.context,
+            context_text=context,
             user_message=request.message,
             history=history_dicts,
-            language=request.language
+            language=request.language,
+            index=get_document_index(request.document_id)
         )
         return ChatResponse(response=response_text)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """
+    Chat with the document context, streaming the answer as Server-Sent Events.
+    Each chunk is a `data: {"text": ...}` event, followed by a final `done` event.
+    """
+    context = await resolve_document_text(request.context, request.document_id)
+    history_dicts = [{"role": msg.role, "content": msg.content} for msg in request.history]
+
+    async def events():
+        stream = stream_chat_with_document(
+            context_text=context,
+            user_message=request.message,
+            history=history_dicts,
+            language=request.language,
+            index=get_document_index(request.document_id)
+        )
+        try:
+            async for text in stream:
+                if await http_request.is_disconnected():
+                    break
+                yield sse_event({"text": text})
+            else:
+                yield sse_event({}, event="done")
+        except Exception as e:
+            yield sse_event({"detail": str(e)}, event="error")
+        finally:
+            # Stops the upstream generation when the client goes away
+            await stream.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @router.post("/plan", response_model=PlanResponse)
-async def create_plan(request: PlanRequest):
+async def create_plan(request: PlanRequest, background: bool = False):
     """
     Generate a study plan.
+    With ?background=true, returns 202 and a job id instead of waiting.
     """
+    if background:
+        return await submit_job("plan", request, JOB_KINDS["plan"][2])
     try:
-        plan = await generate_study_plan(
-            topics=request.topics,
-            exam_date=request.exam_date,
-            hours_per_day=request.hours_per_day,
-            language=request.language
-        )
-        return PlanResponse(plan=plan)
+        return await run_plan(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/flashcards", response_model=FlashcardResponse)
-async def create_flashcards(request: FlashcardRequest):
+async def create_flashcards(request: FlashcardRequest, background: bool = False):
     """
     Generate flashcards.
+    With ?background=true, returns 202 and a job id instead of waiting.
     """
+    if background:
+        return await submit_job("flashcards", request, JOB_KINDS["flashcards"][2])
+    # Resolved outside the try, so an unknown document stays a 404
+    text = await resolve_document_text(request.text, request.document_id)
     try:
-        cards = await generate_flashcards(
-            text=request.text,
-            num_cards=request.num_cards,
-            language=request.language
-        )
-        return FlashcardResponse(flashcards=cards)
+        return await run_flashcards(request, text)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/flashcards/stream")
+async def create_flashcards_stream(request: FlashcardRequest):
+    """
+    Generate flashcards, streaming each validated card as a Server-Sent Event.
+    """
+    text = await resolve_document_text(request.text, request.document_id)
+    items = stream_flashcards(text=text, num_cards=request.num_cards, language=request.language)
+    return StreamingResponse(validated_events(items, Flashcard), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@timed_stage("validation")
+def _validated_artifact(name: str, value):
+    if name == "analysis":
+        return AnalyzeResponse(**value).model_dump()
+    if name == "quiz":
+        return QuizResponse(questions=value).model_dump()["questions"]
+    return FlashcardResponse(flashcards=value).model_dump()["flashcards"]
+
+@router.post("/study-pack", response_model=StudyPackResponse)
+async def create_study_pack(request: StudyPackRequest):
+    """
+    Generate several artifacts (analysis, quiz, flashcards) for one document in
+    one request. Artifacts that fail are reported in `errors`; the rest are
+    still returned.
+    """
+    text = await resolve_document_text(request.text, request.document_id)
+    pack = {}
+    errors = {}
+    async for name, value, error in stream_study_pack(text, request.artifacts, language=request.language,
+                                                      num_questions=request.num_questions, num_cards=request.num_cards):
+        try:
+            if error is not None:
+                raise error
+            pack[name] = _validated_artifact(name, value)
+        except Exception as e:
+            errors[name] = str(e)
+    return StudyPackResponse(**pack, errors=errors)
+
+@router.post("/study-pack/stream")
+async def create_study_pack_stream(request: StudyPackRequest, http_request: Request):
+    """
+    Study pack as Server-Sent Events: one event per artifact, named after it
+    (`analysis`, `quiz`, `flashcards`), as soon as it is ready. A failed artifact
+    sends an `error` event with its name; a final `done` event ends the stream.
+    """
+    text = await resolve_document_text(request.text, request.document_id)
+
+    async def events():
+        stream = stream_study_pack(text, request.artifacts, language=request.language,
+                                   num_questions=request.num_questions, num_cards=request.num_cards)
+        try:
+            async for name, value, error in stream:
+                if await http_request.is_disconnected():
+                    return
+                try:
+                    if error is not None:
+                        raise error
+                    yield sse_event(_validated_artifact(name, value), event=name)
+                except Exception as e:
+                    yield sse_event({"artifact": name, "detail": str(e)}, event="error")
+            yield sse_event({}, event="done")
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -1,26 +1,51 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.services.extraction_service import extract_text_from_pdf
-from app.schemas.document import DocumentResponse
+from typing import Union
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from app.services.extraction_service import extract_document_from_pdf
+from app.services.document_store import load_document
+from app.schemas.document import DocumentResponse, DocumentSlimResponse, DocumentTextPage, PageContent
 
 router = APIRouter(
     prefix="/documents",
     tags=["documents"]
 )
 
-@router.post("/upload", response_model=DocumentResponse)
-async def upload_document(file: UploadFile = File(...)):
+# Largest number of PDF pages returned by one /text call
+MAX_TEXT_PAGE_SIZE = 50
+
+@router.post("/upload", response_model=Union[DocumentResponse, DocumentSlimResponse])
+async def upload_document(file: UploadFile = File(...), slim: bool = False):
     """
     Upload a PDF document and extract its text content.
+    The text stays on the server; use the returned document_id in /ai requests
+    and GET /documents/{document_id}/text to read it page by page.
+    With ?slim=true, only the document id and page count are returned.
     """
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
-    text = await extract_text_from_pdf(file)
+    document = await extract_document_from_pdf(file)
+
+    if slim:
+        return DocumentSlimResponse(document_id=document.document_id, page_count=len(document.pages))
     
     return DocumentResponse(
+        document_id=document.document_id,
         filename=file.filename,
-        content_length=len(text),
-        extracted_text=text,
+        content_length=len(document.text),
+        page_count=len(document.pages),
+        preview=document.preview,
         message="Document uploaded and processed successfully"
     )
 
+@router.get("/{document_id}/text", response_model=DocumentTextPage)
+async def get_document_text(document_id: str, page: int = Query(1, ge=1), page_size: int = Query(10, ge=1, le=MAX_TEXT_PAGE_SIZE)):
+    """
+    Extracted text of an uploaded document, page_size PDF pages at a time.
+    """
+    document = await load_document(document_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found. Please upload it again.")
+
+    start = (page - 1) * page_size
+    pages = [PageContent(page_number=p.page_number, text=p.text) for p in document.pages[start:start + page_size]]
+    return DocumentTextPage(document_id=document_id, page=page, page_size=page_size, page_count=len(document.pages), pages=pages)
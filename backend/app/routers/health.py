@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from app.services.model_registry import get_model_registry
+from app.services.model_router import get_model_router
+from app.schemas.health import HealthResponse, ModelHealth
+
+router = APIRouter(
+    prefix="/health",
+    tags=["health"]
+)
+
+@router.get("", response_model=HealthResponse)
+async def health():
+    """
+    Service health, the Gemini model currently in use and how each routed
+    model has been performing.
+    """
+    model = ModelHealth(**get_model_registry().health())
+    status = "ok" if model.active_model and not model.last_error else "degraded"
+    return HealthResponse(status=status, model=model, routes=get_model_router().summary())
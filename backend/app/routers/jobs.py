@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException, Query
+from app.services.job_queue import get_job_queue
+from app.schemas.job import JobStatus
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"]
+)
+
+@router.get("/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=60)):
+    """
+    Get the status and, once done, the result of a background job.
+    With wait > 0 the request is held until the job finishes or wait seconds pass.
+    """
+    job = await get_job_queue().wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatus(**job)
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Header, HTTPException, Query
+from app.services.review_service import get_review_engine
+from app.schemas.review import AddCardsRequest, AddCardsResponse, DueCardsResponse, ReviewCard, ReviewRequest
+
+router = APIRouter(
+    prefix="/reviews",
+    tags=["reviews"]
+)
+
+MAX_DUE_CARDS = 200
+
+# Plain def: FastAPI runs these in its thread pool, since the review engine
+# reads and writes its store synchronously
+
+@router.post("/cards", response_model=AddCardsResponse)
+def add_cards(request: AddCardsRequest, x_user_id: str = Header(...)):
+    """
+    Keep flashcards for spaced-repetition review. They are due right away;
+    cards the user already has keep their schedule.
+    """
+    card_ids = get_review_engine().add_cards(x_user_id, [(card.front, card.back) for card in request.cards])
+    return AddCardsResponse(card_ids=card_ids)
+
+@router.get("/due", response_model=DueCardsResponse)
+def due_cards(x_user_id: str = Header(...), limit: int = Query(20, ge=1, le=MAX_DUE_CARDS)):
+    """
+    The user's cards due now, most overdue first.
+    """
+    engine = get_review_engine()
+    cards = engine.due_cards(x_user_id, limit)
+    return DueCardsResponse(cards=[ReviewCard(**card) for card in cards], next_due=engine.next_due(x_user_id))
+
+@router.post("/cards/{card_id}", response_model=ReviewCard)
+def review_card(card_id: str, request: ReviewRequest, x_user_id: str = Header(...)):
+    """
+    Record how well the user recalled a card and schedule its next review.
+    """
+    try:
+        return ReviewCard(**get_review_engine().review(x_user_id, card_id, request.rating))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Card not found")
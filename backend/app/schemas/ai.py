@@ -1,8 +1,9 @@
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 
 class AnalyzeRequest(BaseModel):
-    text: str
+    text: Optional[str] = None
+    document_id: Optional[str] = None
     language: Optional[str] = "en"
 
 class AnalyzeResponse(BaseModel):
@@ -12,7 +13,8 @@ class AnalyzeResponse(BaseModel):
     estimated_study_time: str
 
 class QuizRequest(BaseModel):
-    text: str
+    text: Optional[str] = None
+    document_id: Optional[str] = None
     num_questions: int = 5
     language: Optional[str] = "en"
 
@@ -32,7 +34,8 @@ class ChatMessage(BaseModel):
     content: str
 
 class ChatRequest(BaseModel):
-    context: str
+    context: Optional[str] = None
+    document_id: Optional[str] = None
     message: str
     history: List[ChatMessage]
     language: Optional[str] = "en"
@@ -45,6 +48,10 @@ class PlanRequest(BaseModel):
     exam_date: str
     hours_per_day: int
     language: Optional[str] = "en"
+    # The student's "today" (YYYY-MM-DD); the server's date when missing
+    start_date: Optional[str] = None
+    # Ask the model for per-session advice; off returns template descriptions only
+    describe: bool = True
 
 class StudySession(BaseModel):
     date: str
@@ -57,7 +64,8 @@ class PlanResponse(BaseModel):
     plan: List[StudySession]
 
 class FlashcardRequest(BaseModel):
-    text: str
+    text: Optional[str] = None
+    document_id: Optional[str] = None
     num_cards: int = 10
     language: Optional[str] = "en"
 
@@ -67,3 +75,18 @@ class Flashcard(BaseModel):
 
 class FlashcardResponse(BaseModel):
     flashcards: List[Flashcard]
+
+class StudyPackRequest(BaseModel):
+    text: Optional[str] = None
+    document_id: Optional[str] = None
+    artifacts: List[Literal["analysis", "quiz", "flashcards"]] = ["analysis", "quiz", "flashcards"]
+    num_questions: int = 5
+    num_cards: int = 10
+    language: Optional[str] = "en"
+
+class StudyPackResponse(BaseModel):
+    analysis: Optional[AnalyzeResponse] = None
+    quiz: Optional[List[QuizQuestion]] = None
+    flashcards: Optional[List[Flashcard]] = None
+    # artifact -> error, for the artifacts that could not be generated
+    errors: Dict[str, str] = {}
@@ -1,9 +1,25 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class DocumentResponse(BaseModel):
+    document_id: str
     filename: str
     content_length: int
-    extracted_text: str
+    page_count: int
+    preview: str
     message: str
 
+class DocumentSlimResponse(BaseModel):
+    document_id: str
+    page_count: int
+
+class PageContent(BaseModel):
+    page_number: int
+    text: str
+
+class DocumentTextPage(BaseModel):
+    document_id: str
+    page: int
+    page_size: int
+    page_count: int
+    pages: List[PageContent]
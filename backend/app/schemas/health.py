@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+class ModelHealth(BaseModel):
+    active_model: Optional[str] = None
+    available_models: List[str]
+    last_refresh: Optional[float] = None
+    last_error: Optional[str] = None
+
+class RouteModelHealth(BaseModel):
+    calls: int
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    error_rate: float
+    degraded: bool
+
+class HealthResponse(BaseModel):
+    status: str
+    model: ModelHealth
+    # Rolling latency and error rate of every model the router has used
+    routes: Dict[str, RouteModelHealth] = {}
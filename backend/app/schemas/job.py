@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import Any, Optional
+
+class JobSubmitted(BaseModel):
+    job_id: str
+    status: str
+
+class JobStatus(BaseModel):
+    job_id: str
+    kind: str
+    status: str # "queued" | "running" | "done" | "failed"
+    result: Optional[Any] = None
+    error: Optional[str] = None
@@ -0,0 +1,28 @@
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+
+from app.schemas.ai import Flashcard
+
+class AddCardsRequest(BaseModel):
+    cards: List[Flashcard]
+
+class AddCardsResponse(BaseModel):
+    card_ids: List[str]
+
+class ReviewCard(BaseModel):
+    card_id: str
+    front: str
+    back: str
+    due: float # Unix time
+    interval_days: float
+    ease: float
+    reps: int
+    lapses: int
+
+class DueCardsResponse(BaseModel):
+    cards: List[ReviewCard]
+    # When the next card is due, if any (may be in the past)
+    next_due: Optional[float] = None
+
+class ReviewRequest(BaseModel):
+    rating: Literal["again", "hard", "good", "easy"]
@@ -1,95 +1,398 @@
-import google.generativeai as genai
 import os
 import json
 import time
+import logging
 import asyncio
-from typing import Dict, Any, List
+import functools
+import inspect
+import random
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Callable, List, AsyncIterator, Optional, Tuple
+from app.schemas.ai import AnalyzeResponse, FlashcardResponse, QuizResponse
+from app.services.response_cache import get_response_cache, make_cache_key
+from app.services.single_flight import SingleFlight
+from app.services.json_stream import JsonArrayStreamParser
+from app.services.retrieval_service import FULL_CONTEXT_CHARS, cached_index, chunk_text, select_context
+from app.services.rate_limiter import estimate_tokens, get_rate_limiter
+from app.services.model_registry import get_model_registry
+from app.services.model_router import CallTiming, RoutedModel, get_model_router, model_call
+from app.services.context_cache import get_context_cache
+from app.services.chat_history import HistoryCompactor, SUMMARY_TOKEN_BUDGET
+from app.services.study_planner import build_schedule, parse_date
+from app.services.metrics import (
+    LLM_ERRORS, LLM_IN_FLIGHT, LLM_RATE_LIMITED, LLM_RETRIES, STAGE_SECONDS, record_usage, stage, timed_stage
+)
 
-# Cache for the selected model name to avoid API calls
-_cached_model_name = None
+logger = logging.getLogger(__name__)
 
-def get_model():
-    global _cached_model_name
-    
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise Exception("GEMINI_API_KEY not configured")
-    genai.configure(api_key=api_key)
-    
-    if _cached_model_name:
-        return genai.GenerativeModel(_cached_model_name)
+# Identical generations running at the same time share one Gemini call
+_in_flight_generations = SingleFlight()
 
-    # Priority list: 1.5 Flash (Stable & Fast) -> 2.0 Flash (Newer) -> Pro
-    preferred_models = [
-        "gemini-1.5-flash",
-        "gemini-1.5-flash-latest",
-        "gemini-2.0-flash", 
-        "gemini-1.5-pro",
-        "gemini-pro"
-    ]
-    
-    try:
-        # List available models dynamically
-        available_models = [m.name.replace("models/", "") for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
-        
-        for model in preferred_models:
-            if model in available_models:
-                print(f"Selected Gemini model: {model}")
-                _cached_model_name = model
-                return genai.GenerativeModel(model)
-        
-        # Fallback if specific aliases aren't found but we have a list
-        if available_models:
-             # Pick the first one that looks like gemini
-             gemini_models = [m for m in available_models if "gemini" in m]
-             if gemini_models:
-                 print(f"Selected fallback Gemini model: {gemini_models[0]}")
-                 _cached_model_name = gemini_models[0]
-                 return genai.GenerativeModel(_cached_model_name)
-
-        # Last resort fallback
-        print("No preferred model found in list, forcing gemini-1.5-flash")
-        _cached_model_name = "gemini-1.5-flash"
-        return genai.GenerativeModel(_cached_model_name)
-        
-    except Exception as e:
-        print(f"Error listing models: {e}. Falling back to gemini-1.5-flash")
-        return genai.GenerativeModel('gemini-1.5-flash')
+# Upper bound on Gemini calls in flight at once, across all requests
+MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "64"))
+
+# Slots background jobs may hold at once; the rest stay free for interactive requests
+BACKGROUND_CONCURRENCY = int(os.getenv("AI_BACKGROUND_CONCURRENCY", str(max(1, MAX_CONCURRENCY * 3 // 4))))
+
+# Set by the job queue workers so their Gemini calls count against BACKGROUND_CONCURRENCY
+background_work: ContextVar[bool] = ContextVar("background_work", default=False)
+
+# Documents longer than this are processed chunk by chunk and merged (map-reduce)
+MAP_REDUCE_MIN_CHARS = int(os.getenv("AI_MAP_REDUCE_MIN_CHARS", "150000"))
+MAP_CHUNK_CHARS = int(os.getenv("AI_MAP_CHUNK_CHARS", "100000"))
+# Chunks of one document generated at the same time
+MAP_CONCURRENCY = int(os.getenv("AI_MAP_CONCURRENCY", "4"))
+MAX_KEY_CONCEPTS = 20
+
+# Study packs for documents at least this long (and short enough for a single
+# call) are generated in one combined call, so the document is sent and billed
+# once instead of once per artifact. Shorter documents are cheap to resend and
+# come back sooner as parallel calls.
+STUDY_PACK_COMBINED_MIN_CHARS = int(os.getenv("AI_STUDY_PACK_COMBINED_MIN_CHARS", "40000"))
+STUDY_PACK_ARTIFACTS = ("analysis", "quiz", "flashcards")
+
+# Route each task to its own models with failover (see model_router); off uses
+# the registry's active model for everything
+ROUTING_ENABLED = os.getenv("AI_ROUTING", "on") == "on"
+
+# Sized for MAX_CONCURRENCY; only used by models without an async API
+_executor = None
+_semaphore = None
+_semaphore_loop = None
+_background_semaphore = None
+_background_semaphore_loop = None
+_history_compactor = None
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="gemini")
+    return _executor
+
+def get_semaphore() -> asyncio.Semaphore:
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    # A semaphore belongs to one event loop; recreate it if the loop changed
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        _semaphore_loop = loop
+    return _semaphore
+
+def get_background_semaphore() -> asyncio.Semaphore:
+    global _background_semaphore, _background_semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _background_semaphore is None or _background_semaphore_loop is not loop:
+        _background_semaphore = asyncio.Semaphore(BACKGROUND_CONCURRENCY)
+        _background_semaphore_loop = loop
+    return _background_semaphore
+
+@asynccontextmanager
+async def generation_slot():
+    """
+    Hold one of the MAX_CONCURRENCY Gemini slots. Background work must first get
+    one of its own BACKGROUND_CONCURRENCY slots, so bulk jobs can never take
+    every slot away from interactive requests such as chat.
+    """
+    if background_work.get():
+        async with get_background_semaphore():
+            async with get_semaphore():
+                yield
+    else:
+        async with get_semaphore():
+            yield
+
+def _model_name(model) -> str:
+    return str(getattr(model, "model_name", ""))
+
+def _total_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    total = getattr(usage, "total_token_count", None)
+    return total if isinstance(total, int) else None
+
+async def _generate_content(model, prompt, generation_config, timing: Optional[CallTiming] = None):
+    """
+    Call the model without holding a thread for the duration of the request when
+    the SDK offers an async API, falling back to the dedicated executor otherwise.
+    The call waits for the model's shared rate limiter before it is sent; timing,
+    if given, measures only the request itself.
+    """
+    queued = time.perf_counter()
+    async with generation_slot():
+        async with get_rate_limiter(_model_name(model)).slot(estimate_tokens(prompt)) as slot:
+            STAGE_SECONDS.observe(time.perf_counter() - queued, stage="queue")
+            LLM_IN_FLIGHT.inc()
+            try:
+                with stage("llm"), model_call(timing):
+                    generate_async = getattr(model, "generate_content_async", None)
+                    if inspect.iscoroutinefunction(generate_async):
+                        response = await generate_async(prompt, generation_config=generation_config)
+                    else:
+                        loop = asyncio.get_running_loop()
+                        response = await loop.run_in_executor(
+                            get_executor(),
+                            functools.partial(model.generate_content, prompt, generation_config=generation_config)
+                        )
+            finally:
+                LLM_IN_FLIGHT.dec()
+            record_usage(_model_name(model), getattr(response, "usage_metadata", None))
+            total_tokens = _total_tokens(response)
+            if total_tokens is not None:
+                slot.record_usage(total_tokens)
+            return response
+
+def _count_failure(model, error: Exception, retrying: bool):
+    name = _model_name(model)
+    if "429" in str(error):
+        LLM_RATE_LIMITED.inc(model=name)
+    if retrying:
+        LLM_RETRIES.inc(model=name)
+    else:
+        LLM_ERRORS.inc(model=name)
+
+def _retry_delay(delay: float) -> float:
+    # Jitter spreads out clients that were rate limited at the same moment
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def get_model(task: Optional[str] = None):
+    """
+    The model for a task: routed across several models when routing is on,
+    otherwise the shared client for the active Gemini model (see model_registry).
+    """
+    if task and ROUTING_ENABLED:
+        return RoutedModel(task, get_model_router())
+    return get_model_registry().get_client()
 
-async def generate_content_with_retry(model, prompt, retries=3, delay=2, mime_type="application/json"):
+async def generate_content_with_retry(model, prompt, retries=3, delay=2, mime_type="application/json", timing: Optional[CallTiming] = None):
     """
     Helper to handle rate limits with simple backoff.
     """
+    if isinstance(model, RoutedModel):
+        # Retries happen per model; the router fails over once they run out
+        return await model.router.call(
+            model.task,
+            lambda name, timing: generate_content_with_retry(get_model_registry().get_client(name), prompt, retries, delay, mime_type, timing)
+        )
+
     for attempt in range(retries):
         try:
             # Configure generation options
             generation_config = {"response_mime_type": mime_type} if mime_type else {}
             
-            # Run sync generation in thread pool to avoid blocking
-            response = await asyncio.to_thread(
-                model.generate_content, 
-                prompt, 
-                generation_config=generation_config
-            )
+            response = await _generate_content(model, prompt, generation_config, timing)
             return response
         except Exception as e:
-            if "429" in str(e) and attempt < retries - 1:
-                print(f"Rate limit hit, retrying in {delay}s... (Attempt {attempt + 1}/{retries})")
-                await asyncio.sleep(delay)
+            retrying = "429" in str(e) and attempt < retries - 1
+            _count_failure(model, e, retrying)
+            if retrying:
+                wait = _retry_delay(delay)
+                logger.warning("Rate limit hit, retrying", extra={"model": _model_name(model), "wait_seconds": round(wait, 1), "attempt": attempt + 1, "retries": retries})
+                await asyncio.sleep(wait)
                 delay *= 2  # Exponential backoff
             else:
                 raise e
 
-async def analyze_text(text: str, language: str = "en") -> Dict[str, Any]:
+async def _stream_content(model, prompt, generation_config, timing: Optional[CallTiming] = None) -> AsyncIterator[str]:
     """
-    Analyze the provided text to extract key concepts, summary, and difficulty.
+    Yield text chunks as the model produces them. Chunks are pulled one at a time,
+    so a slow consumer slows down the upstream read instead of buffering.
     """
-    model = get_model()
-    
+    queued = time.perf_counter()
+    async with generation_slot():
+        async with get_rate_limiter(_model_name(model)).slot(estimate_tokens(prompt)):
+            STAGE_SECONDS.observe(time.perf_counter() - queued, stage="queue")
+            LLM_IN_FLIGHT.inc()
+            chunk = None
+            try:
+                # Includes time the consumer spent between chunks
+                with stage("llm_stream"), model_call(timing):
+                    generate_async = getattr(model, "generate_content_async", None)
+                    if inspect.iscoroutinefunction(generate_async):
+                        response = await generate_async(prompt, generation_config=generation_config, stream=True)
+                        async for chunk in response:
+                            yield chunk.text
+                    else:
+                        loop = asyncio.get_running_loop()
+                        executor = get_executor()
+                        response = await loop.run_in_executor(
+                            executor,
+                            functools.partial(model.generate_content, prompt, generation_config=generation_config, stream=True)
+                        )
+                        chunks = iter(response)
+                        done = object()
+                        while True:
+                            next_chunk = await loop.run_in_executor(executor, next, chunks, done)
+                            if next_chunk is done:
+                                break
+                            chunk = next_chunk
+                            yield chunk.text
+            finally:
+                LLM_IN_FLIGHT.dec()
+            # The last chunk carries the usage of the whole stream
+            record_usage(_model_name(model), getattr(chunk, "usage_metadata", None))
+
+async def stream_content_with_retry(model, prompt, retries=3, delay=2, mime_type="text/plain", timing: Optional[CallTiming] = None) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of generate_content_with_retry. Rate limits are only
+    retried before the first chunk; once text has been sent it cannot be replayed.
+    """
+    if isinstance(model, RoutedModel):
+        async for text in _stream_routed(model, prompt, retries, delay, mime_type):
+            yield text
+        return
+
+    generation_config = {"response_mime_type": mime_type} if mime_type else {}
+    for attempt in range(retries):
+        stream = _stream_content(model, prompt, generation_config, timing)
+        started = False
+        try:
+            async for text in stream:
+                started = True
+                yield text
+            return
+        except Exception as e:
+            retrying = "429" in str(e) and not started and attempt < retries - 1
+            _count_failure(model, e, retrying)
+            if retrying:
+                wait = _retry_delay(delay)
+                logger.warning("Rate limit hit, retrying", extra={"model": _model_name(model), "wait_seconds": round(wait, 1), "attempt": attempt + 1, "retries": retries})
+                await asyncio.sleep(wait)
+                delay *= 2  # Exponential backoff
+            else:
+                raise e
+        finally:
+            await stream.aclose()
+
+async def _stream_routed(model: RoutedModel, prompt, retries, delay, mime_type) -> AsyncIterator[str]:
+    """
+    Stream from the router's first candidate, failing over to the next one only
+    if nothing has been sent yet. Streams are never hedged.
+    """
+    router = model.router
+    candidates = router.candidates(model.task)
+    for i, name in enumerate(candidates):
+        timing = CallTiming()
+        stream = stream_content_with_retry(get_model_registry().get_client(name), prompt, retries, delay, mime_type, timing)
+        started = False
+        try:
+            async for text in stream:
+                started = True
+                yield text
+            router.record_timing(name, timing, ok=True)
+            return
+        except Exception as e:
+            router.record_timing(name, timing, ok=False)
+            if started or i == len(candidates) - 1:
+                raise e
+            logger.warning("Model failed before streaming, trying the next one", extra={"model": name, "task": model.task, "error": str(e)})
+        finally:
+            await stream.aclose()
+
+def _check_object(value: Any):
+    if not isinstance(value, dict):
+        raise TypeError(f"Expected a JSON object, got {type(value).__name__}")
+
+def _check_analysis(value: Any):
+    _check_object(value)
+    AnalyzeResponse(**value)
+
+def _check_analysis_merge(value: Any):
+    # key_concepts are ranked from the partial analyses, not asked of the model
+    _check_object(value)
+    AnalyzeResponse(**{**value, "key_concepts": []})
+
+def _check_quiz(value: Any):
+    QuizResponse(questions=value)
+
+def _check_flashcards(value: Any):
+    FlashcardResponse(flashcards=value)
+
+def _is_valid(text: str, validate: Optional[Callable[[Any], None]]) -> bool:
+    """
+    Whether a JSON answer parses and, with a validator, has the expected shape.
+    """
+    try:
+        value = json.loads(text)
+        if validate is not None:
+            validate(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+async def generate_text_cached(model, prompt, language, mime_type="application/json",
+                               validate: Optional[Callable[[Any], None]] = None) -> str:
+    """
+    Generate through the response cache. Identical prompts for the same model,
+    config and language are answered from the cache instead of calling Gemini,
+    and concurrent identical requests wait on a single in-flight call.
+    validate(parsed answer) raises TypeError or ValueError (pydantic's
+    ValidationError is one) on an answer that must not be cached.
+    """
+    cache = get_response_cache()
+    generation_config = {"response_mime_type": mime_type} if mime_type else {}
+    key = make_cache_key(_model_name(model), prompt, generation_config, language)
+
+    cached = await cache.get(key)
+    if cached is not None:
+        return cached
+
+    async def generate() -> str:
+        response = await generate_content_with_retry(model, prompt, mime_type=mime_type)
+        text = response.text
+        # Never cache a malformed answer; let the caller fail on it instead
+        if mime_type == "application/json" and not _is_valid(text, validate):
+            return text
+        await cache.set(key, text)
+        return text
+
+    return await _in_flight_generations.do(key, generate)
+
+async def stream_json_array_cached(model, prompt, language, validate: Optional[Callable[[Any], None]] = None) -> AsyncIterator[Any]:
+    """
+    Generate a JSON array and yield its elements as they finish streaming.
+    A cached answer is replayed directly, and a complete stream that passes
+    validate (see generate_text_cached) is cached so the non-streaming
+    endpoints can reuse it.
+    """
+    cache = get_response_cache()
+    generation_config = {"response_mime_type": "application/json"}
+    key = make_cache_key(_model_name(model), prompt, generation_config, language)
+
+    cached = await cache.get(key)
+    if cached is not None:
+        for item in json.loads(cached):
+            yield item
+        return
+
+    parser = JsonArrayStreamParser()
+    chunks = []
+    stream = stream_content_with_retry(model, prompt, mime_type="application/json")
+    try:
+        async for text in stream:
+            chunks.append(text)
+            for item in parser.feed(text):
+                yield item
+    finally:
+        await stream.aclose()
+
+    text = "".join(chunks)
+    if _is_valid(text, validate):
+        await cache.set(key, text)
+
+@timed_stage("parse")
+def _parse_json(text: str) -> Any:
+    return json.loads(text)
+
+def _analysis_persona(language: str) -> str:
+    return "Agis comme un professeur passionné et captivant. Utilise des analogies claires, sois vivant et encourageant, tout en restant précis. Évite le jargon robotique ou trop académique." if language == 'fr' else "Act as a passionate and engaging professor. Use clear analogies, be lively and encouraging, while remaining precise. Avoid robotic or overly academic jargon."
+
+@timed_stage("prompt_build")
+def _build_analysis_prompt(text: str, language: str) -> str:
     # Persona instruction
-    persona = "Agis comme un professeur passionné et captivant. Utilise des analogies claires, sois vivant et encourageant, tout en restant précis. Évite le jargon robotique ou trop académique." if language == 'fr' else "Act as a passionate and engaging professor. Use clear analogies, be lively and encouraging, while remaining precise. Avoid robotic or overly academic jargon."
+    persona = _analysis_persona(language)
 
-    prompt = f"""
+    return f"""
     {persona}
     
     Language requirement: Respond strictly in {language} (e.g. French/Français if language='fr', Spanish/Español if language='es').
@@ -104,18 +407,157 @@ async def analyze_text(text: str, language: str = "en") -> Dict[str, Any]:
     {text[:500000]}
     """
 
-    response = await generate_content_with_retry(model, prompt)
-    return json.loads(response.text)
+@timed_stage("prompt_build")
+def _build_analysis_merge_prompt(partials: List[Dict[str, Any]], language: str) -> str:
+    return f"""
+    {_analysis_persona(language)}
+    
+    Language requirement: Respond strictly in {language} (e.g. French/Français if language='fr', Spanish/Español if language='es').
 
-async def generate_quiz(text: str, language: str = "en", num_questions: int = 5) -> List[Dict[str, Any]]:
+    The following JSON objects analyze consecutive parts of the same course, in order.
+    Merge them into one analysis of the whole course and return a JSON object with these fields:
+    - summary: A concise summary of the whole course (max 150 words).
+    - difficulty: One of ["Beginner", "Intermediate", "Advanced"] (Translate these terms to target language if needed).
+    - estimated_study_time: A string estimate for the whole course (e.g., "12 hours").
+
+    Partial analyses:
+    {json.dumps(partials, ensure_ascii=False)}
     """
-    Generate a quiz based on the text.
+
+def split_for_map(text: str) -> List[str]:
     """
-    model = get_model()
-    
+    Split a long document into parts for map-reduce, cutting at paragraph or
+    page breaks where possible.
+    """
+    return chunk_text(text, chunk_chars=MAP_CHUNK_CHARS, overlap=0)
+
+def _split_count(total: int, parts: int) -> List[int]:
+    """
+    Spread total items as evenly as possible over parts. When there are more
+    parts than items, the items go to evenly spaced parts.
+    """
+    if parts <= total:
+        return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+    counts = [0] * parts
+    for i in range(total):
+        counts[i * parts // total] = 1
+    return counts
+
+def _normalize_key(value: str) -> str:
+    return " ".join(str(value).lower().split())
+
+def _dedupe(items: List[Any], key) -> List[Any]:
+    seen = set()
+    unique = []
+    for item in items:
+        k = _normalize_key(key(item))
+        if k not in seen:
+            seen.add(k)
+            unique.append(item)
+    return unique
+
+async def _map_chunks(chunks: List[str], func) -> List[Any]:
+    """
+    Run func(chunk) for every chunk with at most MAP_CONCURRENCY in flight,
+    returning the results in document order. The first failure cancels the
+    other chunks.
+    """
+    semaphore = asyncio.Semaphore(MAP_CONCURRENCY)
+
+    async def run(chunk):
+        async with semaphore:
+            return await func(chunk)
+
+    tasks = [asyncio.ensure_future(run(chunk)) for chunk in chunks]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def analyze_text(text: str, language: str = "en") -> Dict[str, Any]:
+    """
+    Analyze the provided text to extract key concepts, summary, and difficulty.
+    Long documents are analyzed part by part in parallel, then merged.
+    """
+    model = get_model("analyze")
+
+    if len(text) <= MAP_REDUCE_MIN_CHARS:
+        prompt = _build_analysis_prompt(text, language)
+        response_text = await generate_text_cached(model, prompt, language, validate=_check_analysis)
+        return _parse_json(response_text)
+
+    async def analyze_chunk(chunk):
+        response_text = await generate_text_cached(model, _build_analysis_prompt(chunk, language), language, validate=_check_analysis)
+        return _parse_json(response_text)
+
+    partials = await _map_chunks(split_for_map(text), analyze_chunk)
+
+    # Concepts found in several parts come first
+    counts: Dict[str, int] = {}
+    labels: Dict[str, str] = {}
+    for partial in partials:
+        for concept in _dedupe(partial.get("key_concepts", []), key=lambda c: c):
+            k = _normalize_key(concept)
+            counts[k] = counts.get(k, 0) + 1
+            labels.setdefault(k, concept)
+    ranked = sorted(counts, key=lambda k: -counts[k])
+
+    merged = _parse_json(await generate_text_cached(model, _build_analysis_merge_prompt(partials, language), language,
+                                                   validate=_check_analysis_merge))
+    merged["key_concepts"] = [labels[k] for k in ranked[:MAX_KEY_CONCEPTS]]
+    return merged
+
+def _map_tasks(model, text: str, total: int, build_prompt, language: str, validate) -> List[asyncio.Future]:
+    chunks = split_for_map(text)
+    semaphore = asyncio.Semaphore(MAP_CONCURRENCY)
+
+    async def generate(chunk, count):
+        async with semaphore:
+            return _parse_json(await generate_text_cached(model, build_prompt(chunk, count), language, validate=validate))
+
+    return [
+        asyncio.ensure_future(generate(chunk, count))
+        for chunk, count in zip(chunks, _split_count(total, len(chunks)))
+        if count > 0
+    ]
+
+async def _map_array(model, text: str, total: int, build_prompt, language: str, validate) -> List[Any]:
+    """
+    Generate a JSON array per part of a long document, asking each part for its
+    share of total items, and concatenate the results in document order.
+    """
+    tasks = _map_tasks(model, text, total, build_prompt, language, validate)
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return [item for result in results for item in result]
+
+async def _map_array_as_completed(model, text: str, total: int, build_prompt, language: str, validate) -> AsyncIterator[Any]:
+    """
+    Same as _map_array, but yields items from whichever part finishes first.
+    """
+    tasks = _map_tasks(model, text, total, build_prompt, language, validate)
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for item in await next_done:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def _renumber(questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    for i, question in enumerate(questions, start=1):
+        question["id"] = i
+    return questions
+
+@timed_stage("prompt_build")
+def _build_quiz_prompt(text: str, language: str, num_questions: int) -> str:
     persona = "Agis comme un professeur passionné et captivant." if language == 'fr' else "Act as a passionate and engaging professor."
 
-    prompt = f"""
+    return f"""
     {persona}
     
     Language requirement: Respond strictly in {language} (e.g. French/Français if language='fr', Spanish/Español if language='es').
@@ -134,31 +576,122 @@ async def generate_quiz(text: str, language: str = "en", num_questions: int = 5)
     Text:
     {text[:500000]}
     """
-    
-    response = await generate_content_with_retry(model, prompt)
-    return json.loads(response.text)
 
-async def chat_with_document(context_text: str, user_message: str, history: List[Dict[str, str]], language: str = "en") -> str:
+async def generate_quiz(text: str, language: str = "en", num_questions: int = 5) -> List[Dict[str, Any]]:
     """
-    Chat with the document context.
+    Generate a quiz based on the text.
     """
-    model = get_model()
+    model = get_model("quiz")
+
+    if len(text) > MAP_REDUCE_MIN_CHARS:
+        questions = await _map_array(model, text, num_questions, lambda chunk, n: _build_quiz_prompt(chunk, language, n), language, _check_quiz)
+        return _renumber(_dedupe(questions, key=lambda q: q.get("question", "")))[:num_questions]
     
-    prompt = f"""
-    You are a helpful AI tutor.
-    Context:
-    {context_text[:500000]}
+    prompt = _build_quiz_prompt(text, language, num_questions)
     
+    response_text = await generate_text_cached(model, prompt, language, validate=_check_quiz)
+    return _parse_json(response_text)
+
+async def stream_quiz(text: str, language: str = "en", num_questions: int = 5) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Generate a quiz, yielding each question as soon as it is complete.
+    """
+    model = get_model("quiz")
+
+    if len(text) > MAP_REDUCE_MIN_CHARS:
+        seen = set()
+        async for question in _map_array_as_completed(model, text, num_questions, lambda chunk, n: _build_quiz_prompt(chunk, language, n), language, _check_quiz):
+            k = _normalize_key(question.get("question", ""))
+            if k not in seen:
+                seen.add(k)
+                question["id"] = len(seen)
+                yield question
+        return
+
+    prompt = _build_quiz_prompt(text, language, num_questions)
+
+    async for question in stream_json_array_cached(model, prompt, language, validate=_check_quiz):
+        yield question
+
+CHAT_SYSTEM_INSTRUCTION = "You are a helpful AI tutor."
+
+async def _summarize_history(summary: Optional[str], messages: List[Dict[str, str]]) -> str:
+    """
+    Fold older chat messages into the running summary of the conversation.
+    """
+    # Runs behind the chat request, so it yields to interactive calls
+    background_work.set(True)
+    model = get_model("summary")
+    prompt = f"""
+    Summarize this tutoring conversation so it can replace the messages themselves.
+    Keep the topics covered, what the student understood or struggled with, and any open questions.
+    At most {SUMMARY_TOKEN_BUDGET * 3 // 4} words, in the conversation's language.
+
+    Summary so far:
+    {summary or "(none)"}
+
+    New messages:
+    {json.dumps(messages)}
+    """
+    response = await generate_content_with_retry(model, prompt, mime_type="text/plain")
+    return response.text.strip()
+
+def get_history_compactor() -> HistoryCompactor:
+    global _history_compactor
+    if _history_compactor is None:
+        _history_compactor = HistoryCompactor(_summarize_history)
+    return _history_compactor
+
+def _build_chat_turn_prompt(user_message: str, history: List[Dict[str, str]], language: str, summary: Optional[str] = None) -> str:
+    earlier = f"""
+    Summary of the earlier conversation:
+    {summary}
+    """ if summary else ""
+    return f"""
     Instructions:
     - Answer the user's question based on the context.
     - Be an engaging professor.
     - Language: {language}.
-    
+    {earlier}
     Conversation History:
     {json.dumps(history)}
     
     User Question: {user_message}
     """
+
+@timed_stage("prompt_build")
+def _build_chat_prompt(context_text: str, user_message: str, history: List[Dict[str, str]], language: str, index=None, summary: Optional[str] = None) -> str:
+    context = select_context(context_text, user_message, history, index=index)
+    return f"""
+    {CHAT_SYSTEM_INSTRUCTION}
+    Context:
+    {context[:500000]}
+    """ + _build_chat_turn_prompt(user_message, history, language, summary)
+
+async def _chat_model_and_prompt(context_text: str, user_message: str, history: List[Dict[str, str]], language: str, index=None):
+    """
+    With context caching on, a document long enough to cache is sent once as
+    provider-side cached content and each turn only sends history and question.
+    Otherwise the (retrieved) context goes into every prompt. Long histories
+    are cut to the recent messages plus a rolling summary of the older ones.
+    """
+    summary, history = get_history_compactor().compact(history)
+    context_cache = get_context_cache()
+    if context_cache is not None:
+        model = await context_cache.get_client(CHAT_SYSTEM_INSTRUCTION, f"Context:\n{context_text[:500000]}")
+        if model is not None:
+            return model, _build_chat_turn_prompt(user_message, history, language, summary)
+    if index is None and len(context_text) > FULL_CONTEXT_CHARS:
+        # Inline text has no stored index: build it off the event loop, once per text
+        index = await asyncio.to_thread(cached_index, context_text)
+    return get_model("chat"), _build_chat_prompt(context_text, user_message, history, language, index=index, summary=summary)
+
+async def chat_with_document(context_text: str, user_message: str, history: List[Dict[str, str]], language: str = "en", index=None) -> str:
+    """
+    Chat with the document context. Large documents are reduced to the chunks
+    most relevant to the question; pass the document's prebuilt index if any.
+    """
+    model, prompt = await _chat_model_and_prompt(context_text, user_message, history, language, index=index)
     
     # Use retry logic with text/plain for chat
     response = await generate_content_with_retry(model, prompt, mime_type="text/plain")
@@ -166,43 +699,73 @@ async def chat_with_document(context_text: str, user_message: str, history: List
     # Response is not JSON here, it's text
     return response.text
 
-async def generate_study_plan(topics: List[str], exam_date: str, hours_per_day: int, language: str = "en") -> List[Dict[str, str]]:
+async def stream_chat_with_document(context_text: str, user_message: str, history: List[Dict[str, str]], language: str = "en", index=None) -> AsyncIterator[str]:
     """
-    Generate a study plan based on topics and constraints.
+    Chat with the document context, yielding the answer as it is generated.
     """
-    model = get_model()
-    
-    prompt = f"""
+    model, prompt = await _chat_model_and_prompt(context_text, user_message, history, language, index=index)
+
+    async for text in stream_content_with_retry(model, prompt, mime_type="text/plain"):
+        yield text
+
+@timed_stage("prompt_build")
+def _build_plan_descriptions_prompt(sessions: List[Tuple[str, str]], exam_date: str, hours_per_day: float, language: str) -> str:
+    lines = "\n".join(f"{i}. {topic} | {activity}" for i, (topic, activity) in enumerate(sessions, 1))
+    return f"""
     Act as an expert study planner.
-    
+
     Language requirement: Respond strictly in {language}.
-    
-    Create a detailed study schedule up to the exam date: {exam_date}.
-    Available study time per day: {hours_per_day} hours.
-    Topics to cover: {', '.join(topics)}.
-    
-    Spread the topics intelligently. Include review sessions.
-    
-    Return a JSON array of objects. Each object representing a study session:
-    - date: "YYYY-MM-DD"
-    - topic: The specific topic or sub-topic.
-    - activity: Type of activity (e.g., "Read", "Practice", "Review", "Quiz").
-    - duration: Estimated duration (e.g., "1h", "30 min").
-    - description: Short advice for this session.
-    
-    Ensure the plan covers all topics before the exam date.
+
+    A student is preparing for an exam on {exam_date}, studying {hours_per_day} hours per day.
+    Their schedule is already set. For each numbered "topic | activity" below, write one
+    short, concrete piece of advice for that session (one or two sentences).
+
+    {lines}
+
+    Return a JSON object mapping each number (as a string) to its advice.
     """
-    
-    response = await generate_content_with_retry(model, prompt)
-    return json.loads(response.text)
 
-async def generate_flashcards(text: str, num_cards: int = 10, language: str = "en") -> List[Dict[str, str]]:
+async def _describe_sessions(plan: List[Dict[str, str]], exam_date: str, hours_per_day: float, language: str):
     """
-    Generate flashcards (Front/Back) from text.
+    Replace the template descriptions with advice written by the model, in one
+    call covering every distinct topic and activity. On any failure the
+    template descriptions stay.
     """
-    model = get_model()
-    
-    prompt = f"""
+    sessions = list(dict.fromkeys((session["topic"], session["activity"]) for session in plan))
+    model = get_model("plan")
+    prompt = _build_plan_descriptions_prompt(sessions, exam_date, hours_per_day, language)
+    try:
+        advice = _parse_json(await generate_text_cached(model, prompt, language, validate=_check_object))
+    except Exception as e:
+        logger.warning("Could not describe study plan sessions", extra={"error": str(e)})
+        return
+    if not isinstance(advice, dict):
+        return
+    numbers = {pair: str(i) for i, pair in enumerate(sessions, 1)}
+    for session in plan:
+        text = advice.get(numbers[(session["topic"], session["activity"])])
+        if isinstance(text, str) and text.strip():
+            session["description"] = text.strip()
+
+async def generate_study_plan(topics: List[str], exam_date: str, hours_per_day: float, language: str = "en",
+                              start_date: Optional[str] = None, describe: bool = True) -> List[Dict[str, str]]:
+    """
+    Generate a study plan based on topics and constraints.
+
+    The calendar itself is laid out locally (see study_planner.build_schedule),
+    so it always ends before the exam and stays within hours_per_day; the model
+    is only asked, in one cached call, for the advice in each description.
+    """
+    with stage("schedule"):
+        start = parse_date(start_date) if start_date else None
+        plan = build_schedule(topics, exam_date, hours_per_day, language, start=start)
+    if describe and plan:
+        await _describe_sessions(plan, exam_date, hours_per_day, language)
+    return plan
+
+@timed_stage("prompt_build")
+def _build_flashcards_prompt(text: str, num_cards: int, language: str) -> str:
+    return f"""
     Act as an expert educator.
     
     Language requirement: Respond strictly in {language}.
@@ -217,6 +780,145 @@ async def generate_flashcards(text: str, num_cards: int = 10, language: str = "e
     Text:
     {text[:500000]}
     """
+
+async def generate_flashcards(text: str, num_cards: int = 10, language: str = "en") -> List[Dict[str, str]]:
+    """
+    Generate flashcards (Front/Back) from text.
+    """
+    model = get_model("flashcards")
+
+    if len(text) > MAP_REDUCE_MIN_CHARS:
+        cards = await _map_array(model, text, num_cards, lambda chunk, n: _build_flashcards_prompt(chunk, n, language), language, _check_flashcards)
+        return _dedupe(cards, key=lambda c: c.get("front", ""))[:num_cards]
+    
+    prompt = _build_flashcards_prompt(text, num_cards, language)
     
-    response = await generate_content_with_retry(model, prompt)
-    return json.loads(response.text)
+    response_text = await generate_text_cached(model, prompt, language, validate=_check_flashcards)
+    return _parse_json(response_text)
+
+async def stream_flashcards(text: str, num_cards: int = 10, language: str = "en") -> AsyncIterator[Dict[str, str]]:
+    """
+    Generate flashcards, yielding each card as soon as it is complete.
+    """
+    model = get_model("flashcards")
+
+    if len(text) > MAP_REDUCE_MIN_CHARS:
+        seen = set()
+        async for card in _map_array_as_completed(model, text, num_cards, lambda chunk, n: _build_flashcards_prompt(chunk, n, language), language, _check_flashcards):
+            k = _normalize_key(card.get("front", ""))
+            if k not in seen:
+                seen.add(k)
+                yield card
+        return
+
+    prompt = _build_flashcards_prompt(text, num_cards, language)
+
+    async for card in stream_json_array_cached(model, prompt, language, validate=_check_flashcards):
+        yield card
+
+@timed_stage("prompt_build")
+def _build_study_pack_prompt(text: str, artifacts: List[str], language: str, num_questions: int, num_cards: int) -> str:
+    fields = {
+        "analysis": """- analysis: A JSON object with these fields:
+      - summary: A concise summary of the content (max 150 words).
+      - key_concepts: A list of strings, representing the most important concepts.
+      - difficulty: One of ["Beginner", "Intermediate", "Advanced"] (Translate these terms to target language if needed).
+      - estimated_study_time: A string estimate (e.g., "2 hours").""",
+        "quiz": f"""- quiz: A JSON array of {num_questions} quiz questions, mixing question types. Each object should have:
+      - id: A unique integer id.
+      - type: One of "multiple_choice", "true_false".
+      - question: The question text.
+      - options: A list of possible answers (strings). For "true_false", use ["True", "False"] (translated).
+      - correct_answer: The exact string of the correct answer from the options.
+      - explanation: A detailed explanation of why it's correct and why others are wrong (in the target language).""",
+        "flashcards": f"""- flashcards: A JSON array of {num_cards} flashcards on the key concepts (definitions, key dates, formulas, or core concepts). Each object:
+      - front: The question or concept (Recto).
+      - back: The answer or definition (Verso).""",
+    }
+    requested = "\n    ".join(fields[name] for name in artifacts)
+
+    return f"""
+    {_analysis_persona(language)}
+    
+    Language requirement: Respond strictly in {language} (e.g. French/Français if language='fr', Spanish/Español if language='es').
+
+    From the following course content, build study material and return a single JSON object with these fields:
+    {requested}
+
+    Text:
+    {text[:500000]}
+    """
+
+async def _seed_cache(task: str, prompt: str, language: str, value: Any):
+    """
+    Store one artifact of a combined generation under the key its own endpoint
+    would use, so a later /analyze, /quiz or /flashcards call is a cache hit.
+    """
+    generation_config = {"response_mime_type": "application/json"}
+    key = make_cache_key(_model_name(get_model(task)), prompt, generation_config, language)
+    await get_response_cache().set(key, json.dumps(value, ensure_ascii=False))
+
+async def _combined_study_pack(text: str, artifacts: List[str], language: str, num_questions: int, num_cards: int) -> Dict[str, Any]:
+    model = get_model("study_pack")
+    prompt = _build_study_pack_prompt(text, artifacts, language, num_questions, num_cards)
+    result = _parse_json(await generate_text_cached(model, prompt, language, validate=_check_object))
+
+    # Only artifacts that pass their schema are used and seeded; the rest are
+    # generated separately
+    seeds = {
+        "analysis": ("analyze", _check_analysis, lambda: _build_analysis_prompt(text, language)),
+        "quiz": ("quiz", _check_quiz, lambda: _build_quiz_prompt(text, language, num_questions)),
+        "flashcards": ("flashcards", _check_flashcards, lambda: _build_flashcards_prompt(text, num_cards, language)),
+    }
+    pack = {}
+    for name in artifacts:
+        task, validate, build_prompt = seeds[name]
+        try:
+            validate(result.get(name))
+        except (TypeError, ValueError) as e:
+            logger.warning("Invalid artifact in combined study pack", extra={"artifact": name, "error": str(e)})
+            continue
+        pack[name] = result[name]
+        await _seed_cache(task, build_prompt(), language, pack[name])
+    return pack
+
+async def stream_study_pack(text: str, artifacts: List[str], language: str = "en", num_questions: int = 5,
+                            num_cards: int = 10) -> AsyncIterator[Tuple[str, Any, Optional[Exception]]]:
+    """
+    Generate several artifacts for one document, yielding (artifact, result,
+    error) as each one finishes. Mid-sized documents go out as one combined call
+    (see STUDY_PACK_COMBINED_MIN_CHARS); anything it did not return, and every
+    artifact of other documents, is generated by concurrent per-artifact calls.
+    """
+    artifacts = [name for name in STUDY_PACK_ARTIFACTS if name in artifacts]
+    remaining = list(artifacts)
+
+    if len(artifacts) > 1 and STUDY_PACK_COMBINED_MIN_CHARS <= len(text) <= MAP_REDUCE_MIN_CHARS:
+        try:
+            pack = await _combined_study_pack(text, artifacts, language, num_questions, num_cards)
+        except Exception as e:
+            logger.warning("Combined study pack failed, generating artifacts separately", extra={"error": str(e)})
+            pack = {}
+        for name in artifacts:
+            if name in pack:
+                remaining.remove(name)
+                yield name, pack[name], None
+
+    generators = {
+        "analysis": lambda: analyze_text(text, language=language),
+        "quiz": lambda: generate_quiz(text, language=language, num_questions=num_questions),
+        "flashcards": lambda: generate_flashcards(text, num_cards=num_cards, language=language),
+    }
+    tasks = {asyncio.ensure_future(generators[name]()): name for name in remaining}
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    yield tasks[task], None, task.exception()
+                else:
+                    yield tasks[task], task.result(), None
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.rate_limiter import estimate_tokens
+
+# Recent messages sent verbatim: at most this many, within this many tokens
+HISTORY_WINDOW_MESSAGES = int(os.getenv("CHAT_HISTORY_WINDOW_MESSAGES", "8"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+# Older messages are folded into a rolling summary of about this size
+SUMMARY_TOKEN_BUDGET = int(os.getenv("CHAT_SUMMARY_TOKEN_BUDGET", "400"))
+# Summaries kept in memory, one per summarized conversation prefix
+MAX_SUMMARIES = int(os.getenv("CHAT_MAX_SUMMARIES", "4096"))
+
+logger = logging.getLogger(__name__)
+
+Message = Dict[str, str]
+# summarize(previous summary or None, messages to fold in) -> new summary
+Summarizer = Callable[[Optional[str], List[Message]], Awaitable[str]]
+
+def message_tokens(message: Message) -> int:
+    return estimate_tokens(message.get("content", "")) + 4
+
+def _prefix_keys(messages: List[Message]) -> List[str]:
+    """
+    keys[i] identifies messages[:i]. Each key chains the previous one, so a
+    conversation's prefixes are hashed in one pass.
+    """
+    keys = [hashlib.sha256(b"").hexdigest()]
+    for message in messages:
+        payload = keys[-1] + json.dumps([message.get("role"), message.get("content")])
+        keys.append(hashlib.sha256(payload.encode("utf-8")).hexdigest())
+    return keys
+
+class HistoryCompactor:
+    """
+    Keeps chat prompts a flat size however long the session gets.
+
+    The newest messages (up to HISTORY_WINDOW_MESSAGES and HISTORY_TOKEN_BUDGET)
+    are sent as they are; everything older is replaced by a rolling summary.
+    Summaries are keyed by a hash of the conversation prefix they cover, and are
+    extended incrementally in the background (old summary + newly dropped
+    messages), so no turn waits for one: a turn uses the newest summary
+    available, and the messages it does not cover yet (usually the one exchange
+    that just left the window) are sent verbatim along with the recent ones.
+    """
+
+    def __init__(self, summarize: Summarizer, window: int = HISTORY_WINDOW_MESSAGES,
+                 token_budget: int = HISTORY_TOKEN_BUDGET, max_summaries: int = MAX_SUMMARIES):
+        self.summarize = summarize
+        self.window = window
+        self.token_budget = token_budget
+        self.max_summaries = max_summaries
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    def _split(self, history: List[Message]) -> int:
+        """
+        Index where the recent window starts.
+        """
+        start = len(history)
+        tokens = 0
+        while start > 0 and len(history) - start < self.window:
+            tokens += message_tokens(history[start - 1])
+            if tokens > self.token_budget and start < len(history):
+                break
+            start -= 1
+        return start
+
+    def _latest_summary(self, keys: List[str], end: int) -> Tuple[int, Optional[str]]:
+        for i in range(end, 0, -1):
+            summary = self._summaries.get(keys[i])
+            if summary is not None:
+                self._summaries.move_to_end(keys[i])
+                return i, summary
+        return 0, None
+
+    def compact(self, history: List[Message]) -> Tuple[Optional[str], List[Message]]:
+        """
+        (summary of the older messages or None, messages to send verbatim).
+        Together they cover the whole history: whatever the summary does not
+        cover yet is sent verbatim.
+        """
+        start = self._split(history)
+        if start == 0:
+            return None, history
+
+        keys = _prefix_keys(history[:start])
+        covered, summary = self._latest_summary(keys, start)
+        if covered < start:
+            self._schedule(keys[start], summary, history[covered:start])
+        return summary, history[covered:]
+
+    def _schedule(self, key: str, summary: Optional[str], messages: List[Message]):
+        if key in self._pending:
+            return
+        task = asyncio.ensure_future(self._extend(key, summary, messages))
+        self._pending[key] = task
+        task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+    async def _extend(self, key: str, summary: Optional[str], messages: List[Message]):
+        try:
+            new_summary = await self.summarize(summary, messages)
+        except Exception as e:
+            # The next turn tries again
+            logger.warning("Could not summarize chat history", extra={"error": str(e)})
+            return
+        self._summaries[key] = new_summary[:SUMMARY_TOKEN_BUDGET * 4]
+        while len(self._summaries) > self.max_summaries:
+            self._summaries.popitem(last=False)
+
+    async def wait_pending(self):
+        """
+        Let scheduled summaries finish (used by tests and on shutdown).
+        """
+        if self._pending:
+            await asyncio.gather(*self._pending.values(), return_exceptions=True)
@@ -0,0 +1,169 @@
+import asyncio
+import datetime
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from app.services.model_registry import get_model_registry, load_genai
+from app.services.single_flight import SingleFlight
+
+# Provider-side caching of a document's chat prefix: "gemini" or "none" (default)
+CONTEXT_CACHE_PROVIDER = os.getenv("AI_CONTEXT_CACHE", "none")
+# Context caching needs an explicit, versioned model
+CONTEXT_CACHE_MODEL = os.getenv("AI_CONTEXT_CACHE_MODEL", "gemini-1.5-flash-002")
+CONTEXT_CACHE_TTL_SECONDS = float(os.getenv("AI_CONTEXT_CACHE_TTL_SECONDS", "1800"))
+# A cache used this close to expiry gets its TTL extended again
+CONTEXT_CACHE_REFRESH_SECONDS = float(os.getenv("AI_CONTEXT_CACHE_REFRESH_SECONDS", "300"))
+# The provider refuses smaller caches; shorter documents are sent inline
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("AI_CONTEXT_CACHE_MIN_TOKENS", "32768"))
+# Provider caches are billed per hour of storage, so only keep the most recent ones
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("AI_CONTEXT_CACHE_MAX_ENTRIES", "64"))
+# After a failed create, send the document inline for this long before trying again
+CONTEXT_CACHE_RETRY_SECONDS = 300
+
+logger = logging.getLogger(__name__)
+
+class GeminiContextCacheProvider:
+    """
+    Gemini context caching through google.generativeai.caching. Calls block,
+    so ContextCache runs them in a thread.
+    """
+
+    def __init__(self, model_name: str = CONTEXT_CACHE_MODEL):
+        self.model_name = model_name
+
+    def create(self, system_instruction: str, contents: str, ttl: float) -> Any:
+        get_model_registry().configure()
+        from google.generativeai import caching
+        return caching.CachedContent.create(
+            model=self.model_name,
+            system_instruction=system_instruction,
+            contents=[contents],
+            ttl=datetime.timedelta(seconds=ttl),
+        )
+
+    def refresh(self, handle: Any, ttl: float):
+        handle.update(ttl=datetime.timedelta(seconds=ttl))
+
+    def delete(self, handle: Any):
+        handle.delete()
+
+    def client(self, handle: Any) -> Any:
+        return load_genai().GenerativeModel.from_cached_content(cached_content=handle)
+
+@dataclass
+class _Entry:
+    handle: Any
+    expires_at: float
+    # Built once per cache and reused by every turn
+    client: Any = None
+
+class ContextCache:
+    """
+    Provider-side cached content for document prefixes, keyed by the SHA-256 of
+    the prefix. Caches are created once per prefix (concurrent turns share the
+    create), their TTL is extended while they are in use, and the least recently
+    used ones are deleted beyond max_entries. A prefix that could not be cached
+    is sent inline for CONTEXT_CACHE_RETRY_SECONDS before it is tried again.
+    """
+
+    def __init__(self, provider: Any, ttl: float = CONTEXT_CACHE_TTL_SECONDS,
+                 refresh_before: float = CONTEXT_CACHE_REFRESH_SECONDS,
+                 min_tokens: int = CONTEXT_CACHE_MIN_TOKENS, max_entries: int = CONTEXT_CACHE_MAX_ENTRIES):
+        self.provider = provider
+        self.ttl = ttl
+        self.refresh_before = refresh_before
+        self.min_tokens = min_tokens
+        self.max_entries = max_entries
+        self.creates = 0
+        self.hits = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Oldest failure first: they all wait the same time, so expire in order
+        self._failed_until: "OrderedDict[str, float]" = OrderedDict()
+        self._in_flight = SingleFlight()
+
+    def accepts(self, system_instruction: str, contents: str) -> bool:
+        # Roughly four characters per token, as in rate_limiter.estimate_tokens
+        return (len(system_instruction) + len(contents)) // 4 >= self.min_tokens
+
+    async def get_client(self, system_instruction: str, contents: str) -> Optional[Any]:
+        """
+        A model client whose requests start with this prefix, or None when the
+        prefix is too short or the provider could not cache it.
+        """
+        if not self.accepts(system_instruction, contents):
+            return None
+        key = hashlib.sha256(f"{system_instruction}\0{contents}".encode("utf-8")).hexdigest()
+        if self._failed_until.get(key, 0) > time.monotonic():
+            return None
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if entry.expires_at - time.monotonic() < self.refresh_before:
+                await self._refresh(key, entry)
+            return entry.client
+
+        try:
+            entry = await self._in_flight.do(key, lambda: self._create(key, system_instruction, contents))
+        except Exception as e:
+            logger.warning("Context cache unavailable, sending the document inline", extra={"error": str(e)})
+            self._record_failure(key)
+            return None
+        return entry.client
+
+    def _record_failure(self, key: str):
+        now = time.monotonic()
+        self._failed_until.pop(key, None)
+        while self._failed_until and next(iter(self._failed_until.values())) <= now:
+            self._failed_until.popitem(last=False)
+        self._failed_until[key] = now + CONTEXT_CACHE_RETRY_SECONDS
+
+    async def _create(self, key: str, system_instruction: str, contents: str) -> _Entry:
+        handle = await asyncio.to_thread(self.provider.create, system_instruction, contents, self.ttl)
+        self.creates += 1
+        entry = _Entry(handle, time.monotonic() + self.ttl, self.provider.client(handle))
+        self._entries[key] = entry
+        self._failed_until.pop(key, None)
+        while len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            await self._delete(evicted)
+        return entry
+
+    async def _refresh(self, key: str, entry: _Entry):
+        try:
+            await asyncio.to_thread(self.provider.refresh, entry.handle, self.ttl)
+            entry.expires_at = time.monotonic() + self.ttl
+        except Exception as e:
+            # Still valid until it expires; the next turn after that creates a new one
+            logger.warning("Could not extend context cache", extra={"error": str(e)})
+
+    async def _delete(self, entry: _Entry):
+        try:
+            await asyncio.to_thread(self.provider.delete, entry.handle)
+        except Exception as e:
+            # It expires on its own at the end of its TTL
+            logger.warning("Could not delete context cache", extra={"error": str(e)})
+
+    async def clear(self):
+        entries, self._entries = list(self._entries.values()), OrderedDict()
+        for entry in entries:
+            await self._delete(entry)
+        self._failed_until.clear()
+
+_context_cache = None
+
+def get_context_cache() -> Optional[ContextCache]:
+    """
+    The shared context cache, or None when context caching is turned off.
+    """
+    global _context_cache
+    if _context_cache or CONTEXT_CACHE_PROVIDER != "gemini":
+        return _context_cache
+    _context_cache = ContextCache(GeminiContextCacheProvider(CONTEXT_CACHE_MODEL))
+    return _context_cache
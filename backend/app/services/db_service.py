@@ -1,5 +1,9 @@
 import os
-from supabase import create_client, Client
+from typing import TYPE_CHECKING
+from app.services.xp_writer import get_xp_writer
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 # TODO: Move these to environment variables for production
 SUPABASE_URL = os.getenv("SUPABASE_URL", "https://elemiywbemevklssilhz.supabase.co")
@@ -7,7 +11,7 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.e
 
 _supabase_client = None
 
-def get_supabase() -> Client:
+def get_supabase() -> "Client":
     global _supabase_client
     if _supabase_client:
         return _supabase_client
@@ -15,15 +19,15 @@ def get_supabase() -> Client:
     if not SUPABASE_URL or not SUPABASE_KEY:
         raise Exception("Supabase URL and Key are required.")
         
+    # Imported on first use; the supabase package is slow to import
+    from supabase import create_client
     _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
     return _supabase_client
 
-# Example function to save gamification data
 def save_xp(user_id: str, xp: int, level: int):
-    # This will fail if table doesn't exist yet
-    supabase = get_supabase()
-    data = {"user_id": user_id, "xp": xp, "level": level}
-    # Upsert logic
-    response = supabase.table("profiles").upsert(data).execute()
-    return response
-
+    """
+    Queue the user's XP and level for the profiles table. Returns at once; the
+    write-behind buffer upserts them with other users' updates in bulk (see
+    xp_writer). Call from the event loop thread.
+    """
+    get_xp_writer().record(user_id, xp, level)
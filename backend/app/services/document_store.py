@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.services.extraction_cache import get_extraction_cache
+from app.services.retrieval_service import FULL_CONTEXT_CHARS, build_index
+
+# Number of characters echoed back to the client after an upload
+PREVIEW_CHARS = 500
+
+# Documents are kept in memory, least recently used first out
+MAX_DOCUMENTS = int(os.getenv("DOCUMENT_STORE_MAX_DOCUMENTS", "256"))
+
+@dataclass
+class PageText:
+    page_number: int
+    text: str
+    # Position of this page in the document text: text == document.text[start:end]
+    start: int
+    end: int
+
+@dataclass
+class StoredDocument:
+    document_id: str
+    filename: str
+    text: str
+    # Retrieval index for chat, built at upload time
+    index: Any = None
+    pages: List[PageText] = field(default_factory=list)
+
+    @property
+    def preview(self) -> str:
+        return self.text[:PREVIEW_CHARS]
+
+_documents: "OrderedDict[str, StoredDocument]" = OrderedDict()
+
+def compute_document_id(content: bytes) -> str:
+    """
+    Content address of an uploaded file: the SHA-256 of its raw bytes.
+    """
+    return hashlib.sha256(content).hexdigest()
+
+def join_pages(page_texts: List[str]) -> Tuple[str, List[PageText]]:
+    """
+    Join page texts once, one page per line block, recording where each page sits.
+    """
+    pages = []
+    offset = 0
+    for number, page_text in enumerate(page_texts, start=1):
+        pages.append(PageText(page_number=number, text=page_text, start=offset, end=offset + len(page_text)))
+        offset += len(page_text) + 1
+    return "".join(page_text + "\n" for page_text in page_texts), pages
+
+def build_document_index(text: str) -> Any:
+    """
+    Retrieval index for chat; only documents too large to send whole need one.
+    """
+    return build_index(text) if len(text) > FULL_CONTEXT_CHARS else None
+
+def put_document(document_id: str, filename: str, text: str, index: Any = None, pages: Optional[List[PageText]] = None) -> StoredDocument:
+    document = StoredDocument(document_id=document_id, filename=filename, text=text, index=index, pages=pages or [])
+    _documents[document_id] = document
+    _documents.move_to_end(document_id)
+    while len(_documents) > MAX_DOCUMENTS:
+        _documents.popitem(last=False)
+    return document
+
+def get_document(document_id: str) -> Optional[StoredDocument]:
+    document = _documents.get(document_id)
+    if document is not None:
+        _documents.move_to_end(document_id)
+    return document
+
+def _restore_document(document_id: str) -> Optional[Tuple[str, List[PageText], Any]]:
+    """
+    Text, pages and index of a document rebuilt from the extraction cache, or
+    None if it was never extracted (or the cache is off).
+    """
+    cache = get_extraction_cache()
+    page_texts = cache.get(document_id) if cache is not None else None
+    if page_texts is None:
+        return None
+    text, pages = join_pages(page_texts)
+    return text, pages, build_document_index(text)
+
+async def load_document(document_id: str) -> Optional[StoredDocument]:
+    """
+    A document by id, from memory or, after an eviction, a restart or on
+    another worker, from the persistent extraction cache keyed by the same hash.
+    """
+    document = get_document(document_id)
+    if document is not None:
+        return document
+    restored = await asyncio.to_thread(_restore_document, document_id)
+    if restored is None:
+        return None
+    text, pages, index = restored
+    return put_document(document_id, "", text, index, pages)
+
+def get_document_index(document_id: Optional[str]) -> Any:
+    document = get_document(document_id) if document_id else None
+    return document.index if document is not None else None
+
+def clear_documents():
+    _documents.clear()
+
+async def resolve_document_text(text: Optional[str], document_id: Optional[str]) -> str:
+    """
+    Return the text an AI request refers to, either inline or by document id.
+    """
+    if document_id:
+        document = await load_document(document_id)
+        if document is None:
+            raise HTTPException(status_code=404, detail="Document not found. Please upload it again.")
+        return document.text
+    if text is None:
+        raise HTTPException(status_code=400, detail="Either text or document_id is required")
+    return text
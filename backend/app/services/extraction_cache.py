@@ -0,0 +1,102 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+# Extracted page text of every uploaded PDF, by the SHA-256 of its bytes, so a
+# file uploaded again (by anyone, after a restart too) is never parsed twice.
+# Backend: "sqlite" (default) or "none"
+EXTRACTION_CACHE_BACKEND = os.getenv("EXTRACTION_CACHE_BACKEND", "sqlite")
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", "extraction_cache.sqlite3")
+# Compressed size kept on disk; least recently used documents go first
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+class ExtractionCache:
+    """
+    SQLite table of zlib-compressed page texts plus metadata, bounded by the
+    total compressed size and evicted least recently used first.
+    """
+
+    def __init__(self, path: str = EXTRACTION_CACHE_PATH, max_bytes: int = EXTRACTION_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                document_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                page_count INTEGER NOT NULL,
+                text_chars INTEGER NOT NULL,
+                pages BLOB NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS extractions_lru ON extractions (last_used)")
+        self._conn.commit()
+
+    def get(self, document_id: str) -> Optional[List[str]]:
+        """
+        Page texts of a cached document, in page order, or None.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT pages FROM extractions WHERE document_id = ?", (document_id,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE extractions SET last_used = ? WHERE document_id = ?", (time.time(), document_id))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def put(self, document_id: str, filename: str, page_texts: List[str]):
+        blob = zlib.compress(json.dumps(page_texts, ensure_ascii=False).encode("utf-8"), 6)
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (document_id, filename, page_count, text_chars, pages, size_bytes, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (document_id, filename, len(page_texts), sum(len(t) for t in page_texts), blob, len(blob), now, now),
+            )
+            total = self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM extractions").fetchone()[0]
+            while total > self.max_bytes:
+                oldest = self._conn.execute(
+                    "SELECT document_id, size_bytes FROM extractions ORDER BY last_used LIMIT 1"
+                ).fetchone()
+                self._conn.execute("DELETE FROM extractions WHERE document_id = ?", (oldest[0],))
+                total -= oldest[1]
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM extractions")
+            self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM extractions").fetchone()
+        return {"documents": count, "size_bytes": size, "hits": self.hits, "misses": self.misses}
+
+_extraction_cache = None
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """
+    The shared extraction cache, or None when it is turned off.
+    """
+    global _extraction_cache
+    if _extraction_cache or EXTRACTION_CACHE_BACKEND == "none":
+        return _extraction_cache
+    _extraction_cache = ExtractionCache(EXTRACTION_CACHE_PATH, EXTRACTION_CACHE_MAX_BYTES)
+    return _extraction_cache
@@ -1,26 +1,200 @@
-import io
-from pypdf import PdfReader
+import asyncio
+import hashlib
+import logging
+import mmap
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import BinaryIO, List, Optional, Tuple
 from fastapi import UploadFile, HTTPException
+from app.services.document_store import PageText, StoredDocument, build_document_index, get_document, join_pages, put_document
+from app.services.extraction_cache import get_extraction_cache
+from app.services.metrics import CACHE_REQUESTS, stage
+
+# Worker processes for PDF parsing; pypdf is pure Python, so threads would not help
+EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+# Below this many pages a single worker parses the whole file
+PAGES_PER_WORKER_MIN = int(os.getenv("PDF_PAGES_PER_WORKER_MIN", "25"))
+# How worker processes are started. "forkserver" (where available) forks them
+# from a clean helper process, not from the server, whose other threads (the
+# Gemini SDK's gRPC channels, started by the pre-warm) may hold locks
+PDF_WORKER_START_METHOD = os.getenv("PDF_WORKER_START_METHOD", "forkserver")
+
+# Uploads are copied to disk in chunks of this size, never held whole in memory
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "100")) * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None
+
+logger = logging.getLogger(__name__)
+
+_process_pool = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        method = PDF_WORKER_START_METHOD if PDF_WORKER_START_METHOD in multiprocessing.get_all_start_methods() else None
+        _process_pool = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _process_pool
+
+def _discard_process_pool(pool: ProcessPoolExecutor):
+    """
+    Drop a broken pool (a worker died, e.g. killed for using too much memory)
+    so the next get_process_pool() starts a new one.
+    """
+    global _process_pool
+    if _process_pool is pool:
+        _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _import_pdf_parser():
+    import pypdf  # noqa: F401
+
+async def warm_process_pool():
+    """
+    Start the PDF worker processes and load pypdf in them, so the first
+    upload does not pay for either.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    await asyncio.gather(*[loop.run_in_executor(pool, _import_pdf_parser) for _ in range(EXTRACTION_WORKERS)])
+
+@contextmanager
+def _open_pdf(path: str):
+    """
+    Open a PDF through a read-only memory map, so pages are read from the page
+    cache on demand instead of being copied into the process.
+    """
+    # Imported here: only worker processes parse PDFs, the server process never needs pypdf
+    from pypdf import PdfReader
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield PdfReader(mapped)
+
+def _count_pages(path: str) -> int:
+    with _open_pdf(path) as reader:
+        return len(reader.pages)
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """
+    Runs in a worker process: extract the text of pages [start, stop).
+    """
+    with _open_pdf(path) as reader:
+        return [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+def _page_ranges(page_count: int, workers: int) -> List[Tuple[int, int]]:
+    parts = max(1, min(workers, page_count // PAGES_PER_WORKER_MIN))
+    size, extra = divmod(page_count, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        stop = start + size + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+async def _parse_in_pool(pool: ProcessPoolExecutor, path: str) -> List[str]:
+    loop = asyncio.get_running_loop()
+    page_count = await loop.run_in_executor(pool, _count_pages, path)
+    ranges = _page_ranges(page_count, EXTRACTION_WORKERS)
+    results = await asyncio.gather(*[
+        loop.run_in_executor(pool, _extract_page_range, path, start, stop)
+        for start, stop in ranges
+    ])
+    return [page_text for result in results for page_text in result]
+
+async def _parse_page_texts(path: str) -> List[str]:
+    """
+    Parse a PDF file in the process pool, splitting its pages across workers,
+    without blocking the event loop. If a worker died, the pool is replaced
+    and the file parsed once more.
+    """
+    pool = get_process_pool()
+    try:
+        return await _parse_in_pool(pool, path)
+    except BrokenProcessPool:
+        logger.warning("PDF worker process died, starting a new pool")
+        _discard_process_pool(pool)
+    return await _parse_in_pool(get_process_pool(), path)
+
+async def extract_pages(path: str, document_id: Optional[str] = None, filename: str = "") -> Tuple[str, List[PageText]]:
+    """
+    Text and pages of a PDF file. With its document id, a file extracted before
+    is read back from the extraction cache instead of being parsed again.
+    """
+    cache = get_extraction_cache() if document_id else None
+    if cache is not None:
+        page_texts = await asyncio.to_thread(cache.get, document_id)
+        CACHE_REQUESTS.inc(cache="extraction", result="hit" if page_texts is not None else "miss")
+        if page_texts is not None:
+            return join_pages(page_texts)
+
+    with stage("extraction"):
+        page_texts = await _parse_page_texts(path)
+    if cache is not None:
+        await asyncio.to_thread(cache.put, document_id, filename, page_texts)
+    return join_pages(page_texts)
+
+async def spool_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[str, str]:
+    """
+    Copy an upload to a temporary file chunk by chunk, hashing it on the way.
+    Returns (path, sha256). Fails with 413 as soon as max_bytes is exceeded.
+    The caller owns the file and must delete it.
+    """
+    # Starlette has already spooled the body: copy it in one go in a thread
+    # rather than one event-loop round trip per chunk
+    return await asyncio.to_thread(_copy_upload, file.file, max_bytes)
+
+def _copy_upload(source: BinaryIO, max_bytes: int) -> Tuple[str, str]:
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=UPLOAD_TMP_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File too large. Maximum upload size is {max_bytes // (1024 * 1024)} MB.")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
 
 async def extract_text_from_pdf(file: UploadFile) -> str:
     """
     Extract text from an uploaded PDF file.
     """
+    document = await extract_document_from_pdf(file)
+    return document.text
+
+async def extract_document_from_pdf(file: UploadFile) -> StoredDocument:
+    """
+    Extract an uploaded PDF into the document store, keyed by the hash of its bytes.
+    Re-uploading the same file returns the stored document without parsing it
+    again, from memory or, after eviction or a restart, from the extraction cache.
+    """
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDF allowed.")
 
+    path, document_id = await spool_upload(file)
     try:
-        content = await file.read()
-        pdf_file = io.BytesIO(content)
-        reader = PdfReader(pdf_file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        
-        # Reset file cursor for other operations if needed, though we read it all
+        document = get_document(document_id)
+        if document is None:
+            text, pages = await extract_pages(path, document_id, file.filename or "")
+            index = await asyncio.to_thread(build_document_index, text)
+            document = put_document(document_id, file.filename, text, index, pages)
+
+        # Reset file cursor for other operations if needed
         await file.seek(0)
-        
-        return text
+
+        return document
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
-
+    finally:
+        os.remove(path)
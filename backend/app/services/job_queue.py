@@ -0,0 +1,266 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.services.ai_service import background_work
+
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Queued (not yet running) jobs accepted before submissions are refused
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "1000"))
+# Finished jobs are kept this long for polling, then deleted
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", str(24 * 3600)))
+# A running job belongs to the process that claimed it for this long, renewed
+# while it runs; once a lease runs out (its process died) the job is queued again
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+# Lower runs first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BULK = 10
+
+FINISHED = ("done", "failed")
+
+# kind -> async handler(payload) returning a JSON-serializable result
+_handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]] = {}
+
+def register_job_handler(kind: str, handler: Callable[[Dict[str, Any]], Awaitable[Any]]):
+    _handlers[kind] = handler
+
+class QueueFullError(Exception):
+    pass
+
+class JobQueue:
+    """
+    Bounded, priority-ordered job queue persisted in SQLite and run by a small
+    pool of asyncio workers in this process.
+
+    Jobs are rows with a kind, a JSON payload and a priority. Workers claim the
+    oldest job with the lowest priority value, run the handler registered for
+    its kind and store the JSON result. Several processes can share one
+    database: a claim only succeeds for the process whose UPDATE moves the job
+    out of "queued", and the claiming process holds a lease on the job that it
+    renews while the job runs. Jobs left queued when a process stops, or whose
+    lease expired because their process died, are picked up again.
+
+    Database work (each write is a commit) runs in a thread, off the event loop.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_MAX,
+                 lease_seconds: float = JOB_LEASE_SECONDS):
+        self.path = path
+        self.workers = workers
+        self.max_queued = max_queued
+        self.lease_seconds = lease_seconds
+        # Identifies this queue's leases among the processes sharing the database
+        self.owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                owner TEXT,
+                lease_until REAL
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                # Databases created before leases: their running rows count as expired
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created_at)")
+        self._conn.commit()
+        self._tasks = []
+        self._loop = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished: Dict[str, asyncio.Event] = {}
+
+    def _execute(self, query: str, params=()):
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            self._conn.commit()
+            return cursor
+
+    def _fetchone(self, query: str, params=()):
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()
+
+    def start(self):
+        """
+        Start the workers on the running event loop (again, if the loop changed).
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._finished = {}
+        self._requeue_expired()
+        self._execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (time.time() - JOB_RESULT_TTL_SECONDS,))
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._keep_leases()))
+        self._wakeup.set()
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit(self, kind: str, payload: Dict[str, Any], priority: int = PRIORITY_NORMAL) -> str:
+        if kind not in _handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        self.start()
+        job_id = await asyncio.to_thread(self._insert, kind, payload, priority)
+        self._wakeup.set()
+        return job_id
+
+    def _insert(self, kind: str, payload: Dict[str, Any], priority: int) -> str:
+        queued = self._fetchone("SELECT COUNT(*) FROM jobs WHERE status = 'queued'")[0]
+        if queued >= self.max_queued:
+            raise QueueFullError("Job queue is full, please retry later")
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, kind, priority, payload, status, created_at, updated_at) VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+            (job_id, kind, priority, json.dumps(payload), now, now),
+        )
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._fetchone("SELECT id, kind, status, result, error, created_at, updated_at FROM jobs WHERE id = ?", (job_id,))
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "result": json.loads(row[3]) if row[3] is not None else None,
+            "error": row[4],
+            "created_at": row[5],
+            "updated_at": row[6],
+        }
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Return the job once it has finished, or its current state after timeout.
+        """
+        job = await self.get(job_id)
+        if job is None or job["status"] in FINISHED or timeout <= 0:
+            return job
+        event = self._finished.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return await self.get(job_id)
+
+    def _requeue_expired(self) -> int:
+        """
+        Queue again the running jobs whose lease ran out (any process's).
+        """
+        return self._execute(
+            "UPDATE jobs SET status = 'queued', owner = NULL, lease_until = NULL, updated_at = ? "
+            "WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?)",
+            (time.time(), time.time()),
+        ).rowcount
+
+    async def _keep_leases(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if await asyncio.to_thread(self._renew_leases):
+                self._wakeup.set()
+
+    def _renew_leases(self) -> int:
+        """
+        Extend this process's leases, then requeue expired ones; returns how many were requeued.
+        """
+        self._execute(
+            "UPDATE jobs SET lease_until = ? WHERE status = 'running' AND owner = ?",
+            (time.time() + self.lease_seconds, self.owner),
+        )
+        return self._requeue_expired()
+
+    def _claim(self) -> Optional[tuple]:
+        with self._lock:
+            while True:
+                row = self._conn.execute(
+                    "SELECT id, kind, payload FROM jobs WHERE status = 'queued' ORDER BY priority, created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                # Another process may have claimed it since the SELECT; then try the next one
+                claimed = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, updated_at = ? WHERE id = ? AND status = 'queued'",
+                    (self.owner, now + self.lease_seconds, now, row[0]),
+                ).rowcount
+                self._conn.commit()
+                if claimed:
+                    return row
+
+    async def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None):
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+        )
+        event = self._finished.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def _worker(self):
+        background_work.set(True)
+        while True:
+            # Clear before looking, so a submit in between is not missed
+            self._wakeup.clear()
+            job = await asyncio.to_thread(self._claim)
+            if job is None:
+                await self._wakeup.wait()
+                continue
+            # Let the other idle workers look for more work too
+            self._wakeup.set()
+
+            job_id, kind, payload = job
+            try:
+                handler = _handlers.get(kind)
+                if handler is None:
+                    raise ValueError(f"Unknown job kind: {kind}")
+                result = await handler(json.loads(payload))
+                await self._finish(job_id, "done", result=result)
+            except asyncio.CancelledError:
+                # Shutting down: leave the job to be resumed on the next start
+                self._execute(
+                    "UPDATE jobs SET status = 'queued', owner = NULL, lease_until = NULL WHERE id = ? AND owner = ?",
+                    (job_id, self.owner),
+                )
+                raise
+            except Exception as e:
+                await self._finish(job_id, "failed", error=str(getattr(e, "detail", e)))
+
+_job_queue = None
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    if _job_queue:
+        return _job_queue
+    _job_queue = JobQueue(JOB_QUEUE_PATH, JOB_WORKERS, JOB_QUEUE_MAX)
+    return _job_queue
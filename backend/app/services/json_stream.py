@@ -0,0 +1,78 @@
+import json
+from typing import Any, List
+
+class JsonArrayStreamParser:
+    """
+    Incrementally parse a top-level JSON array fed in arbitrary chunks.
+
+    feed() returns the elements completed by that chunk, so each object can be
+    used as soon as its closing brace arrives instead of after the whole array.
+    Only a light scan for strings and nesting is done here; every element is
+    still decoded by json.loads.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._element_start = None
+
+    def feed(self, chunk: str) -> List[Any]:
+        self._buffer += chunk
+        items = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        items.append(self._take(i + 1))
+            elif char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._element_start = i
+            elif char in "[{":
+                self._depth += 1
+                if self._depth == 2:
+                    self._element_start = i
+            elif char in "]}":
+                self._depth -= 1
+                if self._depth == 1:
+                    items.append(self._take(i + 1))
+            elif self._depth == 1 and char not in ", \t\r\n":
+                # Scalar element (number, true, false, null): ends at , or ]
+                end = self._find_scalar_end(buffer, i)
+                if end is None:
+                    break
+                self._element_start = i
+                items.append(self._take(end))
+                i = end
+                continue
+            i += 1
+
+        # Drop what has been consumed so the buffer stays small
+        keep_from = self._element_start if self._element_start is not None else i
+        self._buffer = buffer[keep_from:]
+        self._pos = i - keep_from
+        if self._element_start is not None:
+            self._element_start = 0
+        return items
+
+    def _find_scalar_end(self, buffer: str, start: int):
+        for j in range(start, len(buffer)):
+            if buffer[j] in ",]" or buffer[j].isspace():
+                return j
+        return None
+
+    def _take(self, end: int) -> Any:
+        start = self._element_start
+        self._element_start = None
+        return json.loads(self._buffer[start:end])
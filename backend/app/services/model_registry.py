@@ -0,0 +1,158 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# google.generativeai, imported on first use: it is most of the app's import time
+genai = None
+
+# Priority list: 1.5 Flash (Stable & Fast) -> 2.0 Flash (Newer) -> Pro
+PREFERRED_MODELS = [
+    "gemini-1.5-flash",
+    "gemini-1.5-flash-latest",
+    "gemini-2.0-flash",
+    "gemini-1.5-pro",
+    "gemini-pro"
+]
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+logger = logging.getLogger(__name__)
+
+def load_genai():
+    global genai
+    if genai is None:
+        import google.generativeai
+        genai = google.generativeai
+    return genai
+
+# How often the list of available models is refreshed in the background
+MODEL_REFRESH_SECONDS = float(os.getenv("MODEL_REFRESH_SECONDS", "3600"))
+
+class ModelRegistry:
+    """
+    Holds the Gemini configuration and model clients for the whole process.
+
+    The SDK is configured once, available models are listed at startup and then
+    on a schedule in the background (never on the request path), and model
+    clients are built once per (model, generation config) and reused.
+    """
+
+    def __init__(self, preferred_models: List[str] = PREFERRED_MODELS):
+        self.preferred_models = preferred_models
+        self.active_model: Optional[str] = None
+        self.available_models: List[str] = []
+        self.last_refresh: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._configured = False
+        self._clients: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._started = False
+
+    def configure(self):
+        if self._configured:
+            return
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise Exception("GEMINI_API_KEY not configured")
+        load_genai().configure(api_key=api_key)
+        self._configured = True
+
+    def _choose(self, available_models: List[str]) -> str:
+        for model in self.preferred_models:
+            if model in available_models:
+                return model
+        # Fallback if specific aliases aren't found but we have a list
+        gemini_models = [m for m in available_models if "gemini" in m]
+        if gemini_models:
+            return gemini_models[0]
+        return DEFAULT_MODEL
+
+    def refresh(self):
+        """
+        List available models and pick the active one. On failure the current
+        choice is kept (or the default used) until the next scheduled refresh.
+        """
+        self.configure()
+        try:
+            available = [m.name.replace("models/", "") for m in load_genai().list_models() if 'generateContent' in m.supported_generation_methods]
+            chosen = self._choose(available)
+            self.available_models = available
+            self.last_error = None
+            if chosen != self.active_model:
+                logger.info("Selected Gemini model", extra={"model": chosen})
+            self.active_model = chosen
+        except Exception as e:
+            logger.warning("Could not list Gemini models", extra={"error": str(e), "model": self.active_model or DEFAULT_MODEL})
+            self.last_error = str(e)
+            if self.active_model is None:
+                self.active_model = DEFAULT_MODEL
+        finally:
+            self.last_refresh = time.time()
+
+    def get_client(self, model_name: Optional[str] = None, generation_config: Optional[Dict[str, Any]] = None):
+        """
+        Return the shared client for a model (the active one by default).
+        """
+        self.configure()
+        if self.last_refresh is None and not self._started:
+            # Not started through the app lifespan: select a model once, lazily.
+            # Once started, the default model is used until the first listing.
+            with self._lock:
+                if self.last_refresh is None:
+                    self.refresh()
+        name = model_name or self.active_model or DEFAULT_MODEL
+        key = (name, json.dumps(generation_config, sort_keys=True) if generation_config else None)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = load_genai().GenerativeModel(name, generation_config=generation_config)
+                    self._clients[key] = client
+        return client
+
+    def start(self):
+        """
+        Keep the model selection fresh in the background: list models right
+        away, then on the refresh schedule. Requests never wait for a listing;
+        until the first one finishes they use DEFAULT_MODEL.
+        Does nothing without an API key, so the app can still start.
+        """
+        if not os.getenv("GEMINI_API_KEY"):
+            logger.warning("GEMINI_API_KEY not configured, skipping model registry startup")
+            return
+        self._started = True
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.ensure_future(self._refresh_periodically())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.to_thread(self.refresh)
+            await asyncio.sleep(MODEL_REFRESH_SECONDS)
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "active_model": self.active_model,
+            "available_models": self.available_models,
+            "last_refresh": self.last_refresh,
+            "last_error": self.last_error,
+        }
+
+_model_registry = None
+
+def get_model_registry() -> ModelRegistry:
+    global _model_registry
+    if _model_registry:
+        return _model_registry
+    _model_registry = ModelRegistry()
+    return _model_registry
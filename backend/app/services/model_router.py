@@ -0,0 +1,274 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.model_registry import get_model_registry
+
+# Candidate models per task type, tried in order. Tasks without their own entry
+# use "default". (No route by input size: documents too long for one prompt
+# are map-reduced and chat sends retrieved context, so prompts stay well within
+# every model's context window.)
+DEFAULT_ROUTES = {
+    "default": ["gemini-1.5-flash", "gemini-2.0-flash", "gemini-1.5-pro"],
+    # Interactive and latency-bound: never fall back to the slow model
+    "chat": ["gemini-2.0-flash", "gemini-1.5-flash"],
+}
+ROUTES = json.loads(os.getenv("AI_MODEL_ROUTES", "{}")) or DEFAULT_ROUTES
+
+# Rolling window of calls kept per model
+STATS_WINDOW = 100
+# A model is degraded when it fails this often or gets this slow; it is moved to
+# the back of every route for DEGRADED_SECONDS
+DEGRADED_ERROR_RATE = 0.5
+DEGRADED_MIN_SAMPLES = 5
+DEGRADED_CONSECUTIVE_FAILURES = 3
+DEGRADED_P95_SECONDS = float(os.getenv("AI_DEGRADED_P95_SECONDS", "30"))
+DEGRADED_SECONDS = 30.0
+
+# Hedging: after waiting this long (or the primary's p95, if longer) for the
+# first model, send the same request to the next one and keep the first answer
+HEDGING_ENABLED = os.getenv("AI_HEDGING", "off") == "on"
+HEDGE_AFTER_SECONDS = float(os.getenv("AI_HEDGE_AFTER_SECONDS", "4"))
+# How often a call still waiting for its turn locally is checked for hedging
+HEDGE_POLL_SECONDS = 0.25
+
+logger = logging.getLogger(__name__)
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class ModelStats:
+    def __init__(self):
+        self.calls: deque = deque(maxlen=STATS_WINDOW)
+        self.consecutive_failures = 0
+        self.degraded_until = 0.0
+
+    def record(self, latency: float, ok: bool):
+        self.calls.append((latency, ok))
+        self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+        if self._looks_degraded():
+            self.degraded_until = time.monotonic() + DEGRADED_SECONDS
+
+    def _looks_degraded(self) -> bool:
+        if self.consecutive_failures >= DEGRADED_CONSECUTIVE_FAILURES:
+            return True
+        if len(self.calls) < DEGRADED_MIN_SAMPLES:
+            return False
+        p95 = self.p95
+        return self.error_rate >= DEGRADED_ERROR_RATE or (p95 is not None and p95 > DEGRADED_P95_SECONDS)
+
+    @property
+    def degraded(self) -> bool:
+        return time.monotonic() < self.degraded_until
+
+    @property
+    def latencies(self) -> List[float]:
+        return [latency for latency, ok in self.calls if ok]
+
+    @property
+    def p50(self) -> Optional[float]:
+        return _percentile(self.latencies, 0.5)
+
+    @property
+    def p95(self) -> Optional[float]:
+        return _percentile(self.latencies, 0.95)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.calls:
+            return 0.0
+        return sum(1 for _, ok in self.calls if not ok) / len(self.calls)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "calls": len(self.calls),
+            "p50": self.p50,
+            "p95": self.p95,
+            "error_rate": self.error_rate,
+            "degraded": self.degraded,
+        }
+
+class CallTiming:
+    """
+    When the request to the model itself started and how long it took,
+    reported by the generation helpers from inside the concurrency slot and the
+    rate limiter. Local queueing and retry backoff are left out, so a busy app
+    does not make its models look slow.
+    """
+
+    def __init__(self):
+        self.started: Optional[float] = None
+        self.seconds: Optional[float] = None
+
+    @property
+    def in_call(self) -> bool:
+        return self.started is not None and self.seconds is None
+
+    @contextmanager
+    def measure(self):
+        # A retry measures its own attempt
+        self.started = time.perf_counter()
+        self.seconds = None
+        try:
+            yield
+        finally:
+            self.seconds = time.perf_counter() - self.started
+
+@contextmanager
+def model_call(timing: Optional[CallTiming]):
+    """
+    Wrap the request to the model with this, passing the router's timing (or None).
+    """
+    if timing is None:
+        yield
+    else:
+        with timing.measure():
+            yield
+
+class ModelRouter:
+    """
+    Picks the models for a task, tracks rolling latency and error rate per
+    model, fails over when a call fails, and optionally hedges slow calls.
+    """
+
+    def __init__(self, routes: Dict[str, List[str]] = ROUTES, hedging: bool = HEDGING_ENABLED,
+                 hedge_after: float = HEDGE_AFTER_SECONDS):
+        self.routes = routes
+        self.hedging = hedging
+        self.hedge_after = hedge_after
+        self.stats: Dict[str, ModelStats] = {}
+
+    def _stats(self, model_name: str) -> ModelStats:
+        if model_name not in self.stats:
+            self.stats[model_name] = ModelStats()
+        return self.stats[model_name]
+
+    def candidates(self, task: str) -> List[str]:
+        """
+        Models to try for this task, healthy ones first.
+        """
+        route = self.routes.get(task) or self.routes.get("default") or []
+
+        registry = get_model_registry()
+        if registry.available_models:
+            route = [m for m in route if m in registry.available_models]
+        if not route:
+            route = [registry.active_model or "gemini-1.5-flash"]
+
+        healthy = [m for m in route if not self._stats(m).degraded]
+        degraded = [m for m in route if self._stats(m).degraded]
+        return healthy + degraded
+
+    def record(self, model_name: str, latency: float, ok: bool):
+        self._stats(model_name).record(latency, ok)
+
+    def record_timing(self, model_name: str, timing: CallTiming, ok: bool):
+        """
+        Record a call by the time its model took. A call that never reached
+        the model (it failed or was cancelled while queued locally) says
+        nothing about the model and is not recorded.
+        """
+        if timing.seconds is not None:
+            self.record(model_name, timing.seconds, ok)
+
+    async def _timed(self, model_name: str, call: Callable[[str, CallTiming], Awaitable[Any]], timing: CallTiming) -> Any:
+        try:
+            result = await call(model_name, timing)
+        except asyncio.CancelledError:
+            # Lost a hedge race or the caller went away: says nothing about the model
+            raise
+        except Exception:
+            self.record_timing(model_name, timing, ok=False)
+            raise
+        self.record_timing(model_name, timing, ok=True)
+        return result
+
+    def _hedge_delay(self, model_name: str) -> float:
+        p95 = self._stats(model_name).p95
+        return max(self.hedge_after, p95 or 0.0)
+
+    def _hedge_wait(self, model_name: str, timing: CallTiming) -> Optional[float]:
+        """
+        Seconds until the call should be hedged (0: now). The delay counts from
+        when the request reached the model, never from when it was queued.
+        """
+        if not timing.in_call:
+            return None
+        return max(0.0, self._hedge_delay(model_name) - (time.perf_counter() - timing.started))
+
+    async def call(self, task: str, call: Callable[[str, CallTiming], Awaitable[Any]]) -> Any:
+        """
+        Run call(model_name, timing) on the best candidate; call wraps its
+        request to the model in model_call(timing). A failure moves on to the
+        next candidate; with hedging on, a slow call also starts the next
+        candidate and the first success wins (the other call is cancelled).
+        """
+        candidates = self.candidates(task)
+        pending: Dict[asyncio.Task, Tuple[str, CallTiming]] = {}
+        next_index = 0
+        last_error: Optional[BaseException] = None
+
+        def launch():
+            nonlocal next_index
+            model_name = candidates[next_index]
+            next_index += 1
+            timing = CallTiming()
+            pending[asyncio.ensure_future(self._timed(model_name, call, timing))] = (model_name, timing)
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if self.hedging and next_index < len(candidates) and len(pending) == 1:
+                    hedge_in = self._hedge_wait(*next(iter(pending.values())))
+                    if hedge_in == 0:
+                        # Primary is slow: hedge with the next model
+                        launch()
+                        continue
+                    timeout = HEDGE_POLL_SECONDS if hedge_in is None else hedge_in
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task_done in done:
+                    model_name, _ = pending.pop(task_done)
+                    if task_done.exception() is None:
+                        return task_done.result()
+                    last_error = task_done.exception()
+                    logger.warning("Model failed, trying the next one", extra={"model": model_name, "task": task, "error": str(last_error)})
+
+                if not pending and next_index < len(candidates):
+                    launch()
+            raise last_error
+        finally:
+            for task_pending in pending:
+                task_pending.cancel()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.summary() for name, stats in self.stats.items()}
+
+class RoutedModel:
+    """
+    Stands in for a model client: generation helpers given one of these let the
+    router pick (and fail over between) the real models for its task.
+    """
+
+    def __init__(self, task: str, router: ModelRouter):
+        self.task = task
+        self.router = router
+        self.model_name = f"route:{task}"
+
+_model_router = None
+
+def get_model_router() -> ModelRouter:
+    global _model_router
+    if _model_router:
+        return _model_router
+    _model_router = ModelRouter()
+    return _model_router
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# Default per-model budgets; 0 disables a budget
+DEFAULT_RPM = float(os.getenv("GEMINI_RPM", "2000"))
+DEFAULT_TPM = float(os.getenv("GEMINI_TPM", "4000000"))
+# Per-model overrides, e.g. {"gemini-1.5-pro": {"rpm": 360, "tpm": 2000000}}
+MODEL_LIMITS = json.loads(os.getenv("GEMINI_RATE_LIMITS", "{}"))
+# Buckets start full and hold at most this many seconds of budget
+BURST_SECONDS = 10
+
+# Adaptive concurrency window per model
+WINDOW_INITIAL = int(os.getenv("GEMINI_WINDOW_INITIAL", "32"))
+WINDOW_MIN = 1
+WINDOW_MAX = int(os.getenv("GEMINI_WINDOW_MAX", os.getenv("AI_MAX_CONCURRENCY", "64")))
+# One 429 burst should shrink the window once, not once per failed request
+DECREASE_COOLDOWN_SECONDS = 1.0
+
+# Who the current request is for; set per request by TenantMiddleware
+current_tenant: ContextVar[str] = ContextVar("current_tenant", default="anonymous")
+
+def estimate_tokens(prompt: str) -> int:
+    # Roughly four characters per token for the languages we serve
+    return max(1, len(prompt) // 4)
+
+class TokenBucket:
+    """
+    Refills at per_minute / 60 per second, holding at most BURST_SECONDS of budget.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self, amount: float):
+        # A single request larger than the bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, amount: float):
+        """
+        Correct an earlier estimate once the real usage is known.
+        """
+        self._refill()
+        self.tokens -= amount
+
+class ModelLimiter:
+    """
+    Client-side limiter for one model: requests/min and tokens/min token buckets
+    plus an AIMD concurrency window. The window grows by about one slot per
+    window of successful calls and halves on a 429. Waiting requests are served
+    round-robin across tenants, so one user's bulk job cannot starve the others.
+    """
+
+    def __init__(self, rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM,
+                 initial: int = WINDOW_INITIAL, minimum: int = WINDOW_MIN, maximum: int = WINDOW_MAX):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.successes = 0
+        self.rate_limited = 0
+        self._last_decrease = 0.0
+        self._waiting: "OrderedDict[str, deque]" = OrderedDict()
+
+    @property
+    def window(self) -> int:
+        return max(self.minimum, int(self.limit))
+
+    async def _acquire_slot(self, tenant: str):
+        if self.in_flight < self.window and not self._waiting:
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(tenant, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as we were cancelled: hand it on
+                self._release_slot()
+            else:
+                queue = self._waiting.get(tenant)
+                if queue is not None and future in queue:
+                    queue.remove(future)
+                    if not queue:
+                        del self._waiting[tenant]
+            raise
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._waiting and self.in_flight < self.window:
+            tenant, queue = self._waiting.popitem(last=False)
+            future = queue.popleft()
+            if queue:
+                # Back of the line for this tenant's next request
+                self._waiting[tenant] = queue
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def on_success(self):
+        self.successes += 1
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        self._dispatch()
+
+    def on_rate_limited(self):
+        self.rate_limited += 1
+        now = time.monotonic()
+        if now - self._last_decrease >= DECREASE_COOLDOWN_SECONDS:
+            self.limit = max(self.minimum, self.limit / 2)
+            self._last_decrease = now
+
+    def slot(self, estimated_tokens: int, tenant: Optional[str] = None) -> "_Slot":
+        return _Slot(self, estimated_tokens, tenant or current_tenant.get())
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "window": self.window,
+            "in_flight": self.in_flight,
+            "waiting": sum(len(queue) for queue in self._waiting.values()),
+            "successes": self.successes,
+            "rate_limited": self.rate_limited,
+        }
+
+class _Slot:
+    """
+    async with limiter.slot(tokens): hold a window slot and spend budget for one
+    call. A 429 raised inside the block shrinks the window; success grows it.
+    """
+
+    def __init__(self, limiter: ModelLimiter, estimated_tokens: int, tenant: str):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+        self.tenant = tenant
+
+    async def __aenter__(self):
+        await self.limiter._acquire_slot(self.tenant)
+        try:
+            if self.limiter.requests is not None:
+                await self.limiter.requests.take(1)
+            if self.limiter.tokens is not None:
+                await self.limiter.tokens.take(self.estimated_tokens)
+        except BaseException:
+            self.limiter._release_slot()
+            raise
+        return self
+
+    def record_usage(self, total_tokens: int):
+        if self.limiter.tokens is not None:
+            self.limiter.tokens.adjust(total_tokens - self.estimated_tokens)
+            self.estimated_tokens = total_tokens
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc is None:
+            self.limiter.on_success()
+        elif "429" in str(exc):
+            self.limiter.on_rate_limited()
+        self.limiter._release_slot()
+        return False
+
+_limiters: Dict[str, ModelLimiter] = {}
+_limiters_loop = None
+
+def get_rate_limiter(model_name: str) -> ModelLimiter:
+    global _limiters_loop
+    loop = asyncio.get_running_loop()
+    # Waiters are futures of one event loop; start over if the loop changed
+    if _limiters_loop is not loop:
+        _limiters.clear()
+        _limiters_loop = loop
+
+    name = model_name.replace("models/", "")
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limits = MODEL_LIMITS.get(name, {})
+        limiter = ModelLimiter(rpm=float(limits.get("rpm", DEFAULT_RPM)), tpm=float(limits.get("tpm", DEFAULT_TPM)))
+        _limiters[name] = limiter
+    return limiter
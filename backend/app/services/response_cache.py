@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.services.metrics import CACHE_REQUESTS
+
+# Backend selection: "memory" (default), "sqlite" or "none"
+CACHE_BACKEND = os.getenv("AI_CACHE_BACKEND", "memory")
+CACHE_TTL_SECONDS = float(os.getenv("AI_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_MAX_BYTES = int(os.getenv("AI_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_PATH = os.getenv("AI_CACHE_PATH", "ai_cache.sqlite3")
+# How often the SQLite backend deletes expired rows nobody asked for again
+CACHE_PURGE_SECONDS = float(os.getenv("AI_CACHE_PURGE_SECONDS", "600"))
+
+def _normalize_prompt(prompt: str) -> str:
+    # Prompts are built from indented f-strings, so whitespace carries no meaning
+    return " ".join(prompt.split())
+
+def make_cache_key(model_name: str, prompt: str, generation_config: Dict[str, Any], language: str) -> str:
+    """
+    Cache key for a generation: (model, normalized prompt hash, config, language).
+    """
+    prompt_hash = hashlib.sha256(_normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    payload = json.dumps([model_name, prompt_hash, generation_config, language], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class MemoryCacheBackend:
+    """
+    In-process LRU bounded by the total size of keys and values in bytes.
+    """
+
+    # Cheap enough to call on the event loop
+    blocking = False
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry_size(self, key: str, value: str) -> int:
+        return len(key) + len(value.encode("utf-8"))
+
+    def _remove(self, key: str):
+        value, _ = self._entries.pop(key)
+        self.size -= self._entry_size(key, value)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float):
+        entry_size = self._entry_size(key, value)
+        if entry_size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.time() + ttl)
+            self.size += entry_size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+class SQLiteCacheBackend:
+    """
+    On-disk cache that survives restarts, bounded by the total size of keys and
+    values in bytes and evicted least recently used first. Expired rows are
+    dropped when read and purged every CACHE_PURGE_SECONDS.
+    """
+
+    # Every write commits to disk: ResponseCache calls it from a thread
+    blocking = True
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES, purge_seconds: float = CACHE_PURGE_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.purge_seconds = purge_seconds
+        self._purged_at = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                size_bytes INTEGER NOT NULL DEFAULT 0,
+                last_used REAL NOT NULL DEFAULT 0
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(responses)")}
+        for column, kind in (("size_bytes", "INTEGER NOT NULL DEFAULT 0"), ("last_used", "REAL NOT NULL DEFAULT 0")):
+            if column not in columns:
+                # Databases created before the size cap: size their rows once
+                self._conn.execute(f"ALTER TABLE responses ADD COLUMN {column} {kind}")
+        self._conn.execute("UPDATE responses SET size_bytes = length(CAST(key AS BLOB)) + length(CAST(value AS BLOB)) WHERE size_bytes = 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_expiry ON responses (expires_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= time.time():
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        entry_size = len(key) + len(value.encode("utf-8"))
+        if entry_size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            if now - self._purged_at >= self.purge_seconds:
+                self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+                self._purged_at = now
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, size_bytes, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, value, now + ttl, entry_size, now),
+            )
+            total = self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM responses").fetchone()[0]
+            while total > self.max_bytes:
+                oldest = self._conn.execute("SELECT key, size_bytes FROM responses ORDER BY last_used LIMIT 1").fetchone()
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (oldest[0],))
+                total -= oldest[1]
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+class ResponseCache:
+    def __init__(self, backend=None, ttl: float = CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def _call(self, method, *args):
+        if getattr(self.backend, "blocking", False):
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get(self, key: str) -> Optional[str]:
+        if self.backend is None:
+            return None
+        value = await self._call(self.backend.get, key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        CACHE_REQUESTS.inc(cache="response", result="hit" if value is not None else "miss")
+        return value
+
+    async def set(self, key: str, value: str):
+        if self.backend is not None:
+            await self._call(self.backend.set, key, value, self.ttl)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self.backend).__name__ if self.backend else None, "hits": self.hits, "misses": self.misses}
+
+_response_cache = None
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    if _response_cache:
+        return _response_cache
+
+    if CACHE_BACKEND == "sqlite":
+        backend = SQLiteCacheBackend(CACHE_PATH, CACHE_MAX_BYTES)
+    elif CACHE_BACKEND == "none":
+        backend = None
+    else:
+        backend = MemoryCacheBackend(CACHE_MAX_BYTES)
+
+    _response_cache = ResponseCache(backend, CACHE_TTL_SECONDS)
+    return _response_cache
@@ -0,0 +1,144 @@
+import hashlib
+import heapq
+import math
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Documents up to this size are still sent whole; retrieval only kicks in above it
+FULL_CONTEXT_CHARS = int(os.getenv("CHAT_FULL_CONTEXT_CHARS", "20000"))
+CHUNK_CHARS = int(os.getenv("CHAT_CHUNK_CHARS", "1500"))
+CHUNK_OVERLAP = 200
+TOP_K = int(os.getenv("CHAT_TOP_K", "8"))
+# Indexes of chat context sent inline (no stored document) kept across turns
+INLINE_INDEX_CACHE_SIZE = int(os.getenv("CHAT_INLINE_INDEX_CACHE_SIZE", "32"))
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+_token_pattern = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _token_pattern.findall(text.lower()) if len(token) > 1]
+
+def chunk_text(text: str, chunk_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Split text into overlapping chunks of about chunk_chars, preferring to cut
+    at a paragraph or line break, then at a space.
+    """
+    chunks = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + chunk_chars, length)
+        if end < length:
+            window = text[start:end]
+            cut = max(window.rfind("\n\n"), window.rfind("\n"))
+            if cut < chunk_chars // 2:
+                cut = window.rfind(" ")
+            if cut > chunk_chars // 2:
+                end = start + cut
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+class Bm25Index:
+    """
+    BM25 over an inverted index. Postings are kept in typed arrays (chunk ids and
+    term frequencies) so a large textbook costs a few bytes per token occurrence.
+    """
+
+    def __init__(self, chunks: List[str]):
+        self.chunks = chunks
+        self.doc_lengths = array("I")
+        self._postings: Dict[str, array] = {}
+        self._frequencies: Dict[str, array] = {}
+
+        for chunk_id, chunk in enumerate(chunks):
+            counts: Dict[str, int] = {}
+            tokens = tokenize(chunk)
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            self.doc_lengths.append(len(tokens))
+            for token, count in counts.items():
+                if token not in self._postings:
+                    self._postings[token] = array("I")
+                    self._frequencies[token] = array("H")
+                self._postings[token].append(chunk_id)
+                self._frequencies[token].append(min(count, 65535))
+
+        self.avg_length = (sum(self.doc_lengths) / len(chunks)) if chunks else 0.0
+
+    def search(self, query: str, k: int = TOP_K) -> List[int]:
+        """
+        Return the ids of the k best matching chunks, best first.
+        """
+        n = len(self.chunks)
+        scores: Dict[int, float] = {}
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for chunk_id, tf in zip(postings, self._frequencies[token]):
+                norm = K1 * (1 - B + B * self.doc_lengths[chunk_id] / self.avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        return [chunk_id for chunk_id, _ in heapq.nlargest(k, scores.items(), key=lambda item: item[1])]
+
+def build_index(text: str) -> Bm25Index:
+    return Bm25Index(chunk_text(text))
+
+_inline_indexes: "OrderedDict[str, Bm25Index]" = OrderedDict()
+_inline_lock = threading.Lock()
+
+def cached_index(text: str) -> Bm25Index:
+    """
+    The index of text, built once and reused for the same text (keyed by its
+    hash, least recently used dropped first). Slow for a large text on a miss:
+    call it from a thread.
+    """
+    key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    with _inline_lock:
+        index = _inline_indexes.get(key)
+        if index is not None:
+            _inline_indexes.move_to_end(key)
+            return index
+    index = build_index(text)
+    with _inline_lock:
+        _inline_indexes[key] = index
+        while len(_inline_indexes) > INLINE_INDEX_CACHE_SIZE:
+            _inline_indexes.popitem(last=False)
+    return index
+
+def select_context(context_text: str, question: str, history: Optional[List[Dict[str, str]]] = None,
+                   index: Optional[Bm25Index] = None, k: int = TOP_K) -> str:
+    """
+    Pick the part of the document worth sending with a chat turn. Small documents
+    are returned whole; larger ones are reduced to the top-k chunks for the
+    question (and the previous user turn), kept in document order.
+    """
+    if len(context_text) <= FULL_CONTEXT_CHARS:
+        return context_text
+
+    if index is None:
+        index = build_index(context_text)
+
+    query = question
+    if history:
+        previous = [m["content"] for m in history if m.get("role") == "user"]
+        if previous:
+            query = f"{previous[-1]} {question}"
+
+    chunk_ids = sorted(index.search(query, k))
+    if not chunk_ids:
+        chunk_ids = list(range(min(k, len(index.chunks))))
+    return "\n\n[...]\n\n".join(index.chunks[chunk_id] for chunk_id in chunk_ids)
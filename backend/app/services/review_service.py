@@ -0,0 +1,393 @@
+import asyncio
+import hashlib
+import heapq
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Where review state lives: "sqlite" (default, a local stand-in) or "supabase"
+REVIEW_STORE_BACKEND = os.getenv("REVIEW_STORE_BACKEND", "sqlite")
+REVIEW_STORE_PATH = os.getenv("REVIEW_STORE_PATH", "reviews.sqlite3")
+# Changed cards are written in batches: once this many are pending...
+REVIEW_FLUSH_BATCH = int(os.getenv("REVIEW_FLUSH_BATCH", "500"))
+# ...or once the oldest pending change is this old (checked on each write and
+# by a background task, so a lone change is saved too)
+REVIEW_FLUSH_SECONDS = float(os.getenv("REVIEW_FLUSH_SECONDS", "5"))
+# Users whose decks stay loaded in memory, least recently used dropped first
+REVIEW_MAX_USERS = int(os.getenv("REVIEW_MAX_USERS", "1000"))
+
+DAY_SECONDS = 86400
+# A forgotten card comes back in the same session
+RELEARN_SECONDS = 600
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+
+# SM-2 recall quality for each answer button
+RATINGS = {"again": 1, "hard": 3, "good": 4, "easy": 5}
+
+# (user_id, card_id, front, back, due, interval_days, ease, reps, lapses)
+Row = Tuple[str, str, str, str, float, float, float, int, int]
+
+logger = logging.getLogger(__name__)
+
+def card_id_for(front: str, back: str) -> str:
+    """
+    Cards are identified by their content, so adding the same generated card
+    twice keeps a single card (and its review history).
+    """
+    return hashlib.sha256(f"{front}\0{back}".encode("utf-8")).hexdigest()[:16]
+
+def sm2(rating: str, interval: float, ease: float, reps: int) -> Tuple[float, float, int, bool]:
+    """
+    SM-2 step: (new interval in days, new ease, new repetition count, lapsed).
+    A lapse restarts the repetitions with an interval of 0 (relearn now).
+    """
+    quality = RATINGS[rating]
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < 3:
+        return 0.0, ease, 0, True
+    if reps == 0:
+        interval = 1.0
+    elif reps == 1:
+        interval = 6.0
+    else:
+        interval = round(interval * ease)
+    return interval, ease, reps + 1, False
+
+class Deck:
+    """
+    One user's cards. Scheduling state sits in parallel typed arrays indexed by
+    slot (a few dozen bytes per card), and a min-heap of (due, slot) answers
+    "next cards due" in O(k log n).
+
+    The heap is never searched: rescheduling a card pushes a new entry and the
+    old one is skipped as stale when it surfaces (its due no longer matches the
+    card's). The heap is rebuilt once stale entries outnumber live ones.
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.fronts: List[str] = []
+        self.backs: List[str] = []
+        self.slots: Dict[str, int] = {}
+        self.due = array("d")
+        self.interval = array("f")
+        self.ease = array("f")
+        self.reps = array("H")
+        self.lapses = array("H")
+        self._heap: List[Tuple[float, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, card_id: str, front: str, back: str, due: float, interval: float = 0.0,
+            ease: float = DEFAULT_EASE, reps: int = 0, lapses: int = 0) -> Tuple[int, bool]:
+        """
+        (slot, whether the card is new). An existing card keeps its schedule.
+        """
+        slot = self.slots.get(card_id)
+        if slot is not None:
+            return slot, False
+        slot = len(self.ids)
+        self.slots[card_id] = slot
+        self.ids.append(card_id)
+        self.fronts.append(front)
+        self.backs.append(back)
+        self.due.append(due)
+        self.interval.append(interval)
+        self.ease.append(ease)
+        self.reps.append(min(reps, 65535))
+        self.lapses.append(min(lapses, 65535))
+        heapq.heappush(self._heap, (self.due[slot], slot))
+        return slot, True
+
+    def reschedule(self, slot: int, due: float):
+        self.due[slot] = due
+        heapq.heappush(self._heap, (self.due[slot], slot))
+        if len(self._heap) > 2 * len(self.ids) + 64:
+            self._heap = [(self.due[i], i) for i in range(len(self.ids))]
+            heapq.heapify(self._heap)
+
+    def _pop_stale(self):
+        heap = self._heap
+        while heap and heap[0][0] != self.due[heap[0][1]]:
+            heapq.heappop(heap)
+
+    def due_slots(self, now: float, limit: int) -> List[int]:
+        """
+        Up to limit slots due at now, most overdue first.
+        """
+        taken = []
+        seen: Set[int] = set()
+        self._pop_stale()
+        while self._heap and len(taken) < limit and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if entry[0] == self.due[entry[1]] and entry[1] not in seen:
+                taken.append(entry)
+                seen.add(entry[1])
+            self._pop_stale()
+        for entry in taken:
+            heapq.heappush(self._heap, entry)
+        return [slot for _, slot in taken]
+
+    def next_due(self) -> Optional[float]:
+        self._pop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def row(self, user_id: str, slot: int) -> Row:
+        return (user_id, self.ids[slot], self.fronts[slot], self.backs[slot], self.due[slot],
+                self.interval[slot], self.ease[slot], self.reps[slot], self.lapses[slot])
+
+class SqliteReviewStore:
+    """
+    Card rows in a local SQLite table shaped like the Supabase one.
+    """
+
+    def __init__(self, path: str = REVIEW_STORE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS review_cards (
+                user_id TEXT NOT NULL,
+                card_id TEXT NOT NULL,
+                front TEXT NOT NULL,
+                back TEXT NOT NULL,
+                due REAL NOT NULL,
+                interval_days REAL NOT NULL,
+                ease REAL NOT NULL,
+                reps INTEGER NOT NULL,
+                lapses INTEGER NOT NULL,
+                PRIMARY KEY (user_id, card_id)
+            )
+        """)
+        self._conn.commit()
+
+    def load(self, user_id: str) -> List[Row]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT user_id, card_id, front, back, due, interval_days, ease, reps, lapses "
+                "FROM review_cards WHERE user_id = ? ORDER BY rowid", (user_id,)
+            ).fetchall()
+
+    def save(self, rows: List[Row]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO review_cards (user_id, card_id, front, back, due, interval_days, ease, reps, lapses) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows,
+            )
+            self._conn.commit()
+
+_COLUMNS = ("user_id", "card_id", "front", "back", "due", "interval_days", "ease", "reps", "lapses")
+
+class SupabaseReviewStore:
+    """
+    The review_cards table in Supabase, written with one bulk upsert per flush.
+    """
+
+    # PostgREST returns at most this many rows per request by default
+    PAGE_SIZE = 1000
+
+    def load(self, user_id: str) -> List[Row]:
+        from app.services.db_service import get_supabase
+        table = get_supabase().table("review_cards")
+        rows = []
+        while True:
+            page = table.select(",".join(_COLUMNS)).eq("user_id", user_id) \
+                .range(len(rows), len(rows) + self.PAGE_SIZE - 1).execute().data
+            rows.extend(tuple(record[column] for column in _COLUMNS) for record in page)
+            if len(page) < self.PAGE_SIZE:
+                return rows
+
+    def save(self, rows: List[Row]):
+        from app.services.db_service import get_supabase
+        records = [dict(zip(_COLUMNS, row)) for row in rows]
+        get_supabase().table("review_cards").upsert(records, on_conflict="user_id,card_id").execute()
+
+class ReviewEngine:
+    """
+    Spaced-repetition reviews (SM-2) for the flashcards users keep.
+
+    Decks are loaded from the store on first use and kept in memory (up to
+    max_users, least recently used dropped). Changes are applied in memory at
+    once and written back in batches. The store is blocking (SQLite, or the
+    synchronous Supabase client), so call the engine from worker threads, never
+    from the event loop. start() runs a task that writes changes left pending
+    for flush_seconds; stop() writes the rest on shutdown.
+    """
+
+    def __init__(self, store, flush_batch: int = REVIEW_FLUSH_BATCH, flush_seconds: float = REVIEW_FLUSH_SECONDS,
+                 max_users: int = REVIEW_MAX_USERS, clock=time.time):
+        self.store = store
+        self.flush_batch = flush_batch
+        self.flush_seconds = flush_seconds
+        self.max_users = max_users
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._decks: "OrderedDict[str, Deck]" = OrderedDict()
+        # user -> slots changed since the last flush
+        self._dirty: Dict[str, Set[int]] = {}
+        self._pending = 0
+        self._oldest_pending: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _deck(self, user_id: str) -> Deck:
+        deck = self._decks.get(user_id)
+        if deck is not None:
+            self._decks.move_to_end(user_id)
+            return deck
+        deck = Deck()
+        for _, card_id, front, back, due, interval, ease, reps, lapses in self.store.load(user_id):
+            deck.add(card_id, front, back, due, interval, ease, reps, lapses)
+        self._decks[user_id] = deck
+        while len(self._decks) > self.max_users:
+            evicted = next(iter(self._decks))
+            try:
+                self._flush_user(evicted)
+            except Exception as e:
+                # Unsaved changes stay in memory until the store is back
+                logger.warning("Could not save review changes", extra={"error": str(e)})
+                break
+            del self._decks[evicted]
+        return deck
+
+    def _mark(self, user_id: str, slot: int):
+        dirty = self._dirty.setdefault(user_id, set())
+        if slot not in dirty:
+            dirty.add(slot)
+            self._pending += 1
+        if self._oldest_pending is None:
+            self._oldest_pending = self.clock()
+        if self._pending >= self.flush_batch or self.clock() - self._oldest_pending >= self.flush_seconds:
+            try:
+                self.flush()
+            except Exception as e:
+                # The change is applied in memory; the next flush retries the write
+                logger.warning("Could not save review changes", extra={"error": str(e)})
+
+    def add_cards(self, user_id: str, cards: List[Tuple[str, str]]) -> List[str]:
+        """
+        Add (front, back) cards, due now. Returns their ids; cards the user
+        already has keep their schedule.
+        """
+        with self._lock:
+            deck = self._deck(user_id)
+            now = self.clock()
+            ids = []
+            for front, back in cards:
+                card_id = card_id_for(front, back)
+                slot, added = deck.add(card_id, front, back, now)
+                if added:
+                    self._mark(user_id, slot)
+                ids.append(card_id)
+            return ids
+
+    def due_cards(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            deck = self._deck(user_id)
+            return [self._card(deck, slot) for slot in deck.due_slots(self.clock(), limit)]
+
+    def next_due(self, user_id: str) -> Optional[float]:
+        with self._lock:
+            return self._deck(user_id).next_due()
+
+    def review(self, user_id: str, card_id: str, rating: str) -> Dict[str, Any]:
+        """
+        Record an answer and reschedule the card. KeyError if the user has no
+        such card.
+        """
+        with self._lock:
+            deck = self._deck(user_id)
+            slot = deck.slots[card_id]
+            interval, ease, reps, lapsed = sm2(rating, deck.interval[slot], deck.ease[slot], deck.reps[slot])
+            deck.interval[slot] = interval
+            deck.ease[slot] = ease
+            deck.reps[slot] = min(reps, 65535)
+            if lapsed:
+                deck.lapses[slot] = min(deck.lapses[slot] + 1, 65535)
+            delay = interval * DAY_SECONDS if interval else RELEARN_SECONDS
+            deck.reschedule(slot, self.clock() + delay)
+            self._mark(user_id, slot)
+            return self._card(deck, slot)
+
+    @staticmethod
+    def _card(deck: Deck, slot: int) -> Dict[str, Any]:
+        return {
+            "card_id": deck.ids[slot],
+            "front": deck.fronts[slot],
+            "back": deck.backs[slot],
+            "due": deck.due[slot],
+            "interval_days": deck.interval[slot],
+            "ease": round(deck.ease[slot], 2),
+            "reps": deck.reps[slot],
+            "lapses": deck.lapses[slot],
+        }
+
+    def _flush_user(self, user_id: str):
+        slots = self._dirty.pop(user_id, None)
+        if not slots:
+            return
+        deck = self._decks[user_id]
+        try:
+            self.store.save([deck.row(user_id, slot) for slot in sorted(slots)])
+        except Exception:
+            # Keep the changes for the next flush
+            self._dirty.setdefault(user_id, set()).update(slots)
+            raise
+        self._pending -= len(slots)
+
+    def flush(self):
+        """
+        Write every pending change to the store.
+        """
+        with self._lock:
+            for user_id in list(self._dirty):
+                self._flush_user(user_id)
+            self._oldest_pending = None if not self._pending else self.clock()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            if self._pending:
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception as e:
+                    logger.warning("Could not save review changes", extra={"error": str(e)})
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the background task and write what is left (called on shutdown).
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await asyncio.to_thread(self.flush)
+        except Exception as e:
+            logger.warning("Could not save review changes on shutdown", extra={"error": str(e)})
+
+_review_engine = None
+
+def get_review_engine() -> ReviewEngine:
+    global _review_engine
+    if _review_engine is None:
+        store = SupabaseReviewStore() if REVIEW_STORE_BACKEND == "supabase" else SqliteReviewStore(REVIEW_STORE_PATH)
+        _review_engine = ReviewEngine(store)
+    return _review_engine
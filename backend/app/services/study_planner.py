@@ -0,0 +1,184 @@
+import math
+import os
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+# Length of a topic's first study session and of each later review, in minutes
+LEARN_MINUTES = int(os.getenv("PLAN_LEARN_MINUTES", "60"))
+REVIEW_MINUTES = int(os.getenv("PLAN_REVIEW_MINUTES", "30"))
+# First passes are never shortened below this when the calendar is tight
+MIN_SESSION_MINUTES = 15
+# Days after the first pass at which a topic comes back (expanding spacing)
+REVIEW_INTERVALS = tuple(int(days) for days in os.getenv("PLAN_REVIEW_INTERVALS", "1,3,7,14,30").split(","))
+# Share of the days before the exam over which first passes are spread; the
+# rest of the calendar is left to reviews
+LEARNING_SHARE = 0.7
+
+ACTIVITIES = ("read", "practice", "review", "quiz")
+
+ACTIVITY_LABELS = {
+    "en": {"read": "Read", "practice": "Practice", "review": "Review", "quiz": "Quiz"},
+    "fr": {"read": "Lecture", "practice": "Exercices", "review": "Révision", "quiz": "Quiz"},
+    "es": {"read": "Lectura", "practice": "Práctica", "review": "Repaso", "quiz": "Quiz"},
+    "it": {"read": "Lettura", "practice": "Esercizi", "review": "Ripasso", "quiz": "Quiz"},
+}
+
+# Used as they are when the plan is not enriched, or when enrichment fails
+DESCRIPTIONS = {
+    "en": {
+        "read": "First pass on {topic}: read it through and note the key ideas.",
+        "practice": "Work a few exercises on {topic} without looking at your notes.",
+        "review": "Recall what you know about {topic}, then check your notes for gaps.",
+        "quiz": "Test yourself on {topic} and go back over anything you missed.",
+    },
+    "fr": {
+        "read": "Premier passage sur {topic} : lisez tout et notez les idées clés.",
+        "practice": "Faites quelques exercices sur {topic} sans regarder vos notes.",
+        "review": "Rappelez-vous ce que vous savez sur {topic}, puis comblez les lacunes avec vos notes.",
+        "quiz": "Testez-vous sur {topic} et reprenez ce que vous avez manqué.",
+    },
+    "es": {
+        "read": "Primera lectura de {topic}: léelo entero y anota las ideas clave.",
+        "practice": "Haz algunos ejercicios sobre {topic} sin mirar tus apuntes.",
+        "review": "Recuerda lo que sabes de {topic} y revisa tus apuntes para cubrir lagunas.",
+        "quiz": "Ponte a prueba con {topic} y repasa lo que hayas fallado.",
+    },
+    "it": {
+        "read": "Primo passaggio su {topic}: leggilo tutto e annota le idee chiave.",
+        "practice": "Svolgi qualche esercizio su {topic} senza guardare gli appunti.",
+        "review": "Richiama ciò che sai su {topic}, poi controlla gli appunti per colmare le lacune.",
+        "quiz": "Mettiti alla prova su {topic} e riprendi ciò che hai sbagliato.",
+    },
+}
+
+def parse_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value.strip()[:10])
+    except ValueError:
+        raise ValueError(f"Invalid date: {value!r} (expected YYYY-MM-DD)")
+
+def format_duration(minutes: int) -> str:
+    """
+    90 -> "1h30", 60 -> "1h", 30 -> "30 min".
+    """
+    hours, rest = divmod(minutes, 60)
+    if not hours:
+        return f"{rest} min"
+    return f"{hours}h{rest:02d}" if rest else f"{hours}h"
+
+def _review_activity(index: int) -> str:
+    if index == 0:
+        return "practice"
+    return "review" if index % 2 else "quiz"
+
+def _first_fit(used: List[int], start: int, minutes: int, capacity: int, end: Optional[int] = None) -> Optional[int]:
+    """
+    First day from start (before end) with room for minutes more.
+    """
+    for day in range(start, len(used) if end is None else end):
+        if used[day] + minutes <= capacity:
+            return day
+    return None
+
+def _interleave(first: List[Tuple], second: List[Tuple]) -> List[Tuple]:
+    merged = []
+    for i in range(max(len(first), len(second))):
+        merged.extend(first[i:i + 1])
+        merged.extend(second[i:i + 1])
+    return merged
+
+def build_schedule(topics: List[str], exam_date: str, hours_per_day: float,
+                   language: str = "en", start: Optional[date] = None) -> List[Dict[str, str]]:
+    """
+    Lay out study sessions from start (today by default) to the day before the
+    exam, never more than hours_per_day on any day.
+
+    Each topic gets a first pass, spread evenly over the first LEARNING_SHARE of
+    the calendar in the given order, then reviews REVIEW_INTERVALS days later
+    (1, 3, 7... so spacing expands), plus a last quiz on the eve of the exam
+    when its final review is further back. A review that does not fit on its
+    day moves to the next day with room; one that no longer fits before the
+    exam is dropped. Each day mixes reviews of earlier topics with new ones.
+    Raises ValueError when even the shortest first passes of all topics do not
+    fit before the exam.
+
+    The result depends only on the arguments, so the same request always gives
+    the same plan; hundreds of topics over months take a few milliseconds.
+    """
+    start = start or date.today()
+    exam = parse_date(exam_date)
+    days = (exam - start).days
+    if days <= 0:
+        raise ValueError("The exam date must be after the start date")
+    capacity = int(hours_per_day * 60)
+    if capacity < MIN_SESSION_MINUTES:
+        raise ValueError(f"At least {MIN_SESSION_MINUTES} minutes of study per day are needed")
+
+    topics = list(dict.fromkeys(topic.strip() for topic in topics if topic.strip()))
+    if not topics:
+        return []
+
+    learning_days = max(1, math.ceil(days * LEARNING_SHARE))
+    # Shorten first passes when they would not all fit in the learning window
+    learn_minutes = min(LEARN_MINUTES, capacity, learning_days * capacity // len(topics))
+    learn_minutes = max(MIN_SESSION_MINUTES, learn_minutes // MIN_SESSION_MINUTES * MIN_SESSION_MINUTES)
+    review_minutes = min(REVIEW_MINUTES, capacity)
+
+    used = [0] * days
+    # day -> [(topic index, activity, minutes)], first passes and reviews kept apart for interleaving
+    learning: Dict[int, List[Tuple[int, str, int]]] = {}
+    reviews: Dict[int, List[Tuple[int, str, int]]] = {}
+    learned_on: Dict[int, int] = {}
+
+    for index in range(len(topics)):
+        target = index * learning_days // len(topics)
+        day = _first_fit(used, target, learn_minutes, capacity)
+        if day is None:
+            day = _first_fit(used, 0, learn_minutes, capacity, end=target)
+        if day is None:
+            raise ValueError(
+                f"Only {index} of {len(topics)} topics fit before the exam at {hours_per_day} hours per day; "
+                "add study time or drop some topics"
+            )
+        used[day] += learn_minutes
+        learning.setdefault(day, []).append((index, "read", learn_minutes))
+        learned_on[index] = day
+
+    # (due day, review number, topic index), placed earliest due first
+    due = sorted(
+        (learned_on[index] + interval, number, index)
+        for index in learned_on
+        for number, interval in enumerate(REVIEW_INTERVALS)
+        if learned_on[index] + interval < days
+    )
+    last_session = dict(learned_on)
+    for due_day, number, index in due:
+        day = _first_fit(used, max(due_day, last_session[index] + 1), review_minutes, capacity)
+        if day is None:
+            continue
+        used[day] += review_minutes
+        reviews.setdefault(day, []).append((index, _review_activity(number), review_minutes))
+        last_session[index] = day
+
+    eve = days - 1
+    for index in sorted(learned_on, key=lambda index: last_session[index]):
+        if last_session[index] >= eve - 1 or used[eve] + review_minutes > capacity:
+            continue
+        used[eve] += review_minutes
+        reviews.setdefault(eve, []).append((index, "quiz", review_minutes))
+        last_session[index] = eve
+
+    labels = ACTIVITY_LABELS.get(language, ACTIVITY_LABELS["en"])
+    descriptions = DESCRIPTIONS.get(language, DESCRIPTIONS["en"])
+    plan = []
+    for day in sorted(set(learning) | set(reviews)):
+        day_date = (start + timedelta(days=day)).isoformat()
+        for index, activity, minutes in _interleave(reviews.get(day, []), learning.get(day, [])):
+            plan.append({
+                "date": day_date,
+                "topic": topics[index],
+                "activity": labels[activity],
+                "duration": format_duration(minutes),
+                "description": descriptions[activity].format(topic=topics[index]),
+            })
+    return plan
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+# XP updates are held this long and then written together
+XP_FLUSH_SECONDS = float(os.getenv("XP_FLUSH_SECONDS", "2"))
+# Rows per bulk upsert request; a full batch is written without waiting
+XP_FLUSH_BATCH = int(os.getenv("XP_FLUSH_BATCH", "500"))
+# Users with an unwritten update; past this the oldest update is dropped
+XP_MAX_PENDING_USERS = int(os.getenv("XP_MAX_PENDING_USERS", "20000"))
+# Longest wait between retries while the database keeps failing
+XP_MAX_RETRY_SECONDS = float(os.getenv("XP_MAX_RETRY_SECONDS", "60"))
+XP_REQUEST_TIMEOUT_SECONDS = float(os.getenv("XP_REQUEST_TIMEOUT_SECONDS", "10"))
+# Attempts to write what is left when the app shuts down
+SHUTDOWN_ATTEMPTS = 3
+
+logger = logging.getLogger(__name__)
+
+class PostgrestError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"PostgREST returned {status_code}: {detail}")
+        self.status_code = status_code
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code == 429 or self.status_code >= 500
+
+class XpWriter:
+    """
+    Write-behind buffer for profile XP.
+
+    record() only updates a dict in memory: each user keeps just their latest
+    xp and level, so a burst of quiz completions becomes one row per user. A
+    background task sends the rows every flush_seconds (sooner once a batch is
+    full) as bulk upserts straight to PostgREST, with an async HTTP client so
+    the event loop never blocks. Failed rows are put back and retried with
+    exponential backoff, unless a newer update for that user arrived meanwhile.
+    Rows rejected as invalid (4xx other than 429) are dropped and logged.
+    """
+
+    def __init__(self, url: str, key: str, table: str = "profiles", client: Optional["httpx.AsyncClient"] = None,
+                 flush_seconds: float = XP_FLUSH_SECONDS, batch_size: int = XP_FLUSH_BATCH,
+                 max_pending: int = XP_MAX_PENDING_USERS, max_retry_seconds: float = XP_MAX_RETRY_SECONDS):
+        self.endpoint = f"{url.rstrip('/')}/rest/v1/{table}"
+        self.key = key
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_retry_seconds = max_retry_seconds
+        self.dropped = 0
+        self.failures = 0
+        self._client = client
+        self._pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def record(self, user_id: str, xp: int, level: int):
+        """
+        Queue the user's new totals. Call from the event loop thread.
+        """
+        self._pending.pop(user_id, None)
+        self._pending[user_id] = {"user_id": user_id, "xp": xp, "level": level}
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+            logger.warning("XP buffer full, dropped the oldest update", extra={"dropped": self.dropped})
+        if len(self._pending) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+
+    def _client_for_loop(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            # Imported on first write, to keep it off the app's import path
+            import httpx
+            self._client = httpx.AsyncClient(timeout=XP_REQUEST_TIMEOUT_SECONDS)
+        return self._client
+
+    async def _upsert(self, rows: List[Dict[str, Any]]):
+        response = await self._client_for_loop().post(
+            self.endpoint,
+            params={"on_conflict": "user_id"},
+            json=rows,
+            headers={
+                "apikey": self.key,
+                "Authorization": f"Bearer {self.key}",
+                "Prefer": "resolution=merge-duplicates,return=minimal",
+            },
+        )
+        if response.status_code >= 300:
+            raise PostgrestError(response.status_code, response.text[:200])
+
+    def _requeue(self, rows: List[Dict[str, Any]]):
+        # Back at the front, behind nothing newer: a user recorded again since keeps the new row
+        for row in reversed(rows):
+            if row["user_id"] not in self._pending:
+                self._pending[row["user_id"]] = row
+                self._pending.move_to_end(row["user_id"], last=False)
+        # As in record(): the oldest rows go, so each user's latest total survives
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+            logger.warning("XP buffer full, dropped the oldest update", extra={"dropped": self.dropped})
+
+    async def flush(self) -> bool:
+        """
+        Write everything pending, one bulk upsert per batch_size rows. False if
+        a write failed and its rows are waiting for a retry.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            while self._pending:
+                rows = []
+                while self._pending and len(rows) < self.batch_size:
+                    rows.append(self._pending.popitem(last=False)[1])
+                try:
+                    await self._upsert(rows)
+                except PostgrestError as e:
+                    if not e.retryable:
+                        self.dropped += len(rows)
+                        logger.error("XP rows rejected", extra={"error": str(e), "rows": len(rows)})
+                        continue
+                    self._requeue(rows)
+                    logger.warning("Could not write XP, will retry", extra={"error": str(e), "rows": len(rows)})
+                    return False
+                except Exception as e:
+                    self._requeue(rows)
+                    logger.warning("Could not write XP, will retry", extra={"error": str(e), "rows": len(rows)})
+                    return False
+            return True
+
+    async def _run(self):
+        delay = self.flush_seconds
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if await self.flush():
+                self.failures = 0
+                delay = self.flush_seconds
+            else:
+                self.failures += 1
+                delay = min(self.max_retry_seconds, self.flush_seconds * 2 ** self.failures)
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the background task and write what is left (called on shutdown).
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for attempt in range(SHUTDOWN_ATTEMPTS):
+            if await self.flush():
+                break
+            await asyncio.sleep(min(self.max_retry_seconds, 0.5 * 2 ** attempt))
+        if self._pending:
+            logger.error("XP updates lost on shutdown", extra={"rows": len(self._pending)})
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+_xp_writer = None
+
+def get_xp_writer() -> XpWriter:
+    global _xp_writer
+    if _xp_writer is None:
+        from app.services.db_service import SUPABASE_URL, SUPABASE_KEY
+        _xp_writer = XpWriter(SUPABASE_URL, SUPABASE_KEY)
+    return _xp_writer
@@ -0,0 +1,77 @@
+"""
+Prompt size and end-to-end chat latency: full context vs. BM25 retrieval.
+
+The model is a stub whose latency grows with prompt size (a fixed overhead
+plus a per-token cost), which is how input length shows up in practice.
+
+Run from backend/:  python -m benchmarks.bench_chat_retrieval
+"""
+import asyncio
+import os
+import random
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from app.services import ai_service, retrieval_service
+from app.services.retrieval_service import build_index
+
+BASE_LATENCY = float(os.getenv("BENCH_BASE_LATENCY", "0.3"))
+SECONDS_PER_1K_TOKENS = float(os.getenv("BENCH_SECONDS_PER_1K_TOKENS", "0.02"))
+SIZES = [300_000, 1_000_000, 3_000_000]
+QUESTIONS = ["What does the mitochondria produce?", "Explain photosynthesis in chloroplasts", "How do enzymes lower activation energy?"]
+
+class SlowStubModel:
+    model_name = "stub"
+
+    def __init__(self):
+        self.prompt_chars = []
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.prompt_chars.append(len(prompt))
+        tokens = len(prompt) / 4
+        await asyncio.sleep(BASE_LATENCY + tokens / 1000 * SECONDS_PER_1K_TOKENS)
+        return SimpleNamespace(text="answer")
+
+def make_textbook(size: int) -> str:
+    rng = random.Random(size)
+    vocabulary = [f"term{i}" for i in range(5000)] + "cell energy membrane protein gene enzyme reaction".split()
+    topics = ["The mitochondria produces ATP through cellular respiration.",
+              "Photosynthesis happens in the chloroplasts of plant cells.",
+              "Enzymes lower the activation energy of reactions."]
+    paragraphs = []
+    length = 0
+    while length < size:
+        words = " ".join(rng.choice(vocabulary) for _ in range(120))
+        if rng.random() < 0.01:
+            words += " " + rng.choice(topics)
+        paragraphs.append(words + ".")
+        length += len(words) + 2
+    return "\n\n".join(paragraphs)
+
+async def run(text, index, full_context: bool):
+    model = SlowStubModel()
+    limit = 10 ** 12 if full_context else retrieval_service.FULL_CONTEXT_CHARS
+    with patch.object(ai_service, "get_model", return_value=model), \
+         patch.object(retrieval_service, "FULL_CONTEXT_CHARS", limit):
+        start = time.perf_counter()
+        for question in QUESTIONS:
+            await ai_service.chat_with_document(text, question, [], "en", index=index)
+        wall = (time.perf_counter() - start) / len(QUESTIONS)
+    return sum(model.prompt_chars) / len(model.prompt_chars), wall
+
+async def main():
+    print(f"{'document':>10}{'mode':>12}{'prompt chars':>15}{'latency (s)':>13}{'index build (s)':>17}")
+    for size in SIZES:
+        text = make_textbook(size)
+        start = time.perf_counter()
+        index = build_index(text)
+        build = time.perf_counter() - start
+
+        full_chars, full_wall = await run(text, None, full_context=True)
+        rag_chars, rag_wall = await run(text, index, full_context=False)
+        print(f"{size:>10}{'full':>12}{full_chars:>15.0f}{full_wall:>13.3f}{'':>17}")
+        print(f"{size:>10}{'retrieval':>12}{rag_chars:>15.0f}{rag_wall:>13.3f}{build:>17.3f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
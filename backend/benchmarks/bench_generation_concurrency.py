@@ -0,0 +1,57 @@
+"""
+Throughput of generate_content_with_retry against a stubbed slow model.
+
+Compares the previous asyncio.to_thread path (default executor) with the
+dedicated executor and the native async path, at several concurrency levels.
+
+Run from backend/:  python -m benchmarks.bench_generation_concurrency
+"""
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("AI_MAX_CONCURRENCY", "1000")
+# Measure the call path itself, not the client-side quota limiter
+os.environ.setdefault("GEMINI_WINDOW_INITIAL", "1000")
+os.environ.setdefault("GEMINI_RPM", "0")
+os.environ.setdefault("GEMINI_TPM", "0")
+
+from app.services.ai_service import generate_content_with_retry
+
+LATENCY = float(os.getenv("BENCH_MODEL_LATENCY", "0.2"))
+LEVELS = [50, 200, 1000]
+
+class SyncSlowModel:
+    def generate_content(self, prompt, generation_config=None):
+        time.sleep(LATENCY)
+        return SimpleNamespace(text=prompt)
+
+class AsyncSlowModel(SyncSlowModel):
+    async def generate_content_async(self, prompt, generation_config=None):
+        await asyncio.sleep(LATENCY)
+        return SimpleNamespace(text=prompt)
+
+async def to_thread_baseline(model, prompt):
+    return await asyncio.to_thread(model.generate_content, prompt, generation_config={})
+
+async def run(call, model, concurrency):
+    start = time.perf_counter()
+    await asyncio.gather(*[call(model, f"prompt {i}") for i in range(concurrency)])
+    return time.perf_counter() - start
+
+async def main():
+    variants = [
+        ("to_thread (before)", to_thread_baseline, SyncSlowModel()),
+        ("dedicated executor", generate_content_with_retry, SyncSlowModel()),
+        ("native async", generate_content_with_retry, AsyncSlowModel()),
+    ]
+    print(f"model latency {LATENCY * 1000:.0f} ms")
+    print(f"{'variant':<22}{'concurrency':>12}{'wall (s)':>10}{'req/s':>10}")
+    for name, call, model in variants:
+        for concurrency in LEVELS:
+            wall = await run(call, model, concurrency)
+            print(f"{name:<22}{concurrency:>12}{wall:>10.2f}{concurrency / wall:>10.1f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,358 @@
+"""
+End-to-end load test: the whole FastAPI app (lifespan, middleware, routers,
+services) driven in-process over ASGI against the fake Gemini backend in
+fake_gemini.
+
+A pool of concurrent clients sends a weighted mix of /documents and /ai
+requests about uploaded PDF textbooks for a fixed time at each concurrency
+level. Reported per endpoint: requests, errors, requests per second, p50,
+p95 and p99 latency (to the last byte) and, for streams, the time to the
+first byte; per level, the peak process RSS.
+
+Results are saved as JSON (with the git commit) under benchmarks/results/,
+and --compare checks a run against an earlier one to catch regressions.
+
+The client-side Gemini quota (GEMINI_RPM, GEMINI_TPM) applies as configured,
+since it shapes latency under load; --no-quota lifts it to measure the
+request path alone.
+
+Run from backend/:  python -m benchmarks.bench_load --concurrency 1,16,64 --duration 10
+                    python -m benchmarks.bench_load --compare latest --fail-on-regression 20
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Stores used by the app lifespan go to a throwaway directory
+_store_dir = tempfile.mkdtemp(prefix="snh-bench-")
+os.environ.setdefault("JOB_QUEUE_PATH", os.path.join(_store_dir, "jobs.sqlite3"))
+os.environ.setdefault("EXTRACTION_CACHE_PATH", os.path.join(_store_dir, "extraction_cache.sqlite3"))
+os.environ.setdefault("REVIEW_STORE_PATH", os.path.join(_store_dir, "reviews.sqlite3"))
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+if "--cold" in sys.argv:
+    # Every request reaches the model and every upload is parsed
+    os.environ["AI_CACHE_BACKEND"] = "none"
+    os.environ["EXTRACTION_CACHE_BACKEND"] = "none"
+if "--no-quota" in sys.argv:
+    os.environ["GEMINI_RPM"] = "0"
+    os.environ["GEMINI_TPM"] = "0"
+
+import httpx
+
+from app.main import app
+from benchmarks.fake_gemini import FakeGeminiConfig, fake_gemini
+from benchmarks.pdf_corpus import make_textbook_pdf
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+# Page counts of the uploaded textbooks: a handout, a chapter, a full course
+CORPUS_PAGES = [5, 40, 150]
+STREAMS = {"quiz_stream", "flashcards_stream", "chat_stream", "study_pack_stream"}
+
+# endpoint -> relative share of the traffic
+MIX = {
+    "upload": 1,
+    "document_text": 2,
+    "analyze": 2,
+    "quiz": 2,
+    "quiz_stream": 1,
+    "flashcards": 2,
+    "flashcards_stream": 1,
+    "plan": 1,
+    "chat": 3,
+    "chat_stream": 2,
+    "study_pack": 1,
+    "study_pack_stream": 1,
+}
+
+QUESTIONS = ["What does the mitochondria produce?", "Explain enzymes simply.", "How is a gene expressed?"]
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def build_request(endpoint: str, rng: random.Random, corpus, document_ids):
+    """
+    (method, path, keyword arguments for httpx) for one request.
+    """
+    document_id = rng.choice(document_ids)
+    language = rng.choice(["en", "fr"])
+    if endpoint == "upload":
+        name, content = rng.choice(corpus)
+        return "POST", "/documents/upload?slim=true", {"files": {"file": (name, content, "application/pdf")}}
+    if endpoint == "document_text":
+        return "GET", f"/documents/{document_id}/text?page=1&page_size=10", {}
+    if endpoint == "analyze":
+        return "POST", "/ai/analyze", {"json": {"document_id": document_id, "language": language}}
+    if endpoint in ("quiz", "quiz_stream"):
+        path = "/ai/quiz/stream" if endpoint == "quiz_stream" else "/ai/quiz"
+        return "POST", path, {"json": {"document_id": document_id, "num_questions": rng.choice([5, 10]), "language": language}}
+    if endpoint in ("flashcards", "flashcards_stream"):
+        path = "/ai/flashcards/stream" if endpoint == "flashcards_stream" else "/ai/flashcards"
+        return "POST", path, {"json": {"document_id": document_id, "num_cards": rng.choice([10, 20]), "language": language}}
+    if endpoint == "plan":
+        topics = [f"Chapter {i}" for i in range(rng.randint(5, 120))]
+        return "POST", "/ai/plan", {"json": {"topics": topics, "exam_date": "2030-06-30", "start_date": "2030-01-07",
+                                             "hours_per_day": rng.randint(1, 4), "language": language}}
+    if endpoint in ("chat", "chat_stream"):
+        history = []
+        for turn in range(rng.randint(0, 12)):
+            history.append({"role": "user", "content": rng.choice(QUESTIONS)})
+            history.append({"role": "ai", "content": "Mitochondria produce ATP. " * 10})
+        path = "/ai/chat/stream" if endpoint == "chat_stream" else "/ai/chat"
+        return "POST", path, {"json": {"document_id": document_id, "message": rng.choice(QUESTIONS), "history": history, "language": language}}
+    if endpoint in ("study_pack", "study_pack_stream"):
+        path = "/ai/study-pack/stream" if endpoint == "study_pack_stream" else "/ai/study-pack"
+        return "POST", path, {"json": {"document_id": document_id, "language": language}}
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+class AsgiClient:
+    """
+    Sends requests straight to the ASGI app and sees body chunks as the app
+    sends them (httpx's ASGITransport hands back the response only once it is
+    complete, which hides the time to first byte of streams). httpx is only
+    used to encode requests.
+    """
+
+    def __init__(self, app, headers):
+        self.app = app
+        self.headers = headers
+
+    async def request(self, method: str, path: str, **kwargs):
+        """
+        (status, seconds to the first body byte, seconds to the last).
+        """
+        request = httpx.Request(method, f"http://bench{path}", headers=self.headers, **kwargs)
+        body = request.read()
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "root_path": "",
+            "path": request.url.path, "raw_path": request.url.path.encode(), "query_string": request.url.query,
+            "headers": [(name.lower(), value) for name, value in request.headers.raw],
+            "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+        }
+        done = asyncio.Event()
+        sent = False
+        status = 500
+        start = time.perf_counter()
+        first_byte = None
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status, first_byte
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                if first_byte is None and message.get("body"):
+                    first_byte = time.perf_counter() - start
+                if not message.get("more_body", False):
+                    done.set()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            done.set()
+        latency = time.perf_counter() - start
+        return status, first_byte if first_byte is not None else latency, latency
+
+async def send(client: AsgiClient, method: str, path: str, kwargs):
+    """
+    (ok, latency to the last byte, latency to the first byte).
+    """
+    try:
+        status, first_byte, latency = await client.request(method, path, **kwargs)
+        return status < 400, latency, first_byte
+    except Exception:
+        return False, 0.0, 0.0
+
+async def run_level(client, concurrency: int, duration: float, endpoints, corpus, document_ids, seed: int):
+    samples = {endpoint: [] for endpoint in endpoints}
+    weights = [MIX[endpoint] for endpoint in endpoints]
+    deadline = time.perf_counter() + duration
+    peak_rss = rss_bytes()
+
+    async def worker(number: int):
+        rng = random.Random(seed * 1000 + number)
+        while time.perf_counter() < deadline:
+            endpoint = rng.choices(endpoints, weights)[0]
+            method, path, kwargs = build_request(endpoint, rng, corpus, document_ids)
+            samples[endpoint].append(await send(client, method, path, kwargs))
+
+    async def sample_memory():
+        nonlocal peak_rss
+        while True:
+            await asyncio.sleep(0.05)
+            peak_rss = max(peak_rss, rss_bytes())
+
+    sampler = asyncio.create_task(sample_memory())
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(i) for i in range(concurrency)])
+    wall = time.perf_counter() - start
+    sampler.cancel()
+
+    return {
+        "concurrency": concurrency,
+        "wall_seconds": wall,
+        "peak_rss_bytes": max(peak_rss, rss_bytes()),
+        "endpoints": {endpoint: summarize(results, wall, endpoint in STREAMS) for endpoint, results in samples.items() if results},
+        "total": summarize([result for results in samples.values() for result in results], wall, False),
+    }
+
+def percentile(values, q: int) -> float:
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+def summarize(results, wall: float, stream: bool):
+    latencies = [latency for ok, latency, _ in results if ok] or [latency for _, latency, _ in results]
+    summary = {
+        "requests": len(results),
+        "errors": sum(1 for ok, _, _ in results if not ok),
+        "rps": len(results) / wall,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+    if stream:
+        summary["ttfb_p50_ms"] = percentile([first for ok, _, first in results if ok] or [0.0], 50) * 1000
+    return summary
+
+def print_level(level):
+    print(f"\nconcurrency {level['concurrency']}  ({level['wall_seconds']:.1f} s, peak RSS {level['peak_rss_bytes'] / 2 ** 20:.0f} MB)")
+    print(f"{'endpoint':<20}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'ttfb p50':>10}")
+    rows = list(level["endpoints"].items()) + [("TOTAL", level["total"])]
+    for endpoint, s in rows:
+        ttfb = f"{s['ttfb_p50_ms']:>10.0f}" if "ttfb_p50_ms" in s else f"{'':>10}"
+        print(f"{endpoint:<20}{s['requests']:>9}{s['errors']:>8}{s['rps']:>9.1f}{s['p50_ms']:>9.0f}{s['p95_ms']:>9.0f}{s['p99_ms']:>9.0f}{ttfb}")
+
+def find_baseline(spec: str, current_path: str):
+    if spec != "latest":
+        return spec
+    directory = os.path.dirname(current_path)
+    paths = sorted(path for path in glob.glob(os.path.join(directory, "load-*.json")) if path != current_path)
+    return paths[-1] if paths else None
+
+def compare(current, baseline, threshold: float) -> bool:
+    """
+    Print p95 and throughput changes against the baseline run. True if any
+    endpoint's p95 or any level's total throughput got worse by more than
+    threshold percent.
+    """
+    print(f"\ncompared with {baseline['commit']} ({baseline['timestamp']})")
+    print(f"{'concurrency':>11}  {'endpoint':<20}{'p95 ms':>16}{'change':>9}")
+    regressed = False
+    previous_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in current["levels"]:
+        before = previous_levels.get(level["concurrency"])
+        if before is None:
+            continue
+        for endpoint, s in list(level["endpoints"].items()) + [("TOTAL", level["total"])]:
+            old = before["total"] if endpoint == "TOTAL" else before["endpoints"].get(endpoint)
+            if not old:
+                continue
+            change = (s["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+            flag = "  REGRESSION" if change > threshold else ""
+            regressed |= bool(flag)
+            print(f"{level['concurrency']:>11}  {endpoint:<20}{old['p95_ms']:>7.0f} -> {s['p95_ms']:<6.0f}{change:>+8.1f}%{flag}")
+        rps_change = (level["total"]["rps"] - before["total"]["rps"]) / before["total"]["rps"] * 100
+        flag = "  REGRESSION" if -rps_change > threshold else ""
+        regressed |= bool(flag)
+        print(f"{level['concurrency']:>11}  {'TOTAL req/s':<20}{before['total']['rps']:>7.1f} -> {level['total']['rps']:<6.1f}{rps_change:>+8.1f}%{flag}")
+    return regressed
+
+async def main(args):
+    config = FakeGeminiConfig(
+        latency_seconds=args.latency_ms / 1000, latency_sigma=args.latency_sigma, stream_chunks=args.stream_chunks,
+        rate_limit_rate=args.rate_limit_rate, timeout_rate=args.timeout_rate, timeout_seconds=args.timeout_seconds, seed=args.seed,
+    )
+    endpoints = args.endpoints.split(",") if args.endpoints else list(MIX)
+    corpus = [(f"textbook-{pages}.pdf", make_textbook_pdf(pages, seed=pages)) for pages in CORPUS_PAGES]
+
+    with fake_gemini(config):
+        async with app.router.lifespan_context(app):
+            # Like a browser: compressed responses, one user id per client
+            client = AsgiClient(app, {"Accept-Encoding": "gzip, br", "X-User-Id": "bench"})
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as setup:
+                document_ids = []
+                for name, content in corpus:
+                    response = await setup.post("/documents/upload?slim=true", files={"file": (name, content, "application/pdf")})
+                    response.raise_for_status()
+                    document_ids.append(response.json()["document_id"])
+
+            levels = []
+            for concurrency in [int(level) for level in args.concurrency.split(",")]:
+                level = await run_level(client, concurrency, args.duration, endpoints, corpus, document_ids, args.seed)
+                print_level(level)
+                levels.append(level)
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": vars(args),
+        "levels": levels,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"load-{time.strftime('%Y%m%d-%H%M%S')}-{result['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nsaved {path}")
+
+    if args.compare:
+        baseline_path = find_baseline(args.compare, path)
+        if baseline_path is None:
+            print("no earlier result to compare with")
+        else:
+            with open(baseline_path) as f:
+                regressed = compare(result, json.load(f), args.fail_on_regression or float("inf"))
+            if regressed and args.fail_on_regression:
+                return 1
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per level")
+    parser.add_argument("--endpoints", default="", help=f"comma-separated subset of: {', '.join(MIX)}")
+    parser.add_argument("--latency-ms", type=float, default=300, help="median fake Gemini latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread of the latency")
+    parser.add_argument("--stream-chunks", type=int, default=8)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of Gemini calls answered with 429")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="share of Gemini calls that time out")
+    parser.add_argument("--timeout-seconds", type=float, default=5.0)
+    parser.add_argument("--cold", action="store_true", help="turn off the response and extraction caches")
+    parser.add_argument("--no-quota", action="store_true", help="lift the client-side Gemini RPM/TPM limits")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=RESULTS_DIR, help="directory for the JSON results")
+    parser.add_argument("--compare", default="", help='earlier result file, or "latest"')
+    parser.add_argument("--fail-on-regression", type=float, default=0,
+                        help="exit with status 1 if p95 or throughput gets worse by more than this percent")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
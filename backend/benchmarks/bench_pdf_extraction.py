@@ -0,0 +1,73 @@
+"""
+PDF extraction wall time and event-loop blocking, before and after moving
+parsing to the process pool.
+
+"before" reproduces the previous inline loop (serial pages, text += ...,
+on the event loop). Loop blocking is the longest delay seen by a coroutine
+that ticks every 5 ms while the extraction runs.
+
+Run from backend/:  python -m benchmarks.bench_pdf_extraction
+"""
+import asyncio
+import io
+import os
+import tempfile
+import time
+
+from pypdf import PdfReader
+
+from app.services.extraction_service import extract_pages, get_process_pool
+from benchmarks.pdf_corpus import make_textbook_pdf
+
+PAGE_COUNTS = [100, 300, 600]
+TICK = 0.005
+
+async def inline_before(content: bytes) -> str:
+    reader = PdfReader(io.BytesIO(content))
+    text = ""
+    for page in reader.pages:
+        text += page.extract_text() + "\n"
+    return text
+
+async def process_pool_after(content: bytes) -> str:
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    try:
+        text, _ = await extract_pages(path)
+    finally:
+        os.remove(path)
+    return text
+
+async def measure(extract, content: bytes):
+    max_lag = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal max_lag
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            max_lag = max(max_lag, time.perf_counter() - start - TICK)
+
+    tick_task = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    text = await extract(content)
+    wall = time.perf_counter() - start
+    running = False
+    await tick_task
+    return wall, max_lag, len(text)
+
+async def main():
+    # Start the workers outside the measured runs
+    await asyncio.get_running_loop().run_in_executor(get_process_pool(), abs, 0)
+    print(f"{'pages':>6}{'variant':>14}{'wall (s)':>10}{'max loop block (ms)':>22}{'chars':>10}")
+    for page_count in PAGE_COUNTS:
+        content = make_textbook_pdf(page_count)
+        for name, extract in [("before", inline_before), ("after", process_pool_after)]:
+            wall, lag, chars = await measure(extract, content)
+            print(f"{page_count:>6}{name:>14}{wall:>10.2f}{lag * 1000:>22.1f}{chars:>10}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""
+Review-queue queries on large decks: the due-date heap vs. scanning every card.
+
+Each run fills one user's deck, reviews part of it so due dates spread out,
+then times "next 20 due cards" queries (with a review after each, as a study
+session does), batched writes to a SQLite store, and reloading the deck.
+
+Run from backend/:  python -m benchmarks.bench_review_queue
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from app.services.review_service import DAY_SECONDS, RATINGS, ReviewEngine, SqliteReviewStore
+
+SIZES = [int(size) for size in os.getenv("BENCH_REVIEW_SIZES", "10000,50000,100000").split(",")]
+QUERIES = int(os.getenv("BENCH_REVIEW_QUERIES", "500"))
+LIMIT = 20
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+def scan_due(deck, now: float, limit: int):
+    """
+    The baseline: look at every card's due date.
+    """
+    due = [(deck.due[slot], slot) for slot in range(len(deck)) if deck.due[slot] <= now]
+    due.sort()
+    return [slot for _, slot in due[:limit]]
+
+def percentile(samples, q: float) -> float:
+    return statistics.quantiles(samples, n=100)[int(q) - 1] if len(samples) > 1 else samples[0]
+
+def run(size: int, path: str):
+    rng = random.Random(size)
+    clock = Clock()
+    store = SqliteReviewStore(path)
+    engine = ReviewEngine(store, flush_seconds=3600, clock=clock)
+
+    start = time.perf_counter()
+    ids = engine.add_cards("bench", [(f"Question {i}", f"Answer {i}") for i in range(size)])
+    engine.flush()
+    add_seconds = time.perf_counter() - start
+
+    # Spread due dates over the coming weeks
+    for card_id in rng.sample(ids, size // 2):
+        engine.review("bench", card_id, rng.choice(list(RATINGS)))
+    clock.now += 3 * DAY_SECONDS
+    deck = engine._decks["bench"]
+
+    heap_times, scan_times = [], []
+    for _ in range(QUERIES):
+        start = time.perf_counter()
+        cards = engine.due_cards("bench", LIMIT)
+        heap_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        scan_due(deck, clock.now, LIMIT)
+        scan_times.append(time.perf_counter() - start)
+
+        if cards:
+            engine.review("bench", cards[0]["card_id"], rng.choice(list(RATINGS)))
+
+    start = time.perf_counter()
+    engine.flush()
+    flush_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ReviewEngine(store, clock=clock).due_cards("bench", LIMIT)
+    load_seconds = time.perf_counter() - start
+
+    state_bytes = sum(column.itemsize * len(column) for column in (deck.due, deck.interval, deck.ease, deck.reps, deck.lapses))
+    return {
+        "add": add_seconds,
+        "heap_p50": percentile(heap_times, 50) * 1e6,
+        "heap_p95": percentile(heap_times, 95) * 1e6,
+        "scan_p50": percentile(scan_times, 50) * 1e6,
+        "flush": flush_seconds,
+        "load": load_seconds,
+        "state_bytes": state_bytes,
+    }
+
+def main():
+    print(f"{'cards':>8}{'add+save (s)':>14}{'heap p50 (us)':>15}{'heap p95 (us)':>15}"
+          f"{'scan p50 (us)':>15}{'flush (s)':>11}{'reload (s)':>12}{'state (KB)':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in SIZES:
+            result = run(size, os.path.join(directory, f"reviews-{size}.sqlite3"))
+            print(f"{size:>8}{result['add']:>14.3f}{result['heap_p50']:>15.1f}{result['heap_p95']:>15.1f}"
+                  f"{result['scan_p50']:>15.1f}{result['flush']:>11.3f}{result['load']:>12.3f}{result['state_bytes'] / 1024:>12.0f}")
+
+if __name__ == "__main__":
+    main()
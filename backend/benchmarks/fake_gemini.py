@@ -0,0 +1,148 @@
+"""
+A fake Gemini backend for load tests, plugged in where the SDK is called.
+
+FakeGenerativeModel answers every prompt the app builds with a valid response
+of the right shape (analysis object, quiz or flashcard array, plan advice,
+study pack, chat text), after a latency drawn from a log-normal distribution.
+It streams in chunks, and can fail a share of calls with 429 (rate limited)
+or hang and then fail with 504 (timeout), as the real API does.
+
+Everything above the SDK runs for real: the model registry and router,
+retries, the rate limiter and the caches.
+"""
+import asyncio
+import json
+import random
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted
+
+from app.services import model_registry
+
+MODELS = ["gemini-1.5-flash", "gemini-2.0-flash", "gemini-1.5-pro"]
+
+@dataclass
+class FakeGeminiConfig:
+    # Median and spread (sigma of the underlying normal) of a call's latency
+    latency_seconds: float = 0.3
+    latency_sigma: float = 0.5
+    # Streamed responses come in this many chunks, the first after ~30% of the latency
+    stream_chunks: int = 8
+    # Share of calls answered with 429, and of calls that hang and then time out
+    rate_limit_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout_seconds: float = 5.0
+    seed: int = 0
+
+def _analysis():
+    return {
+        "summary": "The course covers cell structure, energy production and gene expression.",
+        "key_concepts": ["Mitochondria", "ATP", "Transcription", "Enzymes"],
+        "difficulty": "Intermediate",
+        "estimated_study_time": "3 hours",
+    }
+
+def _quiz(count: int):
+    return [{
+        "id": i + 1,
+        "type": "multiple_choice",
+        "question": f"Question {i + 1}: what does the mitochondria produce?",
+        "options": ["ATP", "DNA", "Glucose", "Oxygen"],
+        "correct_answer": "ATP",
+        "explanation": "Cellular respiration in the mitochondria produces ATP.",
+    } for i in range(count)]
+
+def _flashcards(count: int):
+    return [{"front": f"Concept {i + 1}", "back": f"Definition of concept {i + 1}."} for i in range(count)]
+
+def _number(pattern: str, prompt: str, default: int) -> int:
+    match = re.search(pattern, prompt)
+    return int(match.group(1)) if match else default
+
+def respond(prompt: str, mime_type: str) -> str:
+    """
+    A plausible response to one of the app's prompts.
+    """
+    if mime_type != "application/json":
+        if "Summarize this tutoring conversation" in prompt:
+            return "The student asked about cell energy; the tutor explained ATP production."
+        return ("Mitochondria turn nutrients into ATP through cellular respiration. "
+                "Think of them as the power plants of the cell: glucose goes in, usable energy comes out. ") * 3
+    if "build study material and return a single JSON object" in prompt:
+        return json.dumps({
+            "analysis": _analysis(),
+            "quiz": _quiz(_number(r"A JSON array of (\d+) quiz questions", prompt, 5)),
+            "flashcards": _flashcards(_number(r"A JSON array of (\d+) flashcards", prompt, 10)),
+        })
+    if "Generate a quiz with" in prompt:
+        return json.dumps(_quiz(_number(r"Generate a quiz with (\d+) questions", prompt, 5)))
+    if "flashcards based on the key concepts" in prompt:
+        return json.dumps(_flashcards(_number(r"Create (\d+) flashcards", prompt, 10)))
+    if "mapping each number" in prompt:
+        count = len(re.findall(r"^\s*\d+\. ", prompt, re.MULTILINE))
+        return json.dumps({str(i + 1): "Work through it actively and write down what you could not recall." for i in range(count)})
+    return json.dumps(_analysis())
+
+class FakeGenerativeModel:
+    def __init__(self, name, generation_config=None, config: FakeGeminiConfig = None, rng: random.Random = None):
+        self.model_name = f"models/{name}"
+        self.generation_config = generation_config or {}
+        self.config = config or FakeGeminiConfig()
+        self.rng = rng or random.Random(self.config.seed)
+
+    def _latency(self) -> float:
+        return self.rng.lognormvariate(0, self.config.latency_sigma) * self.config.latency_seconds
+
+    async def _fail_sometimes(self):
+        draw = self.rng.random()
+        if draw < self.config.rate_limit_rate:
+            await asyncio.sleep(0.01)
+            raise ResourceExhausted("Resource has been exhausted (e.g. check quota).")
+        if draw < self.config.rate_limit_rate + self.config.timeout_rate:
+            await asyncio.sleep(self.config.timeout_seconds)
+            raise DeadlineExceeded("Deadline Exceeded")
+
+    @staticmethod
+    def _usage(prompt: str, text: str):
+        return SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4,
+                               total_token_count=(len(prompt) + len(text)) // 4)
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        mime_type = (generation_config or self.generation_config or {}).get("response_mime_type", "text/plain")
+        await self._fail_sometimes()
+        text = respond(prompt, mime_type)
+        if stream:
+            return self._stream(prompt, text)
+        await asyncio.sleep(self._latency())
+        return SimpleNamespace(text=text, usage_metadata=self._usage(prompt, text))
+
+    async def _stream(self, prompt: str, text: str):
+        latency = self._latency()
+        chunks = max(1, self.config.stream_chunks)
+        size = -(-len(text) // chunks)
+        await asyncio.sleep(latency * 0.3)
+        for i in range(chunks):
+            if i:
+                await asyncio.sleep(latency * 0.7 / (chunks - 1))
+            last = i == chunks - 1
+            yield SimpleNamespace(text=text[i * size:(i + 1) * size],
+                                  usage_metadata=self._usage(prompt, text) if last else None)
+
+@contextmanager
+def fake_gemini(config: FakeGeminiConfig):
+    """
+    Route every Gemini call the app makes to FakeGenerativeModel.
+    """
+    rng = random.Random(config.seed)
+    genai = SimpleNamespace(
+        configure=lambda **kwargs: None,
+        list_models=lambda: [SimpleNamespace(name=f"models/{name}", supported_generation_methods=["generateContent"]) for name in MODELS],
+        GenerativeModel=lambda name, generation_config=None: FakeGenerativeModel(name, generation_config, config, rng),
+    )
+    with patch.object(model_registry, "genai", genai), \
+         patch.dict("os.environ", {"GEMINI_API_KEY": "fake"}):
+        yield
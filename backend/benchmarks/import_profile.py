@@ -0,0 +1,68 @@
+"""
+Import-time profile of the app, from python -X importtime.
+
+Imports a module (app.main by default) in a fresh interpreter and reports the
+total time, the slowest modules (cumulative, with what they pull in) and the
+time spent per top-level package (self time, so nothing is counted twice).
+
+Run from backend/:  python -m benchmarks.import_profile [module]
+"""
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOP_MODULES = 15
+
+@dataclass
+class ImportEntry:
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+def profile_imports(module: str = "app.main") -> List[ImportEntry]:
+    """
+    One entry per module imported by `import module`, in import order.
+    """
+    env = dict(os.environ, GEMINI_API_KEY="")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append(ImportEntry(name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+def total_seconds(entries: List[ImportEntry], module: str = "app.main") -> float:
+    return next(entry.cumulative_us for entry in entries if entry.name == module) / 1e6
+
+def package_totals(entries: List[ImportEntry]) -> Dict[str, int]:
+    totals = defaultdict(int)
+    for entry in entries:
+        totals[entry.name.split(".")[0]] += entry.self_us
+    return dict(totals)
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else "app.main"
+    entries = profile_imports(module)
+    print(f"import {module}: {total_seconds(entries, module) * 1000:.0f} ms, {len(entries)} modules\n")
+
+    print(f"{'cumulative ms':>14}{'self ms':>9}  module")
+    for entry in sorted(entries, key=lambda entry: entry.cumulative_us, reverse=True)[:TOP_MODULES]:
+        print(f"{entry.cumulative_us / 1000:>14.1f}{entry.self_us / 1000:>9.1f}  {'  ' * entry.depth}{entry.name}")
+
+    print(f"\n{'self ms':>9}  package")
+    for package, self_us in sorted(package_totals(entries).items(), key=lambda item: item[1], reverse=True)[:TOP_MODULES]:
+        print(f"{self_us / 1000:>9.1f}  {package}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Synthetic PDF corpora for benchmarks: text-only pages, no external tools needed.
+"""
+import random
+from typing import List
+
+WORDS = ("cell membrane protein enzyme energy gene mitochondria photosynthesis reaction "
+         "molecule structure function theory equation system process model analysis").split()
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """
+    Build a PDF where each page is a list of text lines.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        body = " ".join(f"({line}) Tj T*" for line in lines)
+        stream = f"BT /F1 10 Tf 12 TL 50 750 Td {body} ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R /Resources << /Font << /F1 3 0 R >> >> >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    chunks = [b"%PDF-1.4\n"]
+    length = len(chunks[0])
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(length)
+        chunk = f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+        chunks.append(chunk)
+        length += len(chunk)
+    xref = [f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"]
+    xref += [f"{offset:010d} 00000 n \n" for offset in offsets]
+    xref.append(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{length}\n%%EOF\n")
+    chunks.append("".join(xref).encode("latin-1"))
+    return b"".join(chunks)
+
+def make_textbook_pdf(page_count: int, lines_per_page: int = 50, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    pages = [
+        [f"{p + 1}.{l + 1} " + " ".join(rng.choice(WORDS) for _ in range(12)) for l in range(lines_per_page)]
+        for p in range(page_count)
+    ]
+    return make_pdf(pages)
@@ -0,0 +1,41 @@
+import json
+import os
+import tempfile
+import pytest
+from unittest.mock import MagicMock
+
+# Keep the test run offline: without a key, app startup skips listing Gemini
+# models. load_dotenv() does not override variables that are already set.
+os.environ["GEMINI_API_KEY"] = ""
+
+# Persistent stores used by the app lifespan go to a throwaway directory
+_store_dir = tempfile.mkdtemp(prefix="snh-tests-")
+os.environ.setdefault("JOB_QUEUE_PATH", os.path.join(_store_dir, "jobs.sqlite3"))
+os.environ.setdefault("EXTRACTION_CACHE_PATH", os.path.join(_store_dir, "extraction_cache.sqlite3"))
+os.environ.setdefault("REVIEW_STORE_PATH", os.path.join(_store_dir, "reviews.sqlite3"))
+
+def _parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines.get("event", "message"), json.loads(lines["data"])))
+    return events
+
+def _make_chunk(text):
+    chunk = MagicMock()
+    chunk.text = text
+    return chunk
+
+@pytest.fixture
+def parse_events():
+    """
+    Turn a Server-Sent Events body into a list of (event, data) pairs.
+    """
+    return _parse_events
+
+@pytest.fixture
+def make_chunk():
+    """
+    Build a streamed model chunk carrying text.
+    """
+    return _make_chunk
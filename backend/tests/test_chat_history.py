@@ -0,0 +1,106 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services import ai_service
+from app.services.chat_history import HistoryCompactor
+
+def conversation(turns):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"question {i}"})
+        history.append({"role": "model", "content": f"answer {i}"})
+    return history
+
+class RecordingSummarizer:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, summary, messages):
+        self.calls.append((summary, messages))
+        return f"{summary or ''}+{len(messages)}"
+
+@pytest.mark.asyncio
+async def test_short_history_is_sent_whole():
+    compactor = HistoryCompactor(RecordingSummarizer(), window=8)
+
+    summary, recent = compactor.compact(conversation(3))
+
+    assert summary is None
+    assert len(recent) == 6
+
+@pytest.mark.asyncio
+async def test_older_messages_are_summarized_in_the_background():
+    summarize = RecordingSummarizer()
+    compactor = HistoryCompactor(summarize, window=4)
+    history = conversation(5)
+
+    summary, recent = compactor.compact(history)
+    assert summary is None
+    assert recent == history
+
+    await compactor.wait_pending()
+    summary, recent = compactor.compact(history)
+    assert summary == "+6"
+    assert recent == history[-4:]
+
+@pytest.mark.asyncio
+async def test_summary_is_extended_incrementally():
+    summarize = RecordingSummarizer()
+    compactor = HistoryCompactor(summarize, window=4)
+    history = conversation(5)
+    compactor.compact(history)
+    await compactor.wait_pending()
+
+    history += conversation(1)
+    compactor.compact(history)
+    await compactor.wait_pending()
+
+    previous, messages = summarize.calls[-1]
+    assert previous == "+6"
+    assert len(messages) == 2
+    assert compactor.compact(history)[0] == "+6+2"
+
+@pytest.mark.asyncio
+async def test_no_message_is_left_out_between_summary_and_recent():
+    async def count_messages(summary, messages):
+        # The summary is the number of messages it covers
+        return str(int(summary or 0) + len(messages))
+
+    compactor = HistoryCompactor(count_messages, window=4)
+    history = []
+
+    for turn in range(12):
+        history += conversation(1)
+        summary, recent = compactor.compact(history)
+        assert history[int(summary or 0):] == recent
+        if turn > 2:
+            assert len(recent) == 6
+        await compactor.wait_pending()
+
+@pytest.mark.asyncio
+async def test_recent_window_respects_token_budget():
+    compactor = HistoryCompactor(RecordingSummarizer(), window=8, token_budget=50)
+    history = [{"role": "user", "content": "x" * 400}] * 4
+    compactor.compact(history)
+    await compactor.wait_pending()
+
+    _, recent = compactor.compact(history)
+
+    assert len(recent) == 1
+
+@pytest.mark.asyncio
+async def test_long_session_prompt_stays_flat():
+    model = MagicMock()
+    model.generate_content.return_value.text = "ok"
+    sizes = []
+
+    with patch.object(ai_service, "get_model", return_value=model), \
+         patch.object(ai_service, "_history_compactor", None):
+        history = []
+        for turn in range(30):
+            await ai_service.chat_with_document("Cells have mitochondria.", f"question {turn}", history)
+            chat_prompts = [c[0][0] for c in model.generate_content.call_args_list if "User Question" in c[0][0]]
+            sizes.append(len(chat_prompts[-1]))
+            history += [{"role": "user", "content": f"question {turn}"}, {"role": "model", "content": "a fairly long answer " * 10}]
+            await ai_service.get_history_compactor().wait_pending()
+
+    assert max(sizes[10:]) - min(sizes[10:]) < 200
@@ -0,0 +1,42 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.ai_service import stream_chat_with_document
+
+@pytest.fixture
+def mock_gemini_stream(make_chunk):
+    with patch('app.services.ai_service.get_model') as mock_get_model:
+        mock_instance = MagicMock()
+        mock_get_model.return_value = mock_instance
+        mock_instance.generate_content.return_value = iter([make_chunk("La mitochondrie "), make_chunk("produit l'ATP.")])
+        yield mock_instance
+
+@pytest.mark.asyncio
+async def test_stream_chat_yields_chunks_in_order(mock_gemini_stream):
+    chunks = [text async for text in stream_chat_with_document("Contexte", "Rôle ?", [], "fr")]
+
+    assert chunks == ["La mitochondrie ", "produit l'ATP."]
+    call_args = mock_gemini_stream.generate_content.call_args
+    assert "Contexte" in call_args[0][0]
+    assert call_args[1]["stream"] is True
+
+def test_chat_stream_endpoint_sends_sse_events(mock_gemini_stream, parse_events):
+    client = TestClient(app)
+    response = client.post("/ai/chat/stream", json={"context": "Contexte", "message": "Rôle ?", "history": [], "language": "fr"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    assert events == [
+        ("message", {"text": "La mitochondrie "}),
+        ("message", {"text": "produit l'ATP."}),
+        ("done", {}),
+    ]
+
+def test_chat_stream_endpoint_reports_errors(mock_gemini_stream, parse_events):
+    mock_gemini_stream.generate_content.side_effect = RuntimeError("boom")
+    client = TestClient(app)
+    response = client.post("/ai/chat/stream", json={"context": "C", "message": "Q", "history": []})
+
+    assert parse_events(response.text) == [("error", {"detail": "boom"})]
@@ -0,0 +1,76 @@
+import gzip
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from app.middleware import compression
+from app.middleware.compression import CompressionMiddleware
+
+brotli = pytest.importorskip("brotli")
+
+BIG = "study " * 1000
+
+def make_client():
+    inner = FastAPI()
+
+    @inner.get("/big")
+    async def big():
+        return PlainTextResponse(BIG)
+
+    @inner.get("/small")
+    async def small():
+        return PlainTextResponse("ok")
+
+    @inner.get("/events")
+    async def events():
+        async def stream():
+            yield "data: {}\n\n"
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @inner.get("/chunks")
+    async def chunks():
+        async def stream():
+            for _ in range(3):
+                yield BIG
+        return StreamingResponse(stream(), media_type="application/json")
+
+    return TestClient(CompressionMiddleware(inner, minimum_size=500))
+
+def raw_get(client, path, encoding):
+    with client.stream("GET", path, headers={"Accept-Encoding": encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+def test_brotli_is_preferred_when_accepted():
+    response, body = raw_get(make_client(), "/big", "gzip, br")
+
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert brotli.decompress(body).decode() == BIG
+
+def test_gzip_when_brotli_is_not_accepted_or_installed():
+    response, body = raw_get(make_client(), "/big", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(body).decode() == BIG
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(compression, "brotli", None)
+        response, _ = raw_get(make_client(), "/big", "br, gzip")
+    assert response.headers["content-encoding"] == "gzip"
+
+def test_small_bodies_and_event_streams_are_not_compressed():
+    client = make_client()
+
+    response, body = raw_get(client, "/small", "br")
+    assert "content-encoding" not in response.headers
+    assert body == b"ok"
+
+    response, body = raw_get(client, "/events", "br")
+    assert "content-encoding" not in response.headers
+    assert body == b"data: {}\n\n"
+
+def test_streamed_body_is_compressed_chunk_by_chunk():
+    response, body = raw_get(make_client(), "/chunks", "br")
+
+    assert response.headers["content-encoding"] == "br"
+    assert "content-length" not in response.headers
+    assert brotli.decompress(body).decode() == BIG * 3
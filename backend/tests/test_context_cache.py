@@ -0,0 +1,149 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from app.services import ai_service
+from app.services import context_cache as context_cache_module
+from app.services.context_cache import ContextCache
+
+class FakeCachedModel:
+    def __init__(self, name, provider):
+        self.model_name = name
+        self.provider = provider
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.provider.prompts.append(prompt)
+        return SimpleNamespace(text=f"answer from {self.model_name}", usage_metadata=None)
+
+class FakeContextCacheProvider:
+    """
+    Stands in for Gemini context caching: keeps cached prefixes in a dict.
+    """
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.caches = {}
+        self.refreshes = 0
+        self.deleted = []
+        self.prompts = []
+
+    def create(self, system_instruction, contents, ttl):
+        if self.fail:
+            raise RuntimeError("400 cached content is too small")
+        name = f"cachedContents/{len(self.caches)}"
+        self.caches[name] = (system_instruction, contents, ttl)
+        return name
+
+    def refresh(self, handle, ttl):
+        self.refreshes += 1
+
+    def delete(self, handle):
+        self.deleted.append(handle)
+        del self.caches[handle]
+
+    def client(self, handle):
+        return FakeCachedModel(handle, self)
+
+LONG_DOCUMENT = "Photosynthesis turns light into chemical energy. " * 50
+
+@pytest.mark.asyncio
+async def test_prefix_is_cached_once_and_reused():
+    provider = FakeContextCacheProvider()
+    cache = ContextCache(provider, min_tokens=100)
+
+    first = await cache.get_client("tutor", LONG_DOCUMENT)
+    second = await cache.get_client("tutor", LONG_DOCUMENT)
+
+    assert first.model_name == second.model_name
+    assert len(provider.caches) == 1
+    assert cache.hits == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_turns_share_one_create():
+    provider = FakeContextCacheProvider()
+    cache = ContextCache(provider, min_tokens=100)
+
+    await asyncio.gather(*[cache.get_client("tutor", LONG_DOCUMENT) for _ in range(10)])
+
+    assert cache.creates == 1
+
+@pytest.mark.asyncio
+async def test_short_prefix_is_not_cached():
+    provider = FakeContextCacheProvider()
+    cache = ContextCache(provider, min_tokens=100)
+
+    assert await cache.get_client("tutor", "short notes") is None
+    assert provider.caches == {}
+
+@pytest.mark.asyncio
+async def test_ttl_is_extended_near_expiry_and_expired_entries_recreated():
+    provider = FakeContextCacheProvider()
+    cache = ContextCache(provider, ttl=60, refresh_before=30, min_tokens=100)
+    await cache.get_client("tutor", LONG_DOCUMENT)
+
+    entry = next(iter(cache._entries.values()))
+    entry.expires_at -= 40
+    await cache.get_client("tutor", LONG_DOCUMENT)
+    assert provider.refreshes == 1
+
+    entry.expires_at -= 100
+    await cache.get_client("tutor", LONG_DOCUMENT)
+    assert cache.creates == 2
+
+@pytest.mark.asyncio
+async def test_least_recently_used_cache_is_deleted():
+    provider = FakeContextCacheProvider()
+    cache = ContextCache(provider, min_tokens=100, max_entries=2)
+
+    await cache.get_client("tutor", LONG_DOCUMENT + "a")
+    await cache.get_client("tutor", LONG_DOCUMENT + "b")
+    await cache.get_client("tutor", LONG_DOCUMENT + "a")
+    await cache.get_client("tutor", LONG_DOCUMENT + "c")
+
+    assert provider.deleted == ["cachedContents/1"]
+
+@pytest.mark.asyncio
+async def test_failed_create_falls_back_and_is_not_retried_every_turn():
+    provider = FakeContextCacheProvider(fail=True)
+    cache = ContextCache(provider, min_tokens=100)
+
+    assert await cache.get_client("tutor", LONG_DOCUMENT) is None
+    provider.fail = False
+    assert await cache.get_client("tutor", LONG_DOCUMENT) is None
+    assert provider.caches == {}
+
+@pytest.mark.asyncio
+async def test_client_is_built_once_per_cache():
+    provider = FakeContextCacheProvider()
+    cache = ContextCache(provider, min_tokens=100)
+
+    first = await cache.get_client("tutor", LONG_DOCUMENT)
+    second = await cache.get_client("tutor", LONG_DOCUMENT)
+
+    assert first is second
+
+@pytest.mark.asyncio
+async def test_expired_failures_are_forgotten():
+    provider = FakeContextCacheProvider(fail=True)
+    cache = ContextCache(provider, min_tokens=100)
+
+    with patch.object(context_cache_module, "CONTEXT_CACHE_RETRY_SECONDS", 0):
+        await cache.get_client("tutor", LONG_DOCUMENT + "a")
+    await cache.get_client("tutor", LONG_DOCUMENT + "b")
+
+    assert len(cache._failed_until) == 1
+
+@pytest.mark.asyncio
+async def test_chat_turns_send_only_history_and_question():
+    provider = FakeContextCacheProvider()
+    cache = ContextCache(provider, min_tokens=100)
+    history = []
+
+    with patch.object(ai_service, "get_context_cache", return_value=cache):
+        for question in ["What is photosynthesis?", "Where does it happen?"]:
+            answer = await ai_service.chat_with_document(LONG_DOCUMENT, question, history)
+            history += [{"role": "user", "content": question}, {"role": "model", "content": answer}]
+
+    assert len(provider.caches) == 1
+    assert all("Photosynthesis turns light" not in prompt for prompt in provider.prompts)
+    assert "Where does it happen?" in provider.prompts[-1]
@@ -0,0 +1,231 @@
+import asyncio
+import io
+import os
+import signal
+import pytest
+from fastapi import HTTPException, UploadFile
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import extraction_service
+from app.services.document_store import clear_documents, resolve_document_text
+from app.services.extraction_service import extract_pages, spool_upload, _page_ranges
+from app.services.document_store import compute_document_id
+from app.services.extraction_cache import ExtractionCache
+from app.middleware.upload_limit import UploadSizeLimitMiddleware
+
+def make_pdf(pages):
+    """
+    Build a minimal PDF with one line of text per page.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R /Resources << /Font << /F1 3 0 R >> >> >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return out
+
+@pytest.fixture
+def client():
+    clear_documents()
+    yield TestClient(app)
+    clear_documents()
+
+def upload(client, content, filename="course.pdf"):
+    return client.post("/documents/upload", files={"file": (filename, content, "application/pdf")})
+
+def test_upload_returns_document_id_and_preview(client):
+    response = upload(client, make_pdf(["Mitochondria produce ATP", "Ribosomes build proteins"]))
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["document_id"]) == 64
+    assert "Mitochondria produce ATP" in data["preview"]
+    assert "extracted_text" not in data
+
+def test_same_pdf_gets_same_document_id(client):
+    content = make_pdf(["Photosynthesis"])
+
+    first = upload(client, content, "a.pdf").json()
+    second = upload(client, content, "b.pdf").json()
+
+    assert first["document_id"] == second["document_id"]
+
+def test_ai_endpoint_resolves_document_id(client):
+    document_id = upload(client, make_pdf(["Krebs cycle overview"])).json()["document_id"]
+
+    with patch('app.services.ai_service.get_model') as mock_get_model, \
+         patch('app.routers.ai.resolve_document_text', wraps=resolve_document_text) as resolve:
+        mock_model = MagicMock()
+        mock_get_model.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = '[{"front": "Krebs", "back": "Cycle"}]'
+        mock_model.generate_content.return_value = mock_response
+
+        response = client.post("/ai/flashcards", json={"document_id": document_id, "num_cards": 1})
+
+    assert response.status_code == 200
+    assert resolve.call_count == 1
+    prompt = mock_model.generate_content.call_args[0][0]
+    assert "Krebs cycle overview" in prompt
+
+def test_ai_endpoint_unknown_document_id(client):
+    response = client.post("/ai/analyze", json={"document_id": "missing"})
+    assert response.status_code == 404
+
+def test_ai_endpoint_requires_text_or_document_id(client):
+    response = client.post("/ai/analyze", json={"language": "en"})
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_extract_pages_records_page_offsets(tmp_path):
+    path = tmp_path / "book.pdf"
+    path.write_bytes(make_pdf([f"Page {i} text" for i in range(1, 61)]))
+
+    text, pages = await extract_pages(str(path))
+
+    assert [page.page_number for page in pages] == list(range(1, 61))
+    for page in pages:
+        assert text[page.start:page.end] == page.text
+        assert f"Page {page.page_number} text" in page.text
+
+def test_page_ranges_split_large_documents_across_workers():
+    assert _page_ranges(10, workers=4) == [(0, 10)]
+    assert _page_ranges(100, workers=4) == [(0, 25), (25, 50), (50, 75), (75, 100)]
+    assert _page_ranges(101, workers=2) == [(0, 51), (51, 101)]
+
+def test_upload_over_limit_is_rejected_with_413():
+    limited = TestClient(UploadSizeLimitMiddleware(app, max_bytes=100))
+
+    response = upload(limited, make_pdf(["Too big for the limit"]))
+
+    assert response.status_code == 413
+
+def test_streamed_upload_over_limit_is_rejected_with_413():
+    limited = TestClient(UploadSizeLimitMiddleware(app, max_bytes=100))
+
+    def body():
+        for _ in range(10):
+            yield b"x" * 50
+
+    response = limited.post("/documents/upload", content=body(), headers={"content-type": "multipart/form-data; boundary=b"})
+
+    assert response.status_code == 413
+
+@pytest.mark.asyncio
+async def test_spool_upload_enforces_limit_while_streaming(tmp_path):
+    upload_file = UploadFile(io.BytesIO(b"x" * 5000), filename="big.pdf")
+
+    with patch('app.services.extraction_service.UPLOAD_TMP_DIR', str(tmp_path)), \
+         patch('app.services.extraction_service.UPLOAD_CHUNK_BYTES', 1000):
+        with pytest.raises(HTTPException) as error:
+            await spool_upload(upload_file, max_bytes=2500)
+
+    assert error.value.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+@pytest.mark.asyncio
+async def test_spool_upload_hashes_content(tmp_path):
+    content = make_pdf(["Hash me"])
+    upload_file = UploadFile(io.BytesIO(content), filename="a.pdf")
+
+    with patch('app.services.extraction_service.UPLOAD_TMP_DIR', str(tmp_path)):
+        path, document_id = await spool_upload(upload_file)
+
+    assert document_id == compute_document_id(content)
+    with open(path, "rb") as f:
+        assert f.read() == content
+
+def test_reupload_after_eviction_skips_parsing(client):
+    content = make_pdf(["Cached page one", "Cached page two"])
+    first = upload(client, content).json()
+    clear_documents()
+
+    with patch('app.services.extraction_service._parse_page_texts') as parse:
+        second = upload(client, content).json()
+
+    assert not parse.called
+    assert second["document_id"] == first["document_id"]
+    assert second["preview"] == first["preview"]
+
+def test_ai_endpoint_restores_evicted_document_from_extraction_cache(client):
+    document_id = upload(client, make_pdf(["Glycolysis splits glucose"])).json()["document_id"]
+    # As after an eviction, a restart or on another worker
+    clear_documents()
+
+    with patch('app.services.ai_service.get_model') as mock_get_model:
+        mock_model = MagicMock()
+        mock_get_model.return_value = mock_model
+        mock_model.generate_content.return_value.text = '[{"front": "Glycolysis", "back": "Splits glucose"}]'
+
+        response = client.post("/ai/flashcards", json={"document_id": document_id, "num_cards": 1})
+
+    assert response.status_code == 200
+    assert "Glycolysis splits glucose" in mock_model.generate_content.call_args[0][0]
+
+def test_document_text_restores_evicted_document(client):
+    document_id = upload(client, make_pdf(["First page", "Second page"])).json()["document_id"]
+    clear_documents()
+
+    data = client.get(f"/documents/{document_id}/text").json()
+
+    assert data["page_count"] == 2
+    assert "Second page" in data["pages"][1]["text"]
+
+def test_extraction_cache_evicts_least_recently_used(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "extractions.sqlite3"), max_bytes=10**9)
+    cache.put("a", "a.pdf", ["alpha " * 100])
+    cache.put("b", "b.pdf", ["beta " * 100])
+    cache.get("a")
+    cache.max_bytes = cache.stats()["size_bytes"] - 1
+
+    cache.put("c", "c.pdf", ["c"])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == ["alpha " * 100]
+    assert cache.get("c") == ["c"]
+
+def test_slim_upload_returns_only_id_and_page_count(client):
+    response = client.post("/documents/upload?slim=true", files={"file": ("course.pdf", make_pdf(["One", "Two", "Three"]), "application/pdf")})
+
+    assert response.status_code == 200
+    assert response.json() == {"document_id": compute_document_id(make_pdf(["One", "Two", "Three"])), "page_count": 3}
+
+def test_document_text_is_paged(client):
+    document_id = upload(client, make_pdf([f"Chapter {i}" for i in range(1, 6)])).json()["document_id"]
+
+    data = client.get(f"/documents/{document_id}/text", params={"page": 2, "page_size": 2}).json()
+
+    assert data["page_count"] == 5
+    assert [page["page_number"] for page in data["pages"]] == [3, 4]
+    assert "Chapter 3" in data["pages"][0]["text"]
+    assert client.get("/documents/missing/text").status_code == 404
+
+@pytest.mark.asyncio
+async def test_dead_pdf_worker_is_replaced(tmp_path):
+    path = tmp_path / "book.pdf"
+    path.write_bytes(make_pdf(["After the crash"]))
+    pool = extraction_service.get_process_pool()
+    await asyncio.get_running_loop().run_in_executor(pool, abs, 0)
+
+    # As when a worker is killed for using too much memory
+    os.kill(next(iter(pool._processes)), signal.SIGKILL)
+    await asyncio.sleep(0.2)
+    text, _ = await extract_pages(str(path))
+
+    assert "After the crash" in text
+    assert extraction_service.get_process_pool() is not pool
@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services import ai_service
+from app.services.ai_service import generate_content_with_retry
+
+class AsyncStubModel:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        response = MagicMock()
+        response.text = prompt
+        return response
+
+    def generate_content(self, prompt, generation_config=None):
+        raise AssertionError("sync path should not be used when an async API exists")
+
+@pytest.mark.asyncio
+async def test_uses_native_async_api_when_available():
+    model = AsyncStubModel()
+    response = await generate_content_with_retry(model, "hello")
+    assert response.text == "hello"
+
+@pytest.mark.asyncio
+async def test_falls_back_to_sync_api():
+    model = MagicMock()
+    model.generate_content.return_value.text = "sync"
+
+    response = await generate_content_with_retry(model, "hello", mime_type="text/plain")
+
+    assert response.text == "sync"
+    assert model.generate_content.call_args[1]["generation_config"] == {"response_mime_type": "text/plain"}
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded():
+    model = AsyncStubModel()
+    with patch.object(ai_service, "MAX_CONCURRENCY", 5), patch.object(ai_service, "_semaphore", None):
+        await asyncio.gather(*[generate_content_with_retry(model, f"p{i}") for i in range(30)])
+
+    assert model.max_in_flight == 5
+
+@pytest.mark.asyncio
+async def test_background_work_leaves_slots_for_interactive_requests():
+    model = AsyncStubModel()
+
+    async def background_call(i):
+        ai_service.background_work.set(True)
+        return await generate_content_with_retry(model, f"bulk {i}")
+
+    with patch.object(ai_service, "MAX_CONCURRENCY", 8), patch.object(ai_service, "_semaphore", None), \
+         patch.object(ai_service, "BACKGROUND_CONCURRENCY", 6), patch.object(ai_service, "_background_semaphore", None):
+        await asyncio.gather(*[background_call(i) for i in range(30)])
+
+    assert model.max_in_flight == 6
@@ -0,0 +1,20 @@
+import os
+
+from benchmarks.import_profile import profile_imports, total_seconds
+
+# Seconds `import app.main` may take in a fresh interpreter (best of two runs).
+# FastAPI and pydantic alone take about half of this on a typical machine.
+IMPORT_TIME_BUDGET_SECONDS = float(os.getenv("IMPORT_TIME_BUDGET_SECONDS", "1.5"))
+
+# Loaded on first use (or by the lifespan pre-warm), never at import
+LAZY_DEPENDENCIES = ("google.generativeai", "pypdf", "supabase", "httpx")
+
+def test_heavy_dependencies_are_not_imported_with_the_app():
+    imported = {entry.name for entry in profile_imports("app.main")}
+
+    assert [name for name in LAZY_DEPENDENCIES if name in imported] == []
+
+def test_app_imports_within_budget():
+    seconds = min(total_seconds(profile_imports("app.main")) for _ in range(2))
+
+    assert seconds < IMPORT_TIME_BUDGET_SECONDS
@@ -0,0 +1,158 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import job_queue as job_queue_module
+from app.services.job_queue import JobQueue, QueueFullError, register_job_handler, PRIORITY_HIGH, PRIORITY_BULK
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), workers=1, max_queued=10)
+    with patch.object(job_queue_module, "_job_queue", queue):
+        yield queue
+
+@pytest.mark.asyncio
+async def test_job_runs_and_result_can_be_awaited(queue):
+    async def double(payload):
+        return {"value": payload["value"] * 2}
+    register_job_handler("test_double", double)
+
+    job_id = await queue.submit("test_double", {"value": 21})
+    job = await queue.wait(job_id, timeout=5)
+
+    assert job["status"] == "done"
+    assert job["result"] == {"value": 42}
+    await queue.stop()
+
+@pytest.mark.asyncio
+async def test_higher_priority_jobs_run_first(queue):
+    order = []
+    release = asyncio.Event()
+
+    async def record(payload):
+        await release.wait()
+        order.append(payload["name"])
+    register_job_handler("test_record", record)
+
+    first = await queue.submit("test_record", {"name": "running"})
+    await asyncio.sleep(0.01)
+    await queue.submit("test_record", {"name": "bulk"}, priority=PRIORITY_BULK)
+    last = await queue.submit("test_record", {"name": "interactive"}, priority=PRIORITY_HIGH)
+    release.set()
+    await queue.wait(last, timeout=5)
+    await asyncio.sleep(0.05)
+
+    assert order == ["running", "interactive", "bulk"]
+    await queue.stop()
+
+@pytest.mark.asyncio
+async def test_failed_job_records_error(queue):
+    async def fail(payload):
+        raise RuntimeError("429 quota exceeded")
+    register_job_handler("test_fail", fail)
+
+    job = await queue.wait(await queue.submit("test_fail", {}), timeout=5)
+
+    assert job["status"] == "failed"
+    assert "429" in job["error"]
+    await queue.stop()
+
+@pytest.mark.asyncio
+async def test_queue_is_bounded(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), workers=0, max_queued=2)
+
+    async def noop(payload):
+        return None
+    register_job_handler("test_noop", noop)
+
+    await queue.submit("test_noop", {})
+    await queue.submit("test_noop", {})
+    with pytest.raises(QueueFullError):
+        await queue.submit("test_noop", {})
+
+@pytest.mark.asyncio
+async def test_queued_jobs_survive_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+
+    async def echo(payload):
+        return payload
+    register_job_handler("test_echo", echo)
+
+    stopped = JobQueue(path, workers=0)
+    job_id = await stopped.submit("test_echo", {"text": "kept"})
+
+    restarted = JobQueue(path, workers=1)
+    restarted.start()
+    job = await restarted.wait(job_id, timeout=5)
+
+    assert job["result"] == {"text": "kept"}
+    await restarted.stop()
+
+@pytest.mark.asyncio
+async def test_second_process_does_not_take_a_running_job(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    runs = []
+    release = asyncio.Event()
+
+    async def slow(payload):
+        runs.append(payload)
+        await release.wait()
+        return "ok"
+    register_job_handler("test_slow", slow)
+
+    first = JobQueue(path, workers=1)
+    job_id = await first.submit("test_slow", {})
+    await asyncio.sleep(0.05)
+    # Another server process on the same database starts up
+    second = JobQueue(path, workers=1)
+    second.start()
+    await asyncio.sleep(0.05)
+    release.set()
+
+    assert (await first.wait(job_id, timeout=5))["status"] == "done"
+    assert len(runs) == 1
+    await first.stop()
+    await second.stop()
+
+@pytest.mark.asyncio
+async def test_job_of_a_dead_process_runs_again_once_its_lease_expires(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+
+    async def echo(payload):
+        return payload
+    register_job_handler("test_echo", echo)
+
+    dead = JobQueue(path, workers=0, lease_seconds=0.1)
+    job_id = await dead.submit("test_echo", {"text": "resumed"})
+    assert dead._claim()[0] == job_id
+    # The process dies: its lease is no longer renewed
+    await dead.stop()
+
+    alive = JobQueue(path, workers=1, lease_seconds=0.1)
+    alive.start()
+    assert (await alive.get(job_id))["status"] == "running"
+    job = await alive.wait(job_id, timeout=5)
+
+    assert job["result"] == {"text": "resumed"}
+    await alive.stop()
+
+def test_background_quiz_endpoint_returns_job_then_result(queue):
+    with patch('app.services.ai_service.get_model') as mock_get_model:
+        mock_model = MagicMock()
+        mock_get_model.return_value = mock_model
+        mock_model.generate_content.return_value.text = '[{"id": 1, "type": "true_false", "question": "Q?", "options": ["True", "False"], "correct_answer": "True", "explanation": "E"}]'
+
+        with TestClient(app) as client:
+            submitted = client.post("/ai/quiz?background=true", json={"text": "Background quiz text", "num_questions": 1})
+            assert submitted.status_code == 202
+            job_id = submitted.json()["job_id"]
+
+            job = client.get(f"/jobs/{job_id}?wait=5").json()
+
+    assert job["status"] == "done"
+    assert job["result"]["questions"][0]["question"] == "Q?"
+
+def test_unknown_job_returns_404(queue):
+    with TestClient(app) as client:
+        assert client.get("/jobs/missing").status_code == 404
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services import ai_service
+from app.services.ai_service import analyze_text, generate_quiz, generate_flashcards, stream_quiz, _split_count
+from app.services.response_cache import MemoryCacheBackend, ResponseCache
+
+def make_document(parts=4):
+    return "\n\n".join(f"Part{i} " + "content " * 100 for i in range(parts))
+
+@pytest.fixture
+def mock_gemini_map():
+    with patch('app.services.ai_service.get_model') as mock_get_model, \
+         patch('app.services.ai_service.get_response_cache', return_value=ResponseCache(None)), \
+         patch.object(ai_service, "MAP_REDUCE_MIN_CHARS", 1000), \
+         patch.object(ai_service, "MAP_CHUNK_CHARS", 900):
+        mock_instance = MagicMock()
+        mock_get_model.return_value = mock_instance
+        yield mock_instance
+
+def respond_with(func):
+    def generate_content(prompt, generation_config=None):
+        response = MagicMock()
+        response.text = json.dumps(func(prompt))
+        return response
+    return generate_content
+
+def part_of(prompt):
+    return next(f"Part{i}" for i in range(100) if f"Part{i} " in prompt)
+
+def test_split_count_balances_items():
+    assert _split_count(10, 4) == [3, 3, 2, 2]
+    assert _split_count(2, 4) == [1, 0, 1, 0]
+
+@pytest.mark.asyncio
+async def test_quiz_covers_every_part_and_renumbers(mock_gemini_map):
+    def quiz(prompt):
+        part = part_of(prompt)
+        return [{"id": 1, "type": "true_false", "question": f"About {part}?", "options": ["True", "False"], "correct_answer": "True", "explanation": "."},
+                {"id": 2, "type": "true_false", "question": "Duplicate?", "options": ["True", "False"], "correct_answer": "True", "explanation": "."}]
+    mock_gemini_map.generate_content.side_effect = respond_with(quiz)
+
+    questions = await generate_quiz(make_document(), num_questions=8)
+
+    assert mock_gemini_map.generate_content.call_count == 4
+    texts = [q["question"] for q in questions]
+    assert texts[:2] == ["About Part0?", "Duplicate?"]
+    assert {f"About Part{i}?" for i in range(4)} <= set(texts)
+    assert texts.count("Duplicate?") == 1
+    assert [q["id"] for q in questions] == list(range(1, len(questions) + 1))
+
+@pytest.mark.asyncio
+async def test_flashcards_are_deduplicated(mock_gemini_map):
+    mock_gemini_map.generate_content.side_effect = respond_with(lambda prompt: [{"front": "ATP", "back": "Energy"}, {"front": part_of(prompt), "back": "x"}])
+
+    cards = await generate_flashcards(make_document(), num_cards=10)
+
+    assert [c["front"] for c in cards] == ["ATP", "Part0", "Part1", "Part2", "Part3"]
+
+@pytest.mark.asyncio
+async def test_analysis_merges_partial_results(mock_gemini_map):
+    def analysis(prompt):
+        if "Partial analyses" in prompt:
+            return {"summary": "Whole course", "difficulty": "Intermediate", "estimated_study_time": "8 hours"}
+        return {"summary": part_of(prompt), "key_concepts": ["Cells", part_of(prompt)], "difficulty": "Beginner", "estimated_study_time": "2 hours"}
+    mock_gemini_map.generate_content.side_effect = respond_with(analysis)
+
+    result = await analyze_text(make_document())
+
+    assert result["summary"] == "Whole course"
+    assert result["key_concepts"][0] == "Cells"
+    assert result["key_concepts"].count("Cells") == 1
+    assert len(result["key_concepts"]) == 5
+
+@pytest.mark.asyncio
+async def test_incomplete_merged_analysis_is_not_cached(mock_gemini_map):
+    merges = iter([{"summary": "Whole course"}, {"summary": "Whole course", "difficulty": "Beginner", "estimated_study_time": "8 hours"}])
+
+    def analysis(prompt):
+        if "Partial analyses" in prompt:
+            return next(merges)
+        return {"summary": part_of(prompt), "key_concepts": ["Cells"], "difficulty": "Beginner", "estimated_study_time": "2 hours"}
+    mock_gemini_map.generate_content.side_effect = respond_with(analysis)
+
+    with patch('app.services.ai_service.get_response_cache', return_value=ResponseCache(MemoryCacheBackend())):
+        first = await analyze_text(make_document())
+        calls = mock_gemini_map.generate_content.call_count
+        second = await analyze_text(make_document())
+
+    assert "difficulty" not in first
+    # The parts come from the cache, the merge is asked again
+    assert mock_gemini_map.generate_content.call_count == calls + 1
+    assert second["difficulty"] == "Beginner"
+
+@pytest.mark.asyncio
+async def test_failed_part_cancels_the_other_parts(mock_gemini_map):
+    cancelled = []
+
+    async def generate_content_async(prompt, generation_config=None):
+        part = part_of(prompt)
+        if part == "Part0":
+            await asyncio.sleep(0.01)
+            raise ValueError("400 bad request")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(part)
+            raise
+    mock_gemini_map.generate_content_async = generate_content_async
+
+    with pytest.raises(ValueError):
+        await asyncio.wait_for(analyze_text(make_document()), timeout=5)
+    await asyncio.sleep(0.01)
+
+    assert sorted(cancelled) == ["Part1", "Part2", "Part3"]
+
+@pytest.mark.asyncio
+async def test_stream_quiz_yields_parts_as_they_finish(mock_gemini_map):
+    mock_gemini_map.generate_content.side_effect = respond_with(
+        lambda prompt: [{"id": 1, "type": "true_false", "question": part_of(prompt), "options": ["True", "False"], "correct_answer": "True", "explanation": "."}])
+
+    questions = [q async for q in stream_quiz(make_document(), num_questions=4)]
+
+    assert sorted(q["question"] for q in questions) == [f"Part{i}" for i in range(4)]
+    assert sorted(q["id"] for q in questions) == [1, 2, 3, 4]
@@ -0,0 +1,75 @@
+import json
+import logging
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.logging_config import JsonFormatter
+from app.services import ai_service
+from app.services.metrics import Counter, Histogram, LLM_RATE_LIMITED, LLM_RETRIES, STAGE_SECONDS
+from app.services.response_cache import ResponseCache
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test.", ("stage",), buckets=(0.1, 1))
+    histogram.observe(0.05, stage="parse")
+    histogram.observe(0.5, stage="parse")
+    histogram.observe(5, stage="parse")
+
+    lines = histogram.render().splitlines()
+
+    assert 'test_seconds_bucket{stage="parse",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="parse",le="1"} 2' in lines
+    assert 'test_seconds_bucket{stage="parse",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="parse"} 3' in lines
+
+def test_counter_escapes_label_values():
+    counter = Counter("test_total", "Test.", ("model",))
+    counter.inc(model='say "hi"')
+
+    assert 'test_total{model="say \\"hi\\""} 1' in counter.render()
+
+def test_metrics_endpoint_reports_routes_and_stages():
+    model = MagicMock()
+    model.model_name = "models/metrics-test"
+    model.generate_content.return_value.text = '[{"front": "ATP", "back": "Energy"}]'
+    model.generate_content.return_value.usage_metadata.prompt_token_count = 120
+    model.generate_content.return_value.usage_metadata.candidates_token_count = 30
+    model.generate_content.return_value.usage_metadata.total_token_count = 150
+
+    client = TestClient(app)
+    with patch.object(ai_service, "get_model", return_value=model), \
+         patch.object(ai_service, "get_response_cache", return_value=ResponseCache(None)):
+        assert client.post("/ai/flashcards", json={"text": "Cells", "num_cards": 1}).status_code == 200
+
+    body = client.get("/metrics").text
+
+    assert 'snh_http_request_duration_seconds_count{method="POST",route="/ai/flashcards",status="200"}' in body
+    assert 'snh_llm_prompt_tokens_total{model="models/metrics-test"} 120' in body
+    for name in ("prompt_build", "queue", "llm", "parse", "validation"):
+        assert STAGE_SECONDS.count(stage=name) > 0
+
+@pytest.mark.asyncio
+async def test_rate_limits_are_counted():
+    model = MagicMock()
+    model.model_name = "models/limited"
+    ok = MagicMock()
+    ok.text = "fine"
+    model.generate_content.side_effect = [Exception("429 Resource exhausted"), ok]
+
+    with patch.object(ai_service, "_retry_delay", return_value=0):
+        await ai_service.generate_content_with_retry(model, "hello")
+
+    assert LLM_RATE_LIMITED.value(model="models/limited") == 1
+    assert LLM_RETRIES.value(model="models/limited") == 1
+
+def test_json_log_lines_carry_extra_fields():
+    record = logging.LogRecord("app.services.ai_service", logging.WARNING, __file__, 1, "Rate limit hit, retrying", (), None)
+    record.model = "gemini-1.5-flash"
+    record.attempt = 2
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["message"] == "Rate limit hit, retrying"
+    assert entry["level"] == "WARNING"
+    assert entry["model"] == "gemini-1.5-flash"
+    assert entry["attempt"] == 2
@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import model_registry as model_registry_module
+from app.services.model_registry import ModelRegistry
+
+def listed(*names):
+    return [SimpleNamespace(name=f"models/{name}", supported_generation_methods=["generateContent"]) for name in names]
+
+@pytest.fixture
+def genai():
+    with patch.object(model_registry_module, "genai") as mock_genai, \
+         patch.dict("os.environ", {"GEMINI_API_KEY": "test-key"}):
+        yield mock_genai
+
+def test_configures_once_and_reuses_clients(genai):
+    genai.list_models.return_value = listed("gemini-2.0-flash", "gemini-1.5-flash")
+    registry = ModelRegistry()
+
+    first = registry.get_client()
+    second = registry.get_client()
+
+    assert first is second
+    assert genai.configure.call_count == 1
+    assert genai.list_models.call_count == 1
+    assert genai.GenerativeModel.call_args[0][0] == "gemini-1.5-flash"
+
+def test_clients_are_kept_per_generation_config(genai):
+    genai.list_models.return_value = listed("gemini-1.5-flash")
+    registry = ModelRegistry()
+
+    registry.get_client(generation_config={"response_mime_type": "application/json"})
+    registry.get_client(generation_config={"response_mime_type": "text/plain"})
+    registry.get_client(generation_config={"response_mime_type": "text/plain"})
+
+    assert genai.GenerativeModel.call_count == 2
+
+def test_failed_listing_is_not_retried_on_every_request(genai):
+    genai.list_models.side_effect = RuntimeError("network down")
+    registry = ModelRegistry()
+
+    for _ in range(5):
+        registry.get_client()
+
+    assert genai.list_models.call_count == 1
+    assert registry.active_model == "gemini-1.5-flash"
+    assert registry.health()["last_error"] == "network down"
+
+def test_refresh_keeps_previous_choice_on_failure(genai):
+    genai.list_models.return_value = listed("gemini-2.0-flash")
+    registry = ModelRegistry()
+    registry.refresh()
+
+    genai.list_models.side_effect = RuntimeError("timeout")
+    registry.refresh()
+
+    assert registry.active_model == "gemini-2.0-flash"
+
+@pytest.mark.asyncio
+async def test_started_registry_never_lists_models_on_the_request_path(genai):
+    genai.list_models.return_value = listed("gemini-2.0-flash")
+    registry = ModelRegistry()
+
+    registry.start()
+    try:
+        registry.get_client()
+        assert genai.list_models.call_count == 0
+        assert genai.GenerativeModel.call_args[0][0] == "gemini-1.5-flash"
+        # The first listing runs in the background right away
+        for _ in range(100):
+            if registry.last_refresh is not None:
+                break
+            await asyncio.sleep(0.01)
+        assert registry.active_model == "gemini-2.0-flash"
+    finally:
+        await registry.stop()
+
+def test_health_endpoint_reports_active_model(genai):
+    genai.list_models.return_value = listed("gemini-1.5-pro")
+    registry = ModelRegistry()
+
+    with patch.object(model_registry_module, "_model_registry", registry):
+        with TestClient(app) as client:
+            data = client.get("/health").json()
+
+    assert data["status"] == "ok"
+    assert data["model"]["active_model"] == "gemini-1.5-pro"
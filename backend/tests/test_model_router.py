@@ -0,0 +1,138 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from app.services import ai_service, model_router
+from app.services.model_router import ModelRouter, RoutedModel
+
+ROUTES = {
+    "default": ["fast", "backup"],
+    "chat": ["chat-model", "fast"],
+}
+
+class NamedStubModel:
+    def __init__(self, name, delay=0.0, error=None):
+        self.model_name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise RuntimeError(self.error)
+        response = MagicMock()
+        response.text = self.model_name
+        response.usage_metadata = None
+        return response
+
+class DelayedSlot:
+    def __init__(self, wait):
+        self.wait = wait
+
+    async def __aenter__(self):
+        await asyncio.sleep(self.wait)
+
+    async def __aexit__(self, *exc):
+        return False
+
+@pytest.fixture
+def registry():
+    fake = SimpleNamespace(available_models=[], active_model="fast", models={})
+    fake.get_client = lambda name=None, generation_config=None: fake.models[name]
+    with patch.object(model_router, "get_model_registry", return_value=fake), \
+         patch.object(ai_service, "get_model_registry", return_value=fake):
+        yield fake
+
+def test_candidates_follow_task(registry):
+    router = ModelRouter(routes=ROUTES)
+
+    assert router.candidates("chat") == ["chat-model", "fast"]
+    assert router.candidates("quiz") == ["fast", "backup"]
+
+def test_unavailable_models_are_skipped(registry):
+    registry.available_models = ["backup"]
+    router = ModelRouter(routes=ROUTES)
+
+    assert router.candidates("quiz") == ["backup"]
+    assert router.candidates("chat") == ["fast"]
+
+def test_failing_model_moves_to_the_back(registry):
+    router = ModelRouter(routes=ROUTES)
+    for _ in range(model_router.DEGRADED_CONSECUTIVE_FAILURES):
+        router.record("fast", 1.0, ok=False)
+
+    assert router.candidates("quiz") == ["backup", "fast"]
+    assert router.summary()["fast"]["degraded"] is True
+
+def test_slow_model_is_degraded(registry):
+    router = ModelRouter(routes=ROUTES)
+    for _ in range(model_router.DEGRADED_MIN_SAMPLES):
+        router.record("fast", model_router.DEGRADED_P95_SECONDS + 1, ok=True)
+
+    assert router.candidates("quiz")[0] == "backup"
+
+@pytest.mark.asyncio
+async def test_fails_over_to_next_model(registry):
+    registry.models = {"fast": NamedStubModel("fast", error="500 internal"), "backup": NamedStubModel("backup")}
+    model = RoutedModel("quiz", ModelRouter(routes=ROUTES))
+
+    response = await ai_service.generate_content_with_retry(model, "hello")
+
+    assert response.text == "backup"
+    assert model.router.summary()["fast"]["error_rate"] == 1.0
+
+@pytest.mark.asyncio
+async def test_hedged_request_takes_the_first_answer(registry):
+    slow = NamedStubModel("fast", delay=5)
+    registry.models = {"fast": slow, "backup": NamedStubModel("backup")}
+    model = RoutedModel("quiz", ModelRouter(routes=ROUTES, hedging=True, hedge_after=0.05))
+
+    response = await asyncio.wait_for(ai_service.generate_content_with_retry(model, "hello"), 1)
+
+    assert response.text == "backup"
+    assert slow.calls == 1
+    # The cancelled loser is not counted against the slow model
+    assert model.router.summary()["fast"]["calls"] == 0
+
+@pytest.mark.asyncio
+async def test_no_hedge_when_primary_is_fast(registry):
+    backup = NamedStubModel("backup")
+    registry.models = {"fast": NamedStubModel("fast"), "backup": backup}
+    model = RoutedModel("quiz", ModelRouter(routes=ROUTES, hedging=True, hedge_after=0.5))
+
+    response = await ai_service.generate_content_with_retry(model, "hello")
+
+    assert response.text == "fast"
+    assert backup.calls == 0
+
+@pytest.mark.asyncio
+async def test_local_queueing_is_not_timed_or_hedged(registry):
+    backup = NamedStubModel("backup")
+    registry.models = {"fast": NamedStubModel("fast", delay=0.05), "backup": backup}
+    model = RoutedModel("quiz", ModelRouter(routes=ROUTES, hedging=True, hedge_after=0.1))
+
+    # Every generation slot is taken for a while before the call can go out
+    with patch.object(ai_service, "generation_slot", side_effect=lambda: DelayedSlot(0.3)):
+        response = await ai_service.generate_content_with_retry(model, "hello")
+
+    assert response.text == "fast"
+    assert backup.calls == 0
+    assert model.router.summary()["fast"]["p95"] < 0.3
+
+@pytest.mark.asyncio
+async def test_stream_fails_over_before_first_chunk(registry):
+    failing = MagicMock()
+    failing.model_name = "chat-model"
+    failing.generate_content.side_effect = RuntimeError("503 unavailable")
+    working = MagicMock()
+    working.model_name = "fast"
+    working.generate_content.return_value = iter([SimpleNamespace(text="Hel"), SimpleNamespace(text="lo")])
+    registry.models = {"chat-model": failing, "fast": working}
+    model = RoutedModel("chat", ModelRouter(routes=ROUTES))
+
+    chunks = [text async for text in ai_service.stream_content_with_retry(model, "hi")]
+
+    assert chunks == ["Hel", "lo"]
+    assert model.router.summary()["chat-model"]["error_rate"] == 1.0
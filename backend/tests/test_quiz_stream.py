@@ -0,0 +1,53 @@
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.json_stream import JsonArrayStreamParser
+from app.services.response_cache import ResponseCache
+
+QUIZ = [
+    {"id": 1, "type": "true_false", "question": "Is ATP \"energy\"? [yes]", "options": ["True", "False"], "correct_answer": "True", "explanation": "It {is}."},
+    {"id": 2, "type": "multiple_choice", "question": "Organelle?", "options": ["Nucleus", "Mitochondria"], "correct_answer": "Mitochondria", "explanation": "Powerhouse."},
+]
+
+def test_parser_emits_elements_as_they_complete():
+    payload = json.dumps(QUIZ, indent=2)
+    parser = JsonArrayStreamParser()
+    emitted = []
+
+    for i in range(0, len(payload), 7):
+        emitted.extend(parser.feed(payload[i:i + 7]))
+
+    assert emitted == QUIZ
+
+def test_parser_returns_first_object_before_array_ends():
+    parser = JsonArrayStreamParser()
+    assert parser.feed('[{"front": "A", "back": "B"}, {"front": "C"') == [{"front": "A", "back": "B"}]
+    assert parser.feed(', "back": "D"}]') == [{"front": "C", "back": "D"}]
+
+@pytest.fixture
+def mock_gemini_stream():
+    with patch('app.services.ai_service.get_model') as mock_get_model, \
+         patch('app.services.ai_service.get_response_cache', return_value=ResponseCache(None)):
+        mock_instance = MagicMock()
+        mock_get_model.return_value = mock_instance
+        yield mock_instance
+
+def test_quiz_stream_endpoint_emits_validated_questions(mock_gemini_stream, parse_events, make_chunk):
+    payload = json.dumps(QUIZ + [{"id": 3, "question": "missing fields"}])
+    mock_gemini_stream.generate_content.return_value = iter([make_chunk(payload[i:i + 20]) for i in range(0, len(payload), 20)])
+
+    client = TestClient(app)
+    response = client.post("/ai/quiz/stream", json={"text": "Cells", "num_questions": 2})
+
+    events = parse_events(response.text)
+    assert events == [("message", QUIZ[0]), ("message", QUIZ[1]), ("done", {})]
+
+def test_flashcards_stream_endpoint(mock_gemini_stream, parse_events, make_chunk):
+    mock_gemini_stream.generate_content.return_value = iter([make_chunk('[{"front": "ATP", '), make_chunk('"back": "Energy"}]')])
+
+    client = TestClient(app)
+    response = client.post("/ai/flashcards/stream", json={"text": "Cells", "num_cards": 1})
+
+    assert parse_events(response.text) == [("message", {"front": "ATP", "back": "Energy"}), ("done", {})]
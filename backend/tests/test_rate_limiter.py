@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+from app.services import rate_limiter
+from app.services.rate_limiter import ModelLimiter, TokenBucket
+
+@pytest.mark.asyncio
+async def test_window_halves_on_429_and_grows_on_success():
+    limiter = ModelLimiter(rpm=0, tpm=0, initial=16, maximum=32)
+
+    with pytest.raises(RuntimeError):
+        async with limiter.slot(10):
+            raise RuntimeError("429 Resource has been exhausted")
+    assert limiter.window == 8
+
+    for _ in range(50):
+        async with limiter.slot(10):
+            pass
+    assert limiter.window > 8
+    assert limiter.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_one_burst_of_429s_shrinks_window_once():
+    limiter = ModelLimiter(rpm=0, tpm=0, initial=16)
+
+    for _ in range(5):
+        limiter.on_rate_limited()
+
+    assert limiter.window == 8
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_round_robin_across_tenants():
+    limiter = ModelLimiter(rpm=0, tpm=0, initial=1, maximum=1)
+    order = []
+
+    async def call(tenant, i):
+        async with limiter.slot(1, tenant=tenant):
+            order.append(tenant)
+            await asyncio.sleep(0)
+
+    blocker = limiter.slot(1, tenant="blocker")
+    await blocker.__aenter__()
+    tasks = [asyncio.ensure_future(call("bulk", i)) for i in range(4)]
+    tasks.append(asyncio.ensure_future(call("chat", 0)))
+    await asyncio.sleep(0)
+    await blocker.__aexit__(None, None, None)
+    await asyncio.gather(*tasks)
+
+    assert order[:2] == ["bulk", "chat"]
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    limiter = ModelLimiter(rpm=0, tpm=0, initial=1, maximum=1)
+    holder = limiter.slot(1, tenant="a")
+    await holder.__aenter__()
+
+    waiter = asyncio.ensure_future(limiter.slot(1, tenant="b").__aenter__())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    await holder.__aexit__(None, None, None)
+
+    assert limiter.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_for_refill(monkeypatch):
+    bucket = TokenBucket(per_minute=600, burst_seconds=1)
+    slept = []
+
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+        bucket.tokens = bucket.capacity
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", fake_sleep)
+    await bucket.take(10)
+    await bucket.take(5)
+
+    assert len(slept) == 1
+    assert slept[0] == pytest.approx(0.5, abs=0.05)
+
+@pytest.mark.asyncio
+async def test_per_model_limits_are_configurable(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "MODEL_LIMITS", {"gemini-1.5-pro": {"rpm": 60, "tpm": 6000}})
+
+    limiter = rate_limiter.get_rate_limiter("models/gemini-1.5-pro")
+
+    assert limiter.requests.rate == pytest.approx(1.0)
+    assert limiter.tokens.rate == pytest.approx(100.0)
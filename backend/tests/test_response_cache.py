@@ -0,0 +1,94 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services.ai_service import analyze_text, generate_quiz
+from app.services.response_cache import MemoryCacheBackend, SQLiteCacheBackend, ResponseCache, make_cache_key
+
+def test_cache_key_ignores_prompt_whitespace():
+    config = {"response_mime_type": "application/json"}
+    a = make_cache_key("gemini-1.5-flash", "Analyze\n    this text", config, "en")
+    b = make_cache_key("gemini-1.5-flash", "Analyze this   text", config, "en")
+    c = make_cache_key("gemini-1.5-flash", "Analyze this text", config, "fr")
+
+    assert a == b
+    assert a != c
+
+def test_memory_backend_evicts_least_recently_used_by_size():
+    backend = MemoryCacheBackend(max_bytes=30)
+    backend.set("a", "x" * 10, ttl=60)
+    backend.set("b", "y" * 10, ttl=60)
+    backend.get("a")
+    backend.set("c", "z" * 10, ttl=60)
+
+    assert backend.get("a") == "x" * 10
+    assert backend.get("b") is None
+    assert backend.size <= 30
+
+def test_memory_backend_expires_entries():
+    backend = MemoryCacheBackend()
+    backend.set("a", "value", ttl=-1)
+    assert backend.get("a") is None
+
+def test_sqlite_backend_survives_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteCacheBackend(path).set("key", "cached answer", ttl=60)
+
+    assert SQLiteCacheBackend(path).get("key") == "cached answer"
+
+def test_sqlite_backend_evicts_least_recently_used_by_size(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_bytes=30)
+    backend.set("a", "x" * 10, ttl=60)
+    backend.set("b", "y" * 10, ttl=60)
+    backend.get("a")
+    backend.set("c", "z" * 10, ttl=60)
+
+    assert backend.get("a") == "x" * 10
+    assert backend.get("b") is None
+    assert backend.get("c") == "z" * 10
+
+def test_sqlite_backend_purges_expired_rows(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), purge_seconds=0)
+    backend.set("stale", "value", ttl=-1)
+    backend.set("fresh", "value", ttl=60)
+
+    keys = [row[0] for row in backend._conn.execute("SELECT key FROM responses")]
+    assert keys == ["fresh"]
+
+@pytest.mark.asyncio
+async def test_analyze_text_hits_cache_on_repeat():
+    cache = ResponseCache(MemoryCacheBackend())
+    mock_model = MagicMock()
+    mock_model.model_name = "models/gemini-1.5-flash"
+    mock_response = MagicMock()
+    mock_response.text = '{"summary": "S", "key_concepts": [], "difficulty": "Beginner", "estimated_study_time": "1 hour"}'
+    mock_model.generate_content.return_value = mock_response
+
+    with patch('app.services.ai_service.get_model', return_value=mock_model), \
+         patch('app.services.ai_service.get_response_cache', return_value=cache):
+        first = await analyze_text("Cell biology", language="en")
+        second = await analyze_text("Cell biology", language="en")
+
+    assert first == second
+    assert mock_model.generate_content.call_count == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_answer_failing_its_schema_is_not_cached():
+    cache = ResponseCache(MemoryCacheBackend())
+    mock_model = MagicMock()
+    mock_model.model_name = "models/gemini-1.5-flash"
+    # An object where the quiz array belongs, then a valid quiz
+    mock_model.generate_content.side_effect = [
+        MagicMock(text='{"question": "What do mitochondria produce?"}'),
+        MagicMock(text='[{"id": 1, "type": "true_false", "question": "Q", "options": ["True", "False"], "correct_answer": "True", "explanation": "E"}]'),
+    ]
+
+    with patch('app.services.ai_service.get_model', return_value=mock_model), \
+         patch('app.services.ai_service.get_response_cache', return_value=cache):
+        first = await generate_quiz("Cell biology", num_questions=1)
+        second = await generate_quiz("Cell biology", num_questions=1)
+
+    assert isinstance(first, dict)
+    assert second[0]["question"] == "Q"
+    assert mock_model.generate_content.call_count == 2
+    assert cache.stats()["hits"] == 0
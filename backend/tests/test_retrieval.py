@@ -0,0 +1,63 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services.ai_service import chat_with_document
+from app.services import retrieval_service
+from app.services.retrieval_service import build_index, chunk_text, select_context
+
+def make_textbook():
+    filler = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 30
+    sections = [f"Chapter {i}. {filler}" for i in range(60)]
+    sections[42] = "Chapter 42. The mitochondria is the powerhouse of the cell and produces ATP. " + filler
+    return "\n\n".join(sections)
+
+def test_chunks_cover_text_within_size():
+    text = make_textbook()
+    chunks = chunk_text(text, chunk_chars=1000, overlap=100)
+
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert "powerhouse" in "".join(chunks)
+
+def test_index_ranks_relevant_chunk_first():
+    index = build_index(make_textbook())
+    best = index.search("What does the mitochondria produce?", k=1)
+
+    assert "mitochondria" in index.chunks[best[0]]
+
+def test_small_context_is_sent_whole():
+    assert select_context("Short course notes.", "Question?") == "Short course notes."
+
+def test_large_context_is_reduced_to_relevant_chunks():
+    text = make_textbook()
+    context = select_context(text, "What produces ATP?", k=3)
+
+    assert "powerhouse of the cell" in context
+    assert len(context) < len(text) // 10
+
+@pytest.mark.asyncio
+async def test_chat_prompt_uses_retrieved_context():
+    text = make_textbook()
+    with patch('app.services.ai_service.get_model') as mock_get_model:
+        mock_model = MagicMock()
+        mock_get_model.return_value = mock_model
+        mock_model.generate_content.return_value.text = "ATP"
+
+        await chat_with_document(text, "What produces ATP?", [], "en", index=build_index(text))
+
+    prompt = mock_model.generate_content.call_args[0][0]
+    assert "powerhouse of the cell" in prompt
+    assert len(prompt) < len(text) // 10
+
+@pytest.mark.asyncio
+async def test_inline_context_index_is_built_once_per_text():
+    text = make_textbook()
+    with patch('app.services.ai_service.get_model') as mock_get_model, \
+         patch.object(retrieval_service, "build_index", wraps=build_index) as builds:
+        mock_model = MagicMock()
+        mock_get_model.return_value = mock_model
+        mock_model.generate_content.return_value.text = "ATP"
+
+        await chat_with_document(text, "What produces ATP?", [], "en")
+        await chat_with_document(text, "And what is ATP for?", [], "en")
+
+    assert builds.call_count == 1
+    assert "powerhouse of the cell" in mock_model.generate_content.call_args_list[0][0][0]
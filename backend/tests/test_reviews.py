@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routers import reviews
+from app.services.review_service import DAY_SECONDS, ReviewEngine, SqliteReviewStore, sm2
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+class FlakyStore(SqliteReviewStore):
+    def __init__(self, path):
+        super().__init__(path)
+        self.saves = []
+        self.fail = False
+
+    def save(self, rows):
+        if self.fail:
+            raise RuntimeError("store down")
+        self.saves.append(len(rows))
+        super().save(rows)
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def store(tmp_path):
+    return FlakyStore(str(tmp_path / "reviews.sqlite3"))
+
+def test_sm2_intervals_expand_and_lapses_reset():
+    interval, ease, reps, lapsed = sm2("good", 0, 2.5, 0)
+    assert (interval, reps, lapsed) == (1, 1, False)
+    interval, ease, reps, _ = sm2("good", interval, ease, reps)
+    assert interval == 6
+    interval, ease, reps, _ = sm2("easy", interval, ease, reps)
+    assert interval > 6
+
+    interval, ease_after, reps, lapsed = sm2("again", interval, ease, reps)
+    assert (interval, reps, lapsed) == (0, 0, True)
+    assert ease_after < ease
+
+def test_due_cards_come_most_overdue_first(store, clock):
+    engine = ReviewEngine(store, clock=clock)
+    ids = engine.add_cards("u1", [(f"Q{i}", f"A{i}") for i in range(5)])
+
+    engine.review("u1", ids[0], "good")
+    clock.now += 60
+    due = [card["card_id"] for card in engine.due_cards("u1", limit=10)]
+
+    assert due == ids[1:]
+    assert engine.next_due("u1") == 1_000_000.0
+    clock.now += DAY_SECONDS
+    assert engine.due_cards("u1", limit=10)[-1]["card_id"] == ids[0]
+
+def test_adding_a_card_again_keeps_its_schedule(store, clock):
+    engine = ReviewEngine(store, clock=clock)
+    [card_id] = engine.add_cards("u1", [("ATP", "Energy")])
+    engine.review("u1", card_id, "good")
+
+    assert engine.add_cards("u1", [("ATP", "Energy")]) == [card_id]
+    assert engine.due_cards("u1") == []
+
+def test_changes_are_saved_in_batches_and_reloaded(store, clock):
+    engine = ReviewEngine(store, flush_batch=10, flush_seconds=3600, clock=clock)
+    ids = engine.add_cards("u1", [(f"Q{i}", f"A{i}") for i in range(25)])
+    engine.review("u1", ids[0], "easy")
+    engine.flush()
+
+    # The reviewed card was already saved with the first batch, so it is written again
+    assert store.saves == [10, 10, 6]
+
+    reloaded = ReviewEngine(store, clock=clock)
+    clock.now += 60
+    assert len(reloaded.due_cards("u1", limit=100)) == 24
+    assert reloaded.review("u1", ids[0], "good")["reps"] == 2
+
+def test_failed_writes_are_kept_for_the_next_flush(store, clock):
+    engine = ReviewEngine(store, flush_batch=1, clock=clock)
+    store.fail = True
+    [card_id] = engine.add_cards("u1", [("ATP", "Energy")])
+    assert engine.review("u1", card_id, "good")["reps"] == 1
+
+    store.fail = False
+    engine.flush()
+
+    assert ReviewEngine(store, clock=clock).review("u1", card_id, "good")["interval_days"] == 6
+
+@pytest.mark.asyncio
+async def test_a_lone_change_is_saved_by_the_background_task(store, clock):
+    engine = ReviewEngine(store, flush_batch=100, flush_seconds=0.05, clock=clock)
+    engine.add_cards("u1", [("ATP", "Energy")])
+    assert store.saves == []
+
+    engine.start()
+    try:
+        await asyncio.sleep(0.2)
+        assert store.saves == [1]
+    finally:
+        await engine.stop()
+
+def test_least_recently_used_decks_are_saved_before_they_are_dropped(store, clock):
+    engine = ReviewEngine(store, flush_batch=100, flush_seconds=3600, max_users=1, clock=clock)
+    engine.add_cards("u1", [("ATP", "Energy")])
+    engine.add_cards("u2", [("DNA", "Genes")])
+
+    assert store.saves == [1]
+    assert len(engine.due_cards("u1")) == 1
+
+def test_review_endpoints(store, clock, monkeypatch):
+    monkeypatch.setattr(reviews, "get_review_engine", lambda: engine)
+    engine = ReviewEngine(store, clock=clock)
+    client = TestClient(app)
+    headers = {"X-User-Id": "student-1"}
+
+    added = client.post("/reviews/cards", json={"cards": [{"front": "ATP", "back": "Energy"}]}, headers=headers)
+    card_id = added.json()["card_ids"][0]
+    due = client.get("/reviews/due", headers=headers).json()
+    reviewed = client.post(f"/reviews/cards/{card_id}", json={"rating": "good"}, headers=headers)
+
+    assert due["cards"][0]["front"] == "ATP"
+    assert reviewed.json()["interval_days"] == 1
+    assert client.post("/reviews/cards/unknown", json={"rating": "good"}, headers=headers).status_code == 404
+    assert client.get("/reviews/due").status_code == 422
@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services.ai_service import analyze_text
+from app.services.response_cache import ResponseCache
+from app.services.single_flight import SingleFlight
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "done"
+
+    results = await asyncio.gather(*[flight.do("key", work) for _ in range(80)])
+
+    assert results == ["done"] * 80
+    assert calls == 1
+    assert len(flight) == 0
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_every_waiter():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("429 Resource exhausted")
+
+    results = await asyncio.gather(*[flight.do("key", work) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_shared_call():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return "answer"
+
+    leaving = asyncio.ensure_future(flight.do("key", work))
+    staying = asyncio.ensure_future(flight.do("key", work))
+    await asyncio.sleep(0)
+
+    leaving.cancel()
+    release.set()
+
+    assert await staying == "answer"
+    with pytest.raises(asyncio.CancelledError):
+        await leaving
+
+@pytest.mark.asyncio
+async def test_shared_call_is_cancelled_when_every_waiter_leaves():
+    flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiters = [asyncio.ensure_future(flight.do("key", work)) for _ in range(2)]
+    await asyncio.sleep(0)
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    assert len(flight) == 0
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_analyses_call_gemini_once():
+    mock_model = MagicMock()
+    mock_model.model_name = "models/gemini-1.5-flash"
+    mock_response = MagicMock()
+    mock_response.text = '{"summary": "S", "key_concepts": [], "difficulty": "Beginner", "estimated_study_time": "1 hour"}'
+    mock_model.generate_content.return_value = mock_response
+
+    with patch('app.services.ai_service.get_model', return_value=mock_model), \
+         patch('app.services.ai_service.get_response_cache', return_value=ResponseCache(None)):
+        results = await asyncio.gather(*[analyze_text("Shared lecture", language="en") for _ in range(20)])
+
+    assert len(results) == 20
+    assert mock_model.generate_content.call_count == 1
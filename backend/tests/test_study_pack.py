@@ -0,0 +1,111 @@
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import ai_service
+from app.services.response_cache import MemoryCacheBackend, ResponseCache
+
+ANALYSIS = {"summary": "Cells", "key_concepts": ["ATP"], "difficulty": "Beginner", "estimated_study_time": "1 hour"}
+QUIZ = [{"id": 1, "type": "true_false", "question": "ATP?", "options": ["True", "False"], "correct_answer": "True", "explanation": "Yes."}]
+FLASHCARDS = [{"front": "ATP", "back": "Energy"}]
+
+def answer_for(prompt):
+    if "single JSON object" in prompt:
+        return json.dumps({"analysis": ANALYSIS, "quiz": QUIZ, "flashcards": FLASHCARDS})
+    if "Analyze the following" in prompt:
+        return json.dumps(ANALYSIS)
+    if "Generate a quiz" in prompt:
+        return json.dumps(QUIZ)
+    return json.dumps(FLASHCARDS)
+
+@pytest.fixture
+def mock_gemini():
+    model = MagicMock()
+    model.model_name = "models/gemini-1.5-flash"
+
+    def generate_content(prompt, generation_config=None):
+        response = MagicMock()
+        response.text = answer_for(prompt)
+        return response
+
+    model.generate_content.side_effect = generate_content
+    cache = ResponseCache(MemoryCacheBackend(), ttl=60)
+    with patch.object(ai_service, "get_model", return_value=model), \
+         patch.object(ai_service, "get_response_cache", return_value=cache):
+        yield model
+
+def test_short_document_runs_artifacts_in_parallel(mock_gemini):
+    client = TestClient(app)
+    response = client.post("/ai/study-pack", json={"text": "Cells make ATP."})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["analysis"] == ANALYSIS
+    assert data["quiz"] == QUIZ
+    assert data["flashcards"] == FLASHCARDS
+    assert data["errors"] == {}
+    assert mock_gemini.generate_content.call_count == 3
+
+def test_mid_sized_document_uses_one_combined_call(mock_gemini):
+    text = "Cells make ATP. " * (ai_service.STUDY_PACK_COMBINED_MIN_CHARS // 16 + 1)
+    client = TestClient(app)
+
+    data = client.post("/ai/study-pack", json={"text": text}).json()
+
+    assert data["quiz"] == QUIZ
+    assert mock_gemini.generate_content.call_count == 1
+
+    # The single endpoints reuse what the combined call produced
+    assert client.post("/ai/quiz", json={"text": text}).json() == {"questions": QUIZ}
+    assert mock_gemini.generate_content.call_count == 1
+
+def test_invalid_combined_artifact_is_not_cached(mock_gemini):
+    def generate_content(prompt, generation_config=None):
+        response = MagicMock()
+        if "single JSON object" in prompt:
+            # Quiz questions without their fields
+            response.text = json.dumps({"analysis": ANALYSIS, "quiz": [{"question": "ATP?"}], "flashcards": FLASHCARDS})
+        else:
+            response.text = answer_for(prompt)
+        return response
+
+    mock_gemini.generate_content.side_effect = generate_content
+    text = "Cells make ATP. " * (ai_service.STUDY_PACK_COMBINED_MIN_CHARS // 16 + 1)
+    client = TestClient(app)
+
+    data = client.post("/ai/study-pack", json={"text": text}).json()
+
+    # The quiz was generated again on its own, and /quiz is not served the bad one
+    assert data["quiz"] == QUIZ
+    assert mock_gemini.generate_content.call_count == 2
+    assert client.post("/ai/quiz", json={"text": text}).json() == {"questions": QUIZ}
+    assert client.post("/ai/flashcards", json={"text": text}).json() == {"flashcards": FLASHCARDS}
+    assert mock_gemini.generate_content.call_count == 2
+
+def test_failed_artifact_does_not_fail_the_pack(mock_gemini):
+    def generate_content(prompt, generation_config=None):
+        if "Generate a quiz" in prompt:
+            raise RuntimeError("500 internal")
+        response = MagicMock()
+        response.text = answer_for(prompt)
+        return response
+
+    mock_gemini.generate_content.side_effect = generate_content
+    client = TestClient(app)
+
+    data = client.post("/ai/study-pack", json={"text": "Cells", "artifacts": ["quiz", "flashcards"]}).json()
+
+    assert data["flashcards"] == FLASHCARDS
+    assert data["quiz"] is None
+    assert "500 internal" in data["errors"]["quiz"]
+
+def test_stream_sends_each_artifact_as_it_completes(mock_gemini, parse_events):
+    client = TestClient(app)
+    response = client.post("/ai/study-pack/stream", json={"text": "Cells", "artifacts": ["analysis", "flashcards"]})
+
+    events = dict(parse_events(response.text))
+    assert events["analysis"] == ANALYSIS
+    assert events["flashcards"] == FLASHCARDS
+    assert "quiz" not in events
+    assert parse_events(response.text)[-1] == ("done", {})
@@ -0,0 +1,68 @@
+import time
+from collections import defaultdict
+from datetime import date
+
+import pytest
+
+from app.services.study_planner import build_schedule, format_duration
+
+START = date(2024, 1, 1)
+
+def _minutes(duration: str) -> int:
+    if duration.endswith(" min"):
+        return int(duration[:-4])
+    hours, _, rest = duration.partition("h")
+    return int(hours) * 60 + int(rest or 0)
+
+def test_format_duration():
+    assert format_duration(30) == "30 min"
+    assert format_duration(60) == "1h"
+    assert format_duration(90) == "1h30"
+
+def test_every_topic_is_learned_then_reviewed_at_expanding_intervals():
+    plan = build_schedule(["A", "B", "C"], "2024-02-15", 2, start=START)
+
+    sessions = [session for session in plan if session["topic"] == "A"]
+    assert sessions[0]["activity"] == "Read"
+    days = [date.fromisoformat(session["date"]) for session in sessions]
+    gaps = [(later - earlier).days for earlier, later in zip(days, days[1:])]
+    assert len(gaps) >= 3
+    assert gaps[:3] == sorted(gaps[:3])
+    assert {session["topic"] for session in plan if session["activity"] == "Read"} == {"A", "B", "C"}
+
+def test_plan_stays_before_the_exam_and_within_the_daily_budget():
+    topics = [f"Topic {i}" for i in range(150)]
+
+    started = time.perf_counter()
+    plan = build_schedule(topics, "2024-05-01", 3, start=START)
+    elapsed = time.perf_counter() - started
+
+    per_day = defaultdict(int)
+    for session in plan:
+        assert START.isoformat() <= session["date"] < "2024-05-01"
+        per_day[session["date"]] += _minutes(session["duration"])
+    assert max(per_day.values()) <= 180
+    assert {session["topic"] for session in plan} == set(topics)
+    assert elapsed < 0.5
+
+def test_tight_calendar_shortens_first_passes_instead_of_overflowing():
+    plan = build_schedule([f"T{i}" for i in range(12)], "2024-01-04", 1, start=START)
+
+    per_day = defaultdict(int)
+    for session in plan:
+        per_day[session["date"]] += _minutes(session["duration"])
+    assert max(per_day.values()) <= 60
+    assert len({session["topic"] for session in plan}) == 12
+
+def test_topics_that_do_not_fit_are_rejected_not_dropped():
+    with pytest.raises(ValueError, match="Only 20 of 100 topics"):
+        build_schedule([f"T{i}" for i in range(100)], "2024-01-06", 1, start=START)
+
+def test_same_request_gives_the_same_plan():
+    args = (["Cells", "Genetics", "Cells"], "2024-03-01", 2)
+
+    assert build_schedule(*args, start=START) == build_schedule(*args, start=START)
+
+def test_exam_in_the_past_is_rejected():
+    with pytest.raises(ValueError):
+        build_schedule(["Cells"], "2023-12-31", 2, start=START)
@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+from app.services import db_service, xp_writer
+from app.services.xp_writer import XpWriter
+
+class FakePostgrest:
+    """
+    Enough of PostgREST's upsert endpoint: merges posted rows into a table by
+    user_id, and can be told to fail the next requests.
+    """
+
+    def __init__(self):
+        self.table = {}
+        self.requests = []
+        self.fail_with = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/rest/v1/profiles"
+        assert request.url.params["on_conflict"] == "user_id"
+        assert "resolution=merge-duplicates" in request.headers["prefer"]
+        assert request.headers["apikey"] == "key"
+        rows = json.loads(request.content)
+        self.requests.append(rows)
+        if self.fail_with:
+            return httpx.Response(self.fail_with.pop(0), text="nope")
+        for row in rows:
+            self.table[row["user_id"]] = row
+        return httpx.Response(201)
+
+@pytest.fixture
+def postgrest():
+    return FakePostgrest()
+
+def make_writer(postgrest, **kwargs):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(postgrest.handler))
+    return XpWriter("http://supabase.test", "key", client=client, **kwargs)
+
+@pytest.mark.asyncio
+async def test_updates_are_coalesced_per_user_into_one_upsert(postgrest):
+    writer = make_writer(postgrest)
+    for event in range(1000):
+        writer.record(f"user-{event % 10}", xp=event, level=event // 100)
+
+    assert await writer.flush()
+
+    assert len(postgrest.requests) == 1
+    assert len(postgrest.requests[0]) == 10
+    assert postgrest.table["user-9"] == {"user_id": "user-9", "xp": 999, "level": 9}
+
+@pytest.mark.asyncio
+async def test_large_flushes_are_split_into_batches(postgrest):
+    writer = make_writer(postgrest, batch_size=4)
+    for user in range(10):
+        writer.record(f"user-{user}", xp=user, level=1)
+
+    await writer.flush()
+
+    assert [len(rows) for rows in postgrest.requests] == [4, 4, 2]
+
+@pytest.mark.asyncio
+async def test_failed_writes_are_retried_without_losing_newer_updates(postgrest):
+    writer = make_writer(postgrest)
+    postgrest.fail_with = [503]
+    writer.record("user-1", xp=10, level=1)
+    writer.record("user-2", xp=20, level=1)
+
+    assert not await writer.flush()
+    writer.record("user-1", xp=15, level=2)
+    assert await writer.flush()
+
+    assert postgrest.table["user-1"]["xp"] == 15
+    assert postgrest.table["user-2"]["xp"] == 20
+
+@pytest.mark.asyncio
+async def test_rejected_rows_are_dropped_not_retried(postgrest):
+    writer = make_writer(postgrest)
+    postgrest.fail_with = [400]
+    writer.record("user-1", xp=10, level=1)
+
+    assert await writer.flush()
+
+    assert writer.pending == 0
+    assert writer.dropped == 1
+
+def test_pending_updates_are_bounded(postgrest):
+    writer = make_writer(postgrest, max_pending=3)
+    for user in range(5):
+        writer.record(f"user-{user}", xp=user, level=1)
+
+    assert writer.pending == 3
+    assert writer.dropped == 2
+
+def test_retried_rows_are_dropped_before_newer_updates(postgrest):
+    writer = make_writer(postgrest, max_pending=2)
+    writer.record("user-3", xp=30, level=1)
+    writer.record("user-4", xp=40, level=1)
+
+    # Rows from a failed write come back while the buffer is full
+    writer._requeue([{"user_id": "user-1", "xp": 10, "level": 1}, {"user_id": "user-2", "xp": 20, "level": 1}])
+
+    assert list(writer._pending) == ["user-3", "user-4"]
+    assert writer.dropped == 2
+
+@pytest.mark.asyncio
+async def test_background_task_flushes_and_stop_writes_the_rest(postgrest):
+    writer = make_writer(postgrest, flush_seconds=0.01)
+    writer.start()
+    writer.record("user-1", xp=10, level=1)
+    await asyncio.sleep(0.1)
+    assert postgrest.table["user-1"]["xp"] == 10
+
+    writer.flush_seconds = 3600
+    writer.record("user-1", xp=30, level=2)
+    await asyncio.sleep(0.05)
+    await writer.stop()
+
+    assert postgrest.table["user-1"]["xp"] == 30
+
+@pytest.mark.asyncio
+async def test_a_full_batch_is_written_without_waiting(postgrest):
+    writer = make_writer(postgrest, flush_seconds=3600, batch_size=2)
+    writer.start()
+    writer.record("user-1", xp=1, level=1)
+    writer.record("user-2", xp=2, level=1)
+    await asyncio.sleep(0.05)
+
+    assert len(postgrest.table) == 2
+    await writer.stop()
+
+def test_save_xp_only_queues(postgrest):
+    writer = make_writer(postgrest)
+    with patch.object(xp_writer, "_xp_writer", writer):
+        db_service.save_xp("user-1", 120, 3)
+
+    assert writer.pending == 1
+    assert postgrest.requests == []
@@ -18,12 +18,12 @@ jest.mock('@/lib/api', () => ({
 window.HTMLElement.prototype.scrollIntoView = jest.fn();
 
 describe('ChatInterface', () => {
-  const mockContext = "Course content...";
+  const mockDocumentId = "3f1c9a";
 
   it('renders input and send button', () => {
     render(
       <NextIntlClientProvider locale="en" messages={{}}>
-        <ChatInterface context={mockContext} />
+        <ChatInterface documentId={mockDocumentId} />
       </NextIntlClientProvider>
     );
     
@@ -34,7 +34,7 @@ describe('ChatInterface', () => {
   it('sends a message and displays response', async () => {
     render(
       <NextIntlClientProvider locale="en" messages={{}}>
-        <ChatInterface context={mockContext} />
+        <ChatInterface documentId={mockDocumentId} />
       </NextIntlClientProvider>
     );
     
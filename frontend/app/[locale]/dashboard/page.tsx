@@ -1,13 +1,13 @@
 "use client";
 
-import { useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import { FileUpload } from "@/components/file-upload";
 import { AnalysisView } from "@/components/analysis-view";
 import { QuizView } from "@/components/quiz-view";
 import { ChatInterface } from "@/components/chat-interface";
 import { PlanningView } from "@/components/planning-view";
 import { FlashcardView } from "@/components/flashcard-view";
-import { analyzeContent, generateQuiz, generateFlashcards } from "@/lib/api";
+import { analyzeContent, generateQuiz, generateFlashcards, streamStudyPack } from "@/lib/api";
 import { Loader2, Sparkles } from "lucide-react";
 import { useTranslations, useLocale } from "next-intl";
 import { ThemeToggle } from "@/components/theme-toggle";
@@ -23,7 +23,7 @@ export default function Home() {
   
   const [step, setStep] = useState<"upload" | "analyzing" | "dashboard">("upload");
   const [analysisData, setAnalysisData] = useState<any>(null);
-  const [extractedText, setExtractedText] = useState<string>("");
+  const [documentId, setDocumentId] = useState<string>("");
   
   const [quizData, setQuizData] = useState<any>(null);
   const [loadingQuiz, setLoadingQuiz] = useState(false);
@@ -31,42 +31,102 @@ export default function Home() {
   const [flashcardsData, setFlashcardsData] = useState<any>(null);
   const [loadingFlashcards, setLoadingFlashcards] = useState(false);
 
+  // Quiz and flashcards of the current upload are still on their way
+  const [packPending, setPackPending] = useState(false);
+  const activeTab = useRef("analysis");
+  // Aborts every request for the current document on reset or a new upload
+  const requests = useRef<AbortController | null>(null);
+
+  useEffect(() => () => requests.current?.abort(), []);
+
+  const loadQuiz = async (docId: string, signal: AbortSignal) => {
+    setLoadingQuiz(true);
+    try {
+        const quiz = await generateQuiz(docId, locale, signal);
+        if (!signal.aborted) setQuizData(quiz);
+    } catch (error) {
+        if (!signal.aborted) console.error("Quiz generation error", error);
+    } finally {
+        if (!signal.aborted) setLoadingQuiz(false);
+    }
+  };
+
+  const loadFlashcards = async (docId: string, signal: AbortSignal) => {
+    setLoadingFlashcards(true);
+    try {
+        const data = await generateFlashcards(docId, 10, locale, signal);
+        if (!signal.aborted) setFlashcardsData(data.flashcards);
+    } catch (error) {
+        if (!signal.aborted) console.error("Flashcards error", error);
+    } finally {
+        if (!signal.aborted) setLoadingFlashcards(false);
+    }
+  };
+
+  const streamPack = async (docId: string, signal: AbortSignal) => {
+    let quizReceived = false;
+    let flashcardsReceived = false;
+    setPackPending(true);
+    try {
+        // Quiz and flashcards come from one generation; opening their tabs
+        // meanwhile shows the loading state instead of asking again
+        await streamStudyPack(docId, locale, (artifact, payload) => {
+            if (signal.aborted) return;
+            if (artifact === "quiz") {
+                quizReceived = true;
+                setQuizData({ questions: payload });
+            } else if (artifact === "flashcards") {
+                flashcardsReceived = true;
+                setFlashcardsData(payload);
+            }
+        }, ["quiz", "flashcards"], signal);
+    } catch (error) {
+        if (!signal.aborted) console.error("Study pack error", error);
+    }
+    if (signal.aborted) return;
+    setPackPending(false);
+    // Whatever the pack did not deliver is generated separately, once its tab is open
+    if (activeTab.current === "quiz" && !quizReceived) loadQuiz(docId, signal);
+    if (activeTab.current === "flashcards" && !flashcardsReceived) loadFlashcards(docId, signal);
+  };
+
   const handleUploadSuccess = async (data: any) => {
-    setExtractedText(data.extracted_text);
+    requests.current?.abort();
+    const controller = new AbortController();
+    requests.current = controller;
+    const { signal } = controller;
+
+    activeTab.current = "analysis";
+    setDocumentId(data.document_id);
+    setQuizData(null);
+    setFlashcardsData(null);
     setStep("analyzing");
+    // The analysis is its own call so the dashboard opens as soon as it is ready
+    streamPack(data.document_id, signal);
     try {
-        const analysis = await analyzeContent(data.extracted_text, locale);
+        const analysis = await analyzeContent(data.document_id, locale, signal);
+        if (signal.aborted) return;
         setAnalysisData(analysis);
         setStep("dashboard");
         addXp(50); // +50 XP for analysis
     } catch (error) {
+        if (signal.aborted) return;
         console.error("Analysis error", error);
+        controller.abort();
+        setPackPending(false);
         setStep("upload");
         alert("Analysis failed. Please try again.");
     }
   };
 
   const handleTabChange = async (value: string) => {
+    activeTab.current = value;
+    const signal = requests.current?.signal;
+    if (packPending || !signal) return;
     if (value === "quiz" && !quizData && !loadingQuiz) {
-        setLoadingQuiz(true);
-        try {
-            const quiz = await generateQuiz(extractedText, locale);
-            setQuizData(quiz);
-        } catch (error) {
-            console.error("Quiz generation error", error);
-        } finally {
-            setLoadingQuiz(false);
-        }
+        loadQuiz(documentId, signal);
     } else if (value === "flashcards" && !flashcardsData && !loadingFlashcards) {
-        setLoadingFlashcards(true);
-        try {
-            const data = await generateFlashcards(extractedText, 10, locale);
-            setFlashcardsData(data.flashcards);
-        } catch (error) {
-            console.error("Flashcards error", error);
-        } finally {
-            setLoadingFlashcards(false);
-        }
+        loadFlashcards(documentId, signal);
     }
   };
 
@@ -79,9 +139,14 @@ export default function Home() {
   };
 
   const handleReset = () => {
+      requests.current?.abort();
+      requests.current = null;
+      setPackPending(false);
+      setLoadingQuiz(false);
+      setLoadingFlashcards(false);
       setStep("upload");
       setAnalysisData(null);
-      setExtractedText("");
+      setDocumentId("");
       setQuizData(null);
       setFlashcardsData(null);
   };
@@ -140,11 +205,11 @@ export default function Home() {
                 </TabsContent>
                 
                 <TabsContent value="chat" className="mt-0">
-                    <ChatInterface context={extractedText} language={locale} />
+                    <ChatInterface documentId={documentId} language={locale} />
                 </TabsContent>
                 
                 <TabsContent value="quiz" className="mt-0">
-                    {loadingQuiz ? (
+                    {loadingQuiz || (packPending && !quizData) ? (
                         <div className="flex flex-col items-center justify-center py-12 space-y-4">
                             <Loader2 className="w-8 h-8 animate-spin text-primary" />
                             <p>{t('generating_quiz')}</p>
@@ -160,7 +225,7 @@ export default function Home() {
                 </TabsContent>
 
                 <TabsContent value="flashcards" className="mt-0">
-                    {loadingFlashcards ? (
+                    {loadingFlashcards || (packPending && !flashcardsData) ? (
                         <div className="flex flex-col items-center justify-center py-12 space-y-4">
                             <Loader2 className="w-8 h-8 animate-spin text-primary" />
                             <p>{t('generating_flashcards')}</p>
@@ -12,7 +12,7 @@ import { chatWithAI } from "@/lib/api";
 import { cn } from "@/lib/utils";
 
 interface ChatInterfaceProps {
-  context: string;
+  documentId: string;
   language?: string;
 }
 
@@ -21,7 +21,7 @@ interface Message {
   content: string;
 }
 
-export function ChatInterface({ context, language = "en" }: ChatInterfaceProps) {
+export function ChatInterface({ documentId, language = "en" }: ChatInterfaceProps) {
   const t = useTranslations("Chat");
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState("");
@@ -47,7 +47,7 @@ export function ChatInterface({ context, language = "en" }: ChatInterfaceProps)
       // Actually, API expects history of previous messages.
       const history = messages.map(m => ({ role: m.role, content: m.content }));
       
-      const data = await chatWithAI(context, userMessage, history, language);
+      const data = await chatWithAI(documentId, userMessage, history, language);
       
       setMessages((prev) => [...prev, { role: "ai", content: data.response }]);
     } catch (error) {
@@ -4,7 +4,7 @@ export async function uploadDocument(file: File) {
   const formData = new FormData();
   formData.append("file", file);
 
-  const response = await fetch(`${API_URL}/documents/upload`, {
+  const response = await fetch(`${API_URL}/documents/upload?slim=true`, {
     method: "POST",
     body: formData,
   });
@@ -16,13 +16,14 @@ export async function uploadDocument(file: File) {
   return response.json();
 }
 
-export async function analyzeContent(text: string, language: string = "en") {
+export async function analyzeContent(documentId: string, language: string = "en", signal?: AbortSignal) {
   const response = await fetch(`${API_URL}/ai/analyze`, {
     method: "POST",
+    signal,
     headers: {
       "Content-Type": "application/json",
     },
-    body: JSON.stringify({ text, language }),
+    body: JSON.stringify({ document_id: documentId, language }),
   });
 
   if (!response.ok) {
@@ -32,13 +33,14 @@ export async function analyzeContent(text: string, language: string = "en") {
   return response.json();
 }
 
-export async function generateQuiz(text: string, language: string = "en") {
+export async function generateQuiz(documentId: string, language: string = "en", signal?: AbortSignal) {
   const response = await fetch(`${API_URL}/ai/quiz`, {
     method: "POST",
+    signal,
     headers: {
       "Content-Type": "application/json",
     },
-    body: JSON.stringify({ text, language }),
+    body: JSON.stringify({ document_id: documentId, language }),
   });
 
   if (!response.ok) {
@@ -48,13 +50,13 @@ export async function generateQuiz(text: string, language: string = "en") {
   return response.json();
 }
 
-export async function chatWithAI(context: string, message: string, history: any[], language: string = "en") {
+export async function chatWithAI(documentId: string, message: string, history: any[], language: string = "en") {
   const response = await fetch(`${API_URL}/ai/chat`, {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
     },
-    body: JSON.stringify({ context, message, history, language }),
+    body: JSON.stringify({ document_id: documentId, message, history, language }),
   });
 
   if (!response.ok) {
@@ -70,7 +72,14 @@ export async function generateStudyPlan(topics: string[], examDate: string, hour
     headers: {
       "Content-Type": "application/json",
     },
-    body: JSON.stringify({ topics, exam_date: examDate, hours_per_day: hoursPerDay, language }),
+    // The plan starts from the student's local date, not the server's
+    body: JSON.stringify({
+      topics,
+      exam_date: examDate,
+      hours_per_day: hoursPerDay,
+      language,
+      start_date: new Date().toLocaleDateString("en-CA"),
+    }),
   });
 
   if (!response.ok) {
@@ -80,13 +89,14 @@ export async function generateStudyPlan(topics: string[], examDate: string, hour
   return response.json();
 }
 
-export async function generateFlashcards(text: string, numCards: number, language: string = "en") {
+export async function generateFlashcards(documentId: string, numCards: number, language: string = "en", signal?: AbortSignal) {
   const response = await fetch(`${API_URL}/ai/flashcards`, {
     method: "POST",
+    signal,
     headers: {
       "Content-Type": "application/json",
     },
-    body: JSON.stringify({ text, num_cards: numCards, language }),
+    body: JSON.stringify({ document_id: documentId, num_cards: numCards, language }),
   });
 
   if (!response.ok) {
@@ -95,3 +105,54 @@ export async function generateFlashcards(text: string, numCards: number, languag
 
   return response.json();
 }
+
+// Streams a study pack, calling onArtifact("analysis" | "quiz" | "flashcards", data)
+// as each artifact is ready. Resolves once the server sends `done`; aborting
+// the signal closes the stream and the server stops generating.
+export async function streamStudyPack(
+  documentId: string,
+  language: string = "en",
+  onArtifact: (artifact: string, data: any) => void,
+  artifacts: string[] = ["analysis", "quiz", "flashcards"],
+  signal?: AbortSignal
+) {
+  const response = await fetch(`${API_URL}/ai/study-pack/stream`, {
+    method: "POST",
+    signal,
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify({ document_id: documentId, artifacts, language }),
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error("Study pack failed");
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let end;
+    while ((end = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data = line.slice(6);
+      }
+      if (event === "done") return;
+      if (event === "error") {
+        console.error("Study pack artifact failed", JSON.parse(data));
+      } else {
+        onArtifact(event, JSON.parse(data));
+      }
+    }
+  }
+}